@@ -1,12 +1,147 @@
 from pydantic_settings import BaseSettings
 
+# How /api/batches runs passes: one call per pass ("live"), through the
+# Message Batches API ("message_batches") or its local stand-in ("local").
+PASS_MODES = ("live", "message_batches", "local")
+
 
 class Settings(BaseSettings):
     anthropic_api_key: str = ""
     github_token: str = ""
     model_name: str = "claude-opus-4-6"
+    # Model routing. Each pass names a tier ("flagship" is model_name, "fast"
+    # is fast_model_name) and an answer budget in PASS_DEFINITIONS;
+    # pass_models and pass_max_tokens override them by pass name, with a tier
+    # or a model id. With model_escalation, a cheaper model's answer that does
+    # not validate against the pass schema is retried on the flagship.
+    fast_model_name: str = "claude-haiku-4-5"
+    pass_models: dict[str, str] = {}
+    pass_max_tokens: dict[str, int] = {}
+    discovery_model: str = "flagship"
+    model_escalation: bool = True
+    # USD per million (input, output) tokens, for the per-tier cost metric.
+    model_prices: dict[str, tuple[float, float]] = {
+        "claude-opus-4-6": (5.0, 25.0),
+        "claude-sonnet-4-5": (3.0, 15.0),
+        "claude-haiku-4-5": (1.0, 5.0),
+    }
     max_content_size: int = 15000
     max_file_size: int = 8000
+    # Ingestion keeps up to max_tree_entries paths and fetches up to
+    # max_context_files relevant files (round-robin across workspaces, within
+    # context_fetch_bytes, context_fetch_concurrency at a time); the shared
+    # prompt context is then packed into context_token_budget tokens.
+    max_tree_entries: int = 200_000
+    max_context_files: int = 64
+    context_fetch_bytes: int = 256 * 1024
+    context_fetch_concurrency: int = 8
+    context_token_budget: int = 12000
+    github_api_url: str = "https://api.github.com"
+    github_raw_url: str = "https://raw.githubusercontent.com"
+    # "api" fetches tree + one Contents call per file; "tarball" streams the archive once.
+    ingestion_mode: str = "api"
+    github_max_connections: int = 20
+    # Revalidating on-disk cache for GitHub responses (ETag / Last-Modified).
+    http_cache_enabled: bool = True
+    http_cache_path: str = ".cache/github_http.sqlite3"
+    http_cache_max_bytes: int = 128 * 1024 * 1024
+    http_cache_max_age: int = 7 * 24 * 3600
+    # Larger responses (big recursive tree listings) stream through uncached.
+    http_cache_max_entry_bytes: int = 4 * 1024 * 1024
+    # Max passes in flight at once; 1 runs them strictly one after another.
+    analysis_concurrency: int = 6
+    # Shared async Anthropic client pool, opened and closed by the app lifespan.
+    anthropic_max_connections: int = 20
+    anthropic_timeout: float = 300.0
+    # Override the Messages API base URL (e.g. bench/fake_anthropic.py); empty uses the SDK default.
+    anthropic_base_url: str = ""
+    # Mark the shared repo context with cache_control; with concurrent passes,
+    # warm the cache with a 1-token request first so no pass pays for a write.
+    prompt_caching: bool = True
+    prompt_cache_warmup: bool = True
+    # Stream pass output and emit pass_progress events as JSON fields complete.
+    pass_streaming: bool = False
+    # Event streams: compress with gzip/deflate (Z_SYNC_FLUSH per event) when
+    # the client's Accept-Encoding allows it. Off by default because some
+    # proxies buffer compressed responses until they end.
+    sse_compression: bool = False
+    sse_compression_level: int = 6
+    # Prefetch (/api/prefetch): ingest a repo while its URL is being entered
+    # and keep the content up to prefetch_ttl seconds for the analysis that
+    # follows; at most prefetch_max_entries at once (0 disables it). With
+    # prefetch_warm_cache the prompt cache is written ahead of time too.
+    prefetch_max_entries: int = 32
+    prefetch_ttl: float = 120.0
+    prefetch_warm_cache: bool = True
+    # Pass result cache: "memory", "sqlite", "shared" (the state backend
+    # below, so every worker sees it) or "none".
+    pass_cache_backend: str = "memory"
+    pass_cache_path: str = ".cache/passes.sqlite3"
+    pass_cache_max_bytes: int = 64 * 1024 * 1024
+    pass_cache_ttl: int = 7 * 24 * 3600
+    # Discovery answer cache: exact and similar (TF-IDF cosine >= threshold,
+    # every cached term in the new query) past queries with the same filters
+    # are answered without the model. max_entries 0 disables it.
+    discovery_cache_max_entries: int = 512
+    discovery_cache_ttl: int = 6 * 3600
+    discovery_cache_threshold: float = 0.7
+    # Local index of ingested repos (BM25 over name, topics, languages and
+    # description) that grounds discovery; empty path disables it. Up to
+    # discovery_candidates matches are handed to the model to rank.
+    repo_index_path: str = ".cache/repo_index.sqlite3"
+    discovery_candidates: int = 12
+    repo_index_active_days: int = 365
+    # Incremental re-analysis: a pass whose inputs changed in at most this
+    # many places is revised from its previous result instead of rerun.
+    incremental_max_changes: int = 3
+    # Upstream admission: request-rate ceilings and retry policy for
+    # 429/529/5xx. Once the providers' rate-limit headers report less quota
+    # than upstream_quota_low_water seconds at the ceiling, the rate drops to
+    # spread what is left until the quota resets.
+    github_max_rps: float = 20.0
+    anthropic_max_rps: float = 10.0
+    upstream_quota_low_water: float = 60.0
+    upstream_max_retries: int = 4
+    upstream_max_retry_wait: float = 60.0
+    # Admission control for /api/analyze and /api/discover: at most
+    # *_max_in_flight pipelines run at once (0 = unlimited), up to
+    # *_max_queued more wait while receiving "queued" events, and the rest
+    # get 503 with Retry-After. Requests bearing one of
+    # admission_priority_tokens (Authorization: Bearer) are served first.
+    analysis_max_in_flight: int = 8
+    analysis_max_queued: int = 32
+    discovery_max_in_flight: int = 16
+    discovery_max_queued: int = 64
+    admission_priority_tokens: list[str] = []
+    # Durable analysis jobs (/api/jobs). job_workers run inside the web process;
+    # set it to 0 and run `python -m app.worker` to scale workers separately.
+    job_db_path: str = ".cache/jobs.sqlite3"
+    job_workers: int = 2
+    job_lease_seconds: float = 60.0
+    job_poll_interval: float = 0.25
+    # Batch analysis (/api/batches): at most batch_max_repos repos per batch,
+    # run as jobs by the workers above. batch_pass_mode is the default way
+    # passes run: "live", "message_batches" (Anthropic Message Batches API,
+    # half price, results within hours) or "local" (same path, run directly).
+    batch_max_repos: int = 500
+    batch_pass_mode: str = "live"
+    message_batch_poll_interval: float = 30.0
+    # Jobs waiting on a Message Batch don't hold their worker; each worker
+    # keeps at most this many of them running alongside its live job.
+    job_max_batched: int = 50
+    # State shared by worker processes (uvicorn --workers N, or pods on one
+    # volume): "local" keeps it in-process; "sqlite" puts single-flight
+    # leases, the event channels other workers replay, upstream rate-limit
+    # buckets and the "shared" pass cache in a WAL database at state_path.
+    state_backend: str = "local"
+    state_path: str = ".cache/state.sqlite3"
+    state_lease_seconds: float = 15.0
+    state_poll_interval: float = 0.1
+    state_channel_ttl: float = 300.0
+    # JSON-lines file for tracing spans; empty disables tracing.
+    trace_file: str = ""
+    # Seconds between event-loop lag probes; 0 disables the probe.
+    event_loop_lag_interval: float = 0.25
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
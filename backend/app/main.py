@@ -1,14 +1,53 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hmac
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sse_starlette.sse import EventSourceResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from app.models.schemas import AnalysisRequest
+from app.config import settings
+from app.models.schemas import AnalysisRequest, BatchRequest
 from app.models.discovery_schemas import DiscoveryRequest
-from app.services.ingestion import fetch_repo_content
-from app.services.analyzer import run_analysis_pipeline
+from app.services.ingestion import repo_key
+from app.services.admission import QueueFull, get_admission_controller
+from app.services.analyzer import analyze_repo, warm_prompt_cache
 from app.services.discovery import run_discovery
+from app.services.discovery_cache import get_discovery_cache
+from app.services.prefetch import get_prefetch_store
+from app.services.ratelimit import UpstreamRateLimited
+from app.services.singleflight import SingleFlight
+from app.services import batch, github_client, jobs, llm, metrics, ratelimit, sse
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm.open_client()
+    github_client.open_client()
+    lag_probe = None
+    if settings.event_loop_lag_interval > 0:
+        lag_probe = asyncio.create_task(
+            metrics.monitor_event_loop_lag(settings.event_loop_lag_interval)
+        )
+    job_workers = jobs.start_workers(settings.job_workers)
+    try:
+        yield
+    finally:
+        for worker in job_workers:
+            worker.cancel()
+        if lag_probe is not None:
+            lag_probe.cancel()
+        await github_client.close_client()
+        await llm.close_client()
+        await asyncio.to_thread(metrics.close_traces)
+
 
-app = FastAPI(title="Glassbox OSS", version="1.0.0")
+app = FastAPI(title="Glassbox OSS", version="1.0.0", lifespan=lifespan)
+
+# Concurrent analyses of the same repo share one ingestion + pipeline run,
+# across worker processes too when state_backend is shared.
+analysis_flights = SingleFlight()
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,27 +60,261 @@ app.add_middleware(
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "github_http_cache": github_client.cache_stats(),
+        "discovery_cache": get_discovery_cache().summary(),
+        "admission": {
+            endpoint: get_admission_controller(endpoint).summary()
+            for endpoint in ("analyze", "discover")
+        },
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+def _client_id(request: Request) -> str:
+    """Fairness key for the upstream rate limiters."""
+    return request.client.host if request.client else "anonymous"
+
+
+def _priority(request: Request) -> str:
+    """Admission class: "authenticated" for a configured bearer token."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token and any(
+        hmac.compare_digest(token, known) for known in settings.admission_priority_tokens
+    ):
+        return "authenticated"
+    return "anonymous"
+
+
+def _overloaded(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(int(e.retry_after))},
+    )
+
+
+def _error_event(message: str) -> dict:
+    return {"data": sse.encode_event({"event_type": "error", "message": message})}
 
 
 @app.post("/api/analyze")
-async def analyze(request: AnalysisRequest):
+async def analyze(request: AnalysisRequest, http_request: Request):
+    started = time.perf_counter()
+    ratelimit.current_client.set(_client_id(http_request))
+    previous = request.previous
+    if previous:
+        # A job id stands for the analysis that job ran.
+        previous = await asyncio.to_thread(
+            jobs.get_job_store().analysis_id, previous
+        ) or previous
+    key = repo_key(request.url) + (f"@{previous}" if previous else "")
+    admission = get_admission_controller("analyze")
+    priority = _priority(http_request)
+    # Joining a run already in flight needs no slot of its own.
+    events = analysis_flights.subscribe(
+        key,
+        lambda: admission.run(
+            priority, lambda: analyze_repo(request.url, previous=previous)
+        ),
+    )
+    # The first event is "queued", or only arrives once ingestion has succeeded.
     try:
-        repo_content = await fetch_repo_content(request.url)
+        first_event = await anext(events)
+    except QueueFull as e:
+        await events.aclose()
+        raise _overloaded(e)
+    except UpstreamRateLimited as e:
+        await events.aclose()
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
     except Exception as e:
+        await events.aclose()
         raise HTTPException(status_code=400, detail=f"Failed to fetch repo: {str(e)}")
 
     async def event_generator():
-        async for event in run_analysis_pipeline(repo_content):
-            yield event
+        try:
+            yield first_event
+            async for event in events:
+                yield event
+        except Exception as e:
+            # After a wait in the queue the response has already begun.
+            yield _error_event(f"Failed to analyze repo: {e}")
+        finally:
+            await events.aclose()
+
+    return sse.event_response(
+        http_request, metrics.track_stream("analyze", event_generator(), started)
+    )
+
+
+@app.post("/api/prefetch", status_code=202)
+async def prefetch(request: AnalysisRequest, http_request: Request):
+    """Start ingesting a repo (and warming the prompt cache) ahead of /api/analyze.
+
+    Meant to be called once a valid URL has been entered; the analysis that
+    follows within ``prefetch_ttl`` picks the content up instead of fetching.
+    """
+    ratelimit.current_client.set(_client_id(http_request))
+    warm_cache = (
+        settings.prefetch_warm_cache
+        and settings.prompt_caching
+        and settings.prompt_cache_warmup
+    )
 
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+    async def warm(content) -> None:
+        await warm_prompt_cache(llm.get_client(), content)
+
+    status = get_prefetch_store().start(request.url, warm=warm if warm_cache else None)
+    return {"repo": repo_key(request.url), "status": status}
 
 
 @app.post("/api/discover")
-async def discover(request: DiscoveryRequest):
+async def discover(request: DiscoveryRequest, http_request: Request):
+    started = time.perf_counter()
+    ratelimit.current_client.set(_client_id(http_request))
+    events = get_admission_controller("discover").run(
+        _priority(http_request), lambda: run_discovery(request)
+    )
+    try:
+        first_event = await anext(events)
+    except QueueFull as e:
+        raise _overloaded(e)
+
     async def event_generator():
-        async for event in run_discovery(request):
-            yield event
+        try:
+            yield first_event
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+
+    return sse.event_response(
+        http_request, metrics.track_stream("discover", event_generator(), started)
+    )
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: AnalysisRequest):
+    job = await asyncio.to_thread(jobs.get_job_store().create, request.url)
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    store = jobs.get_job_store()
+    job = await asyncio.to_thread(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    results = await asyncio.to_thread(store.pass_results, job_id)
+    return {
+        "job_id": job["id"],
+        "url": job["url"],
+        "status": job["status"],
+        "error": job["error"],
+        "results": {name: event["data"] for name, event in results.items()},
+    }
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, last_event_id: int = 0):
+    """Stream a job's events; reconnecting clients resume after Last-Event-ID."""
+    store = jobs.get_job_store()
+    if await asyncio.to_thread(store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    header = request.headers.get("last-event-id", "")
+    resume_from = int(header) if header.isdigit() else last_event_id
+
+    return sse.event_response(
+        request,
+        metrics.track_stream(
+            "jobs", jobs.stream_job_events(store, job_id, resume_from), time.perf_counter()
+        ),
+    )
+
+
+@app.post("/api/batches", status_code=202)
+async def submit_batch(request: BatchRequest, http_request: Request):
+    """Queue an analysis job for each repo in ``urls`` and/or ``org``."""
+    ratelimit.current_client.set(_client_id(http_request))
+    try:
+        urls = await batch.expand_targets(request.urls, request.org)
+    except UpstreamRateLimited as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
+    if not urls:
+        raise HTTPException(status_code=400, detail="No repositories to analyze")
+    store = jobs.get_job_store()
+    pass_mode = request.pass_mode or settings.batch_pass_mode
+    batch_id = await asyncio.to_thread(store.create_batch, urls, request.org, pass_mode)
+    batch_jobs = await asyncio.to_thread(store.batch_jobs, batch_id)
+    return {
+        "batch_id": batch_id,
+        "total": len(batch_jobs),
+        "pass_mode": pass_mode,
+        "jobs": [{"job_id": job["id"], "url": job["url"]} for job in batch_jobs],
+    }
+
+
+@app.get("/api/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    store = jobs.get_job_store()
+    info = await asyncio.to_thread(store.get_batch, batch_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    batch_jobs = await asyncio.to_thread(store.batch_jobs, batch_id)
+    return {
+        "batch_id": batch_id,
+        "org": info["org"],
+        "total": len(batch_jobs),
+        "counts": batch.batch_status(batch_jobs),
+        "jobs": [
+            {"job_id": job["id"], "url": job["url"], "status": job["status"]}
+            for job in batch_jobs
+        ],
+    }
+
+
+@app.get("/api/batches/{batch_id}/events")
+async def batch_events(batch_id: str, request: Request, last_event_id: int = 0):
+    """Stream per-repo progress for a batch; resumable via Last-Event-ID."""
+    store = jobs.get_job_store()
+    if await asyncio.to_thread(store.get_batch, batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    header = request.headers.get("last-event-id", "")
+    resume_from = int(header) if header.isdigit() else last_event_id
+
+    return sse.event_response(
+        request,
+        metrics.track_stream(
+            "batches",
+            batch.stream_batch_events(store, batch_id, resume_from),
+            time.perf_counter(),
+        ),
+    )
+
 
-    return EventSourceResponse(event_generator(), media_type="text/event-stream")
+@app.get("/api/batches/{batch_id}/results")
+async def batch_results(batch_id: str, format: str = "ndjson"):
+    """Every repo's results, as NDJSON lines or as columns (``format=columnar``)."""
+    store = jobs.get_job_store()
+    if await asyncio.to_thread(store.get_batch, batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if format == "columnar":
+        return await batch.export_columnar(store, batch_id)
+    if format != "ndjson":
+        raise HTTPException(status_code=400, detail="format must be ndjson or columnar")
+    return StreamingResponse(
+        batch.export_ndjson(store, batch_id), media_type="application/x-ndjson"
+    )
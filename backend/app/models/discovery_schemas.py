@@ -28,6 +28,8 @@ class RecommendedRepo(BaseModel):
     considerations: list[str] = []
     match_score: int = 0
     tags: list[str] = []
+    # Metadata taken from the local repo index rather than the model.
+    indexed: bool = False
 
 
 class DiscoveryResult(BaseModel):
@@ -35,3 +37,40 @@ class DiscoveryResult(BaseModel):
     summary: str = ""
     recommendations: list[RecommendedRepo] = []
     query_interpretation: str = ""
+
+
+# What the model submits through the discovery tool. When ranking indexed
+# candidates it only gives its judgement; the metadata comes from the index.
+
+class RankedRepo(BaseModel):
+    rank: int
+    repo_name: str = Field(description="owner/repo")
+    reasoning: str = Field(default="", description="Why this is a good match for the query")
+    strengths: list[str] = []
+    considerations: list[str] = Field(default=[], description="Trade-offs to be aware of")
+    match_score: int = Field(default=0, description="0-100, how well the repo matches the query")
+    tags: list[str] = []
+
+
+class RecalledRepo(RankedRepo):
+    github_url: str = Field(description="https://github.com/owner/repo")
+    stars: int = Field(default=0, description="Approximate but realistic star count")
+    language: str = Field(default="", description="Primary language")
+    license: str = ""
+    description: str = Field(default="", description="What this project does")
+
+
+class RankedDiscovery(BaseModel):
+    reasoning_steps: list[str] = Field(default=[], description="The steps of your analysis, in order")
+    query_interpretation: str = Field(
+        default="", description="One sentence summarizing what the user is looking for"
+    )
+    summary: str = Field(
+        default="",
+        description="A brief paragraph about the recommendations and how they fit the user's needs",
+    )
+    recommendations: list[RankedRepo] = []
+
+
+class RecalledDiscovery(RankedDiscovery):
+    recommendations: list[RecalledRepo] = []
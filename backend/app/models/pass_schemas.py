@@ -0,0 +1,186 @@
+# Response structures of the analysis passes. Each model is the input schema
+# of the tool its pass must call and validates what comes back; field
+# descriptions are the guidance the model sees.
+from typing import Annotated, Literal
+
+from pydantic import BaseModel, BeforeValidator, Field
+
+
+def _lower(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+# Enumerations accept any capitalization, so "High" is not worth a repair call.
+Level = Annotated[Literal["low", "medium", "high"], BeforeValidator(_lower)]
+Severity = Annotated[Literal["low", "medium", "high", "critical"], BeforeValidator(_lower)]
+FindingSeverity = Annotated[
+    Literal["info", "low", "medium", "high", "critical"], BeforeValidator(_lower)
+]
+
+ReasoningSteps = Annotated[
+    list[str], Field(description="The steps of your analysis, in order")
+]
+
+
+# --- Pass 1: System Overview ---
+
+class Component(BaseModel):
+    name: str
+    description: str = Field(description="What this component does")
+    tech: list[str] = []
+
+
+class KeyDependency(BaseModel):
+    name: str
+    purpose: str = Field(description="Why it is used")
+
+
+class SystemOverview(BaseModel):
+    reasoning_steps: ReasoningSteps
+    purpose: str = Field(
+        description="One paragraph describing what this project does and why it exists"
+    )
+    components: list[Component]
+    architecture_type: Annotated[
+        Literal["monolith", "microservice", "library", "cli", "framework", "other"],
+        BeforeValidator(_lower),
+    ]
+    data_flows: list[str] = Field(description="How data moves through the system")
+    key_dependencies: list[KeyDependency]
+
+
+# --- Pass 2: Setup Risk Radar ---
+
+class SetupRisk(BaseModel):
+    category: str = Field(
+        description="dependency, configuration, environment, compatibility, data or infrastructure"
+    )
+    title: str = Field(description="Short risk title")
+    description: str
+    severity: Severity
+    likelihood: Level
+
+
+class EnvRequirement(BaseModel):
+    name: str
+    required: bool = True
+    notes: str = ""
+
+
+class SetupRiskRadar(BaseModel):
+    reasoning_steps: ReasoningSteps
+    overall_risk: Severity
+    risks: list[SetupRisk]
+    env_requirements: list[EnvRequirement]
+    estimated_setup_time: str = Field(
+        description="One of: 5 minutes, 15 minutes, 30 minutes, 1 hour, 2+ hours"
+    )
+    complexity_score: int = Field(ge=1, le=10, description="1 (trivial) to 10 (very hard)")
+
+
+# --- Pass 3: Failure Timeline ---
+
+class TimelineEvent(BaseModel):
+    time_label: str = Field(description="A time point between Day 1 and Month 3, e.g. Day 1")
+    title: str = Field(description="Short event title")
+    description: str = Field(description="What happens at this point")
+    status: Annotated[Literal["ok", "warning", "critical"], BeforeValidator(_lower)]
+    probability: str = Field(description="e.g. Low 15%, Medium 40%, High 70%, Very High 90%")
+    mitigation: str = Field(description="How to prevent or handle this")
+
+
+class FailureTimeline(BaseModel):
+    reasoning_steps: ReasoningSteps
+    timeline: list[TimelineEvent]
+    overall_survival_rate: str = Field(description="e.g. 85%")
+    critical_period: str = Field(
+        description="When trouble is most likely and why, e.g. Week 2-4: dependency conflicts"
+    )
+
+
+# --- Pass 4: Security Risk ---
+
+class SecurityFinding(BaseModel):
+    title: str
+    severity: FindingSeverity
+    description: str
+    recommendation: str = Field(description="What to do about it")
+
+
+class SecurityRisk(BaseModel):
+    reasoning_steps: ReasoningSteps
+    security_rating: Severity
+    findings: list[SecurityFinding]
+    positive_practices: list[str] = Field(
+        description="Good security practices found in the repo"
+    )
+    missing_protections: list[str] = Field(
+        description="Security measures that should be added"
+    )
+    data_exposure_risk: Level
+    supply_chain_risk: Level
+
+
+# --- Pass 5: Safe Run Plan ---
+
+class RunStep(BaseModel):
+    step_number: int
+    title: str
+    commands: list[str] = []
+    notes: str = ""
+    risk_level: Annotated[Literal["safe", "caution", "danger"], BeforeValidator(_lower)]
+
+
+class EnvVar(BaseModel):
+    name: str = Field(description="e.g. DATABASE_URL")
+    description: str = Field(description="What this variable is for")
+    required: bool = True
+    example: str = ""
+
+
+class SmokeTest(BaseModel):
+    command: str = Field(description="Command that verifies the project works")
+    expected_output: str = Field(description="What you should see")
+
+
+class SafeRunPlan(BaseModel):
+    reasoning_steps: ReasoningSteps
+    steps: list[RunStep]
+    env_vars: list[EnvVar]
+    sandbox_recommendation: Annotated[
+        Literal["docker", "vm", "none"], BeforeValidator(_lower)
+    ]
+    smoke_test: SmokeTest
+    estimated_time: str = Field(description="e.g. 10 minutes")
+
+
+# --- Pass 6: Recovery Strategy ---
+
+class RollbackStep(BaseModel):
+    step_number: int
+    action: str = Field(description="What to do")
+    command: str = Field(default="", description="Specific command, if applicable")
+    notes: str = ""
+
+
+class RecoveryScenario(BaseModel):
+    scenario: str = Field(description="Scenario name, e.g. Database corruption")
+    severity: Severity
+    steps: list[str]
+    estimated_recovery_time: str = Field(description="e.g. 15 minutes")
+
+
+class NuclearOption(BaseModel):
+    description: str = Field(description="Complete teardown and rebuild procedure")
+    steps: list[str]
+    data_loss_risk: Annotated[
+        Literal["none", "partial", "complete"], BeforeValidator(_lower)
+    ]
+
+
+class RecoveryStrategy(BaseModel):
+    reasoning_steps: ReasoningSteps
+    rollback_plan: list[RollbackStep]
+    recovery_scenarios: list[RecoveryScenario]
+    nuclear_option: NuclearOption
+    monitoring_recommendations: list[str]
@@ -0,0 +1,130 @@
+import posixpath
+import sys
+from array import array
+from typing import Iterator
+
+
+class _Dir:
+    __slots__ = ("dirs", "files", "sizes", "count", "exts")
+
+    def __init__(self) -> None:
+        self.dirs: dict[str, _Dir] = {}
+        self.files: list[str] = []  # names, parallel to sizes
+        self.sizes = array("L")  # bytes
+        # Filled in by PathTree.aggregated(): files and extension counts in
+        # this directory and below.
+        self.count = 0
+        self.exts: dict[str, int] = {}
+
+
+class PathTree:
+    """Compact store for a repository's file paths.
+
+    Paths are held as a prefix tree of interned names, so the thousands of
+    ``src``, ``index.ts`` and ``package.json`` components of a large repo
+    are stored once rather than once per path. File names and sizes sit in
+    flat per-directory arrays; lookups scan one directory, which is cheap
+    for the handful of files the fetch plan asks about. Per-directory file
+    counts and extension breakdowns are computed in one pass when first
+    needed. Iterating yields file paths; ``get`` returns a file's size like
+    ``dict.get``.
+    """
+
+    def __init__(self, max_files: int | None = None) -> None:
+        self.root = _Dir()
+        self.max_files = max_files
+        self.truncated = False
+        self._files = 0
+        self._stale = False
+        # Listings are sorted, so consecutive files usually share a directory.
+        self._last_dir = ""
+        self._last_node = self.root
+
+    def __len__(self) -> int:
+        return self._files
+
+    def __iter__(self) -> Iterator[str]:
+        for prefix, node in self.walk():
+            for name in node.files:
+                yield prefix + name
+
+    def walk(self) -> Iterator[tuple[str, _Dir]]:
+        """Yield ``(prefix, directory)`` pairs; prefix is "" or ends in "/"."""
+        stack: list[tuple[str, _Dir]] = [("", self.root)]
+        while stack:
+            prefix, node = stack.pop()
+            yield prefix, node
+            for name, child in reversed(node.dirs.items()):
+                stack.append((f"{prefix}{name}/", child))
+
+    def __contains__(self, path: object) -> bool:
+        return isinstance(path, str) and self.get(path) is not None
+
+    def add(self, path: str, size: int = 0) -> bool:
+        """Record a file; returns False (and marks the tree truncated) when full."""
+        if self.max_files is not None and self._files >= self.max_files:
+            self.truncated = True
+            return False
+        directory, _, name = path.strip("/").rpartition("/")
+        if directory != self._last_dir:
+            self._last_node = self._make_dirs(directory)
+            self._last_dir = directory
+        node = self._last_node
+        node.files.append(sys.intern(name))
+        node.sizes.append(max(0, min(size, 0xFFFFFFFF)))
+        self._files += 1
+        self._stale = True
+        return True
+
+    def add_dir(self, path: str) -> None:
+        """Record a directory, so empty ones still appear in the tree."""
+        self._make_dirs(path.strip("/"))
+
+    def _make_dirs(self, path: str) -> _Dir:
+        node = self.root
+        for part in path.split("/") if path else ():
+            child = node.dirs.get(part)
+            if child is None:
+                child = node.dirs[sys.intern(part)] = _Dir()
+            node = child
+        return node
+
+    def node(self, path: str) -> _Dir | None:
+        """The directory at ``path`` ("" for the root), or None."""
+        node = self.root
+        for part in path.strip("/").split("/"):
+            if part:
+                node = node.dirs.get(part)
+                if node is None:
+                    return None
+        return node
+
+    def get(self, path: str, default: int | None = None) -> int | None:
+        directory, _, name = path.strip("/").rpartition("/")
+        node = self.node(directory)
+        if node is None or name not in node.files:
+            return default
+        return node.sizes[node.files.index(name)]
+
+    def aggregated(self) -> _Dir:
+        """The root, with ``count`` and ``exts`` filled in for every directory."""
+        if self._stale:
+            order: list[_Dir] = []
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                stack.extend(node.dirs.values())
+            for node in reversed(order):  # children before parents
+                exts: dict[str, int] = {}
+                for name in node.files:
+                    ext = posixpath.splitext(name)[1] or name
+                    exts[ext] = exts.get(ext, 0) + 1
+                count = len(node.files)
+                for child in node.dirs.values():
+                    count += child.count
+                    for ext, n in child.exts.items():
+                        exts[ext] = exts.get(ext, 0) + n
+                node.count, node.exts = count, exts
+            self._stale = False
+        return self.root
@@ -1,9 +1,14 @@
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 import re
 
+from app.config import PASS_MODES
+from app.models.path_tree import PathTree
+
 
 class AnalysisRequest(BaseModel):
     url: str
+    # analysis_id (or job id) of an earlier analysis to update incrementally.
+    previous: str = ""
 
     @field_validator("url")
     @classmethod
@@ -14,15 +19,54 @@ class AnalysisRequest(BaseModel):
         return v.rstrip("/")
 
 
+class BatchRequest(BaseModel):
+    urls: list[str] = []
+    # GitHub organization (or user) whose repositories are all analyzed.
+    org: str = ""
+    # "live", "message_batches" or "local"; empty uses settings.batch_pass_mode.
+    pass_mode: str = ""
+
+    @field_validator("urls")
+    @classmethod
+    def validate_github_urls(cls, v: list[str]) -> list[str]:
+        return [AnalysisRequest.validate_github_url(url) for url in v]
+
+    @field_validator("org")
+    @classmethod
+    def validate_org(cls, v: str) -> str:
+        if v and not re.match(r"^[\w.\-]+$", v):
+            raise ValueError("Invalid GitHub organization name")
+        return v
+
+    @field_validator("pass_mode")
+    @classmethod
+    def validate_pass_mode(cls, v: str) -> str:
+        if v and v not in PASS_MODES:
+            raise ValueError("pass_mode must be live, message_batches or local")
+        return v
+
+
 class RepoContent(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     repo_name: str
     owner: str
+    tree_sha: str = ""
     readme: str = ""
-    file_tree: list[str] = []
+    # Every file path, as a compact prefix tree with per-directory aggregates.
+    tree: PathTree = Field(default_factory=PathTree)
     config_files: dict[str, str] = {}
+    # Sub-project root ("." for the repo root) -> its relevant paths, best first.
+    workspaces: dict[str, list[str]] = {}
     package_files: dict[str, str] = {}
     languages: dict[str, int] = {}
     description: str = ""
+    # Repository metadata from the repo info call, kept for the discovery index.
+    stars: int = 0
+    license: str = ""
+    topics: list[str] = []
+    pushed_at: str = ""
+    archived: bool = False
 
 
 class SSEEvent(BaseModel):
@@ -16,28 +16,7 @@ Filters:
 
 Number of recommendations requested: {max_results}
 
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1 of your analysis...", "step 2...", "step 3..."],
-  "query_interpretation": "One sentence summarizing what the user is looking for",
-  "summary": "A brief paragraph about the recommendations and how they fit the user's needs",
-  "recommendations": [
-    {{
-      "rank": 1,
-      "repo_name": "owner/repo",
-      "github_url": "https://github.com/owner/repo",
-      "stars": 15000,
-      "language": "Primary language",
-      "license": "MIT",
-      "description": "What this project does",
-      "reasoning": "Why this is a good match for the user's query",
-      "strengths": ["Strength 1", "Strength 2", "Strength 3"],
-      "considerations": ["Thing to be aware of 1", "Thing to be aware of 2"],
-      "match_score": 92,
-      "tags": ["tag1", "tag2", "tag3"]
-    }}
-  ]
-}}
+Submit your recommendations by calling the submit_recommendations tool.
 
 Important:
 - Only recommend real repositories that exist on GitHub
@@ -71,3 +50,65 @@ def get_discovery_prompt(request: DiscoveryRequest) -> str:
         actively_maintained=maintained,
         max_results=request.max_results,
     )
+
+
+GROUNDED_DISCOVERY_PROMPT = """You are an expert open source advisor. A user is looking for open source projects that match their needs.
+
+Rank the candidate repositories below for the user's request. Recommend ONLY from these candidates; their metadata is authoritative.
+
+User's Query:
+{query}
+
+Filters:
+- Preferred Languages: {languages}
+- Domain/Category: {domain}
+- Scale/Size: {scale}
+- License Preference: {license_preference}
+- Actively Maintained Only: {actively_maintained}
+
+Candidates (repo | language | license | stars | topics | description):
+{candidates}
+
+Number of recommendations requested: {max_results} (fewer if not enough candidates fit)
+
+Submit your ranking by calling the submit_recommendations tool.
+
+Important:
+- repo_name must be copied exactly from the candidate list
+- match_score should be 0-100 reflecting how well the repo matches the query
+- Order recommendations by match_score descending
+- Leave out candidates that do not fit the request
+"""
+
+
+def _format_candidate(candidate: dict) -> str:
+    return " | ".join([
+        candidate["repo_name"],
+        candidate["language"] or "?",
+        candidate["license"] or "?",
+        str(candidate["stars"]),
+        ", ".join(candidate["topics"][:8]) or "-",
+        (candidate["description"] or "-")[:200],
+    ])
+
+
+def get_grounded_discovery_prompt(
+    request: DiscoveryRequest, candidates: list[dict]
+) -> str:
+    """Format the prompt asking the model to rank indexed candidates only."""
+    filters = request.filters
+    maintained = (
+        "Yes" if filters.actively_maintained
+        else "No preference" if filters.actively_maintained is None
+        else "No"
+    )
+    return GROUNDED_DISCOVERY_PROMPT.format(
+        query=request.query,
+        languages=", ".join(filters.languages) if filters.languages else "Any",
+        domain=filters.domain or "Any",
+        scale=filters.scale or "Any",
+        license_preference=filters.license_preference or "Any",
+        actively_maintained=maintained,
+        candidates="\n".join(f"- {_format_candidate(c)}" for c in candidates),
+        max_results=request.max_results,
+    )
@@ -0,0 +1,349 @@
+"""Token-budgeted packing of repository content into the shared pass context."""
+
+import functools
+import posixpath
+import re
+
+from app.models.path_tree import PathTree
+
+# Dependency and build manifests, recognised at any depth so each package of
+# a monorepo is a candidate, not just the root.
+MANIFESTS = {
+    "package.json", "requirements.txt", "pyproject.toml", "setup.py", "setup.cfg",
+    "Pipfile", "environment.yml", "Cargo.toml", "go.mod", "go.work", "Gemfile", "pom.xml",
+    "build.gradle", "build.gradle.kts", "composer.json", "mix.exs", "deno.json",
+    "pnpm-workspace.yaml", "lerna.json", "nx.json", "turbo.json",
+}
+DEPLOYMENT_FILES = {
+    "Dockerfile", "docker-compose.yml", "docker-compose.yaml", "compose.yaml",
+    "compose.yml", ".env.example", ".env.sample", "Procfile", "Makefile",
+    "fly.toml", "vercel.json", "netlify.toml", "serverless.yml", "app.yaml",
+    "nginx.conf", "SECURITY.md",
+}
+TOOLING_FILES = {
+    "tsconfig.json", "webpack.config.js", "vite.config.ts", "vite.config.js",
+    "next.config.js", "next.config.mjs", "babel.config.js", "tox.ini", "noxfile.py",
+}
+CI_FILES = {
+    ".gitlab-ci.yml", ".travis.yml", "Jenkinsfile", "azure-pipelines.yml",
+    "bitbucket-pipelines.yml", "cloudbuild.yaml",
+}
+ENTRYPOINT_STEMS = {
+    "main", "app", "server", "index", "cli", "manage", "wsgi", "asgi", "__main__", "lib",
+}
+SOURCE_EXTENSIONS = {".py", ".js", ".ts", ".tsx", ".jsx", ".go", ".rs", ".rb", ".java", ".php"}
+SENSITIVE_WORDS = (
+    "auth", "security", "secret", "crypto", "permission", "policy", "session",
+    "token", "middleware",
+)
+SKIPPED_DIRS = {
+    "node_modules", "vendor", "third_party", "dist", "build", "target", ".git",
+    "__pycache__", "site-packages", "fixtures", "testdata", "examples", "docs",
+}
+LOW_VALUE_DIRS = {"test", "tests", "__tests__", "spec", "benchmark", "benchmarks", "scripts"}
+
+README_KEYWORDS_HIGH = (
+    "install", "setup", "getting started", "quick start", "quickstart", "usage",
+    "config", "environment", "deploy", "architecture", "overview", "requirement",
+    "prerequisite", "security", "docker", "develop", "running", "build",
+)
+README_KEYWORDS_LOW = (
+    "license", "contributor", "contributing", "acknowledg", "sponsor", "backer",
+    "changelog", "citation", "star history", "author", "code of conduct", "support",
+)
+
+# Matched against lowercased text; IGNORECASE makes the search several times slower.
+_SENSITIVE = re.compile("|".join(SENSITIVE_WORDS))
+_BADGE_LINE = re.compile(r"^\s*(\[?!\[[^\]]*\]\([^)]*\)\]?(\([^)]*\))?\s*)+$")
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_MAX_EXPANDED = 8  # subdirectories listed per directory before "... N more"
+_HEADING = re.compile(r"^#{1,6}\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Claude tokens for ``text`` (about four characters each)."""
+    return (len(text) + 3) // 4
+
+
+def path_score(path: str) -> float:
+    """Relevance of a repository path for the analysis context; 0 means skip.
+
+    Manifests, deployment and security files, CI definitions and entrypoints
+    score highest. Deeper paths and test or script directories are discounted,
+    and vendored or generated trees are ignored.
+    """
+    path = path.rstrip("/")
+    parts = path.split("/")
+    dirs, name = parts[:-1], parts[-1]
+    stem, ext = posixpath.splitext(name)
+
+    if name in MANIFESTS:
+        score = 10.0
+    elif name in DEPLOYMENT_FILES or name.startswith("Dockerfile"):
+        score = 8.0
+    elif name in CI_FILES or (
+        dirs[:2] == [".github", "workflows"] and ext in (".yml", ".yaml")
+    ) or path == ".circleci/config.yml":
+        score = 7.0
+    elif ext in SOURCE_EXTENSIONS and stem in ENTRYPOINT_STEMS:
+        score = 6.0
+    elif ext in SOURCE_EXTENSIONS and _SENSITIVE.search(path.lower()):
+        score = 5.0
+    elif name in TOOLING_FILES or ext == ".tf":
+        score = 4.0
+    else:
+        return 0.0
+
+    if any(d in SKIPPED_DIRS for d in dirs):
+        return 0.0
+    if any(d.lower() in LOW_VALUE_DIRS for d in dirs):
+        score *= 0.3
+    # cmd/<tool>/main.go and src/main.rs are conventional entrypoints, not nesting.
+    depth = len([d for d in dirs if d not in ("src", "cmd", ".github", "workflows")])
+    return score / (1 + 0.5 * depth)
+
+
+@functools.lru_cache(maxsize=65536)
+def _name_class(name: str) -> int:
+    """0: never relevant; 1: may be; 2: only under a security-sensitive directory."""
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    ext = "." + ext if ext else ""
+    if (
+        name in MANIFESTS
+        or name in DEPLOYMENT_FILES
+        or name in CI_FILES
+        or name in TOOLING_FILES
+        or name.startswith("Dockerfile")
+        or ext in (".yml", ".yaml", ".tf")
+    ):
+        return 1
+    if ext in SOURCE_EXTENSIONS:
+        if stem in ENTRYPOINT_STEMS or _SENSITIVE.search(name.lower()):
+            return 1
+        return 2
+    return 0
+
+
+def _candidates(paths):
+    """Paths that can score above zero; a PathTree is filtered per directory."""
+    if not isinstance(paths, PathTree):
+        yield from paths
+        return
+    for prefix, node in paths.walk():
+        sensitive = _SENSITIVE.search(prefix.lower()) is not None
+        for name in node.files:
+            kind = _name_class(name)
+            if kind == 1 or (kind == 2 and sensitive):
+                yield prefix + name
+
+
+def rank_paths(paths, limit: int | None = None) -> list[str]:
+    """The ``limit`` most relevant paths, best first (ties by shallower path)."""
+    scored = [(path_score(p), p) for p in _candidates(paths)]
+    scored = [(s, p) for s, p in scored if s > 0]
+    scored.sort(key=lambda sp: (-sp[0], sp[1].count("/"), sp[1]))
+    return [p for _, p in scored[:limit]]
+
+
+def summarize_tree(tree: PathTree, max_chars: int) -> str:
+    """Compress a file tree into per-directory file counts.
+
+    Top-level directories are listed first; the largest ones are expanded a
+    level at a time while ``max_chars`` allows, so the summary shows the
+    shape of the repository rather than an arbitrary prefix of its paths.
+    The counts come from the tree's per-directory aggregates.
+    """
+    chosen: dict[str, str] = {}
+    used = 0
+
+    def add(key: str, text: str) -> bool:
+        nonlocal used
+        if used + len(text) + 1 > max_chars:
+            return False
+        chosen[key] = text
+        used += len(text) + 1
+        return True
+
+    def line(path: str, node) -> str:
+        top = sorted(node.exts.items(), key=lambda e: (-e[1], e[0]))[:3]
+        indent = "  " * path.count("/")
+        summary = ", ".join(f"{e} {n}" for e, n in top)
+        return f"{indent}{posixpath.basename(path)}/ ({node.count} files: {summary})"
+
+    root = tree.aggregated()
+    if root.files:
+        add("", "./ " + ", ".join(sorted(root.files)[:30]))
+
+    # Breadth-first from the root, largest directories first at each level.
+    frontier = [("", root)]
+    while frontier:
+        next_level = []
+        for path, node in frontier:
+            if path and not add(path, line(path, node)):
+                continue
+            kids = sorted(
+                ((f"{path}/{name}" if path else name, child)
+                 for name, child in node.dirs.items() if child.count),
+                key=lambda k: (-k[1].count, k[0]),
+            )
+            next_level.extend(kids[:_MAX_EXPANDED])
+            rest = kids[_MAX_EXPANDED:]
+            if rest:
+                indent = "  " * (path.count("/") + 1) if path else ""
+                files = sum(child.count for _, child in rest)
+                # "\uffff" sorts the note after the listed siblings.
+                add(
+                    f"{path}/\uffff" if path else "\uffff",
+                    f"{indent}... {len(rest)} more dirs ({files} files)",
+                )
+        frontier = sorted(next_level, key=lambda k: (-k[1].count, k[0]))
+
+    return "\n".join(chosen[d] for d in sorted(chosen))
+
+
+def summarize_workspaces(
+    workspaces: dict[str, list[str]], max_chars: int
+) -> tuple[str, set[str]]:
+    """One line per sub-project naming its relevant files, within ``max_chars``.
+
+    Returns the text and the set of paths it mentions. A repository with a
+    single workspace is reported as such in a few tokens.
+    """
+    if len(workspaces) <= 1:
+        return "single project", set()
+    lines: list[str] = []
+    listed: set[str] = set()
+    used = 0
+    for n, (root, paths) in enumerate(workspaces.items()):
+        shown = paths[:6]
+        names = ", ".join(p if root == "." else p[len(root) + 1:] for p in shown)
+        text = f"{root}: {names}"
+        if used + len(text) + 1 > max_chars:
+            lines.append(f"... {len(workspaces) - n} more workspaces")
+            break
+        lines.append(text)
+        listed.update(shown)
+        used += len(text) + 1
+    return "\n".join(lines), listed
+
+
+def _clean(text: str) -> str:
+    text = _HTML_COMMENT.sub("", text)
+    lines = [ln.rstrip() for ln in text.splitlines() if not _BADGE_LINE.match(ln)]
+    return _BLANK_RUNS.sub("\n\n", "\n".join(lines)).strip()
+
+
+def _readme_sections(readme: str) -> list[tuple[float, str]]:
+    """Split a markdown README at headings and score each section."""
+    sections: list[tuple[float, str]] = []
+    current: list[str] = []
+    heading = None
+    in_fence = False
+    for ln in _clean(readme).splitlines():
+        if ln.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not in_fence and _HEADING.match(ln):
+            if current:
+                sections.append((_section_score(heading), "\n".join(current).strip()))
+            heading, current = ln.lstrip("#").strip().lower(), [ln]
+        else:
+            current.append(ln)
+    if current:
+        sections.append((_section_score(heading), "\n".join(current).strip()))
+    return [(score, text) for score, text in sections if text]
+
+
+def _section_score(heading: str | None) -> float:
+    if heading is None:
+        return 9.0  # the introduction says what the project is
+    if any(k in heading for k in README_KEYWORDS_LOW):
+        return 0.5
+    if any(k in heading for k in README_KEYWORDS_HIGH):
+        return 7.0
+    return 3.0
+
+
+def _truncate(text: str, tokens: int) -> str:
+    cut = text[: tokens * 4]
+    head = cut.rsplit("\n", 1)[0]
+    # Prefer a line boundary unless that would throw most of the cut away.
+    return (head if len(head) > len(cut) // 2 else cut) + "\n[... truncated]"
+
+
+def pack_context(repo_content, budget: int) -> dict[str, str]:
+    """Fit README sections, files and a tree summary into ``budget`` tokens.
+
+    Pieces are taken greedily by relevance: the README introduction and setup
+    sections, manifests, deployment and security files, then the remaining
+    sections. No piece may take more than its share of the budget (in
+    proportion to its score), so a long licence section or lockfile-sized
+    manifest cannot crowd out the rest; a piece that does not fit whole is
+    cut to what is left when it still carries signal. The README keeps its
+    section order and files are grouped by workspace in rank order, so the
+    same repository always packs identically.
+    """
+    tree_chars = max(400, budget * 4 // 8)
+    tree_summary = summarize_tree(repo_content.tree, tree_chars)
+    workspaces, listed = summarize_workspaces(repo_content.workspaces, tree_chars // 2)
+    ranked = rank_paths(repo_content.tree, 40)
+    key_paths = "\n".join(
+        p for p in ranked if p not in repo_content.config_files and p not in listed
+    )
+    remaining = (
+        budget
+        - estimate_tokens(tree_summary)
+        - estimate_tokens(workspaces)
+        - estimate_tokens(key_paths)
+        - 200
+    )
+
+    pieces: list[tuple[float, int, str, str]] = []  # (score, order, kind, text)
+    for i, (score, text) in enumerate(_readme_sections(repo_content.readme)):
+        pieces.append((score, i, "readme", text))
+    files = rank_paths(repo_content.config_files)
+    files += [f for f in repo_content.config_files if f not in files]
+    for i, fname in enumerate(files):
+        text = _clean(repo_content.config_files[fname])
+        if text:
+            pieces.append((path_score(fname) or 1.0, i, fname, text))
+
+    chosen: list[tuple[str, int, str]] = []
+    for score, order, kind, text in sorted(pieces, key=lambda p: (-p[0], p[1])):
+        share = max(40, int(budget * min(score, 10.0) ** 2 / 400))
+        if estimate_tokens(text) > share:
+            text = _truncate(text, share)
+        cost = estimate_tokens(text) + 10
+        if cost <= remaining:
+            chosen.append((kind, order, text))
+            remaining -= cost
+        elif remaining >= 150 and score >= 5:
+            chosen.append((kind, order, _truncate(text, remaining - 20)))
+            remaining = 0
+
+    readme = "\n\n".join(t for k, _, t in sorted(chosen, key=lambda c: c[1]) if k == "readme")
+
+    owner = {p: root for root, paths in repo_content.workspaces.items() for p in paths}
+    roots = list(repo_content.workspaces)
+    grouped = len(roots) > 1
+    config = ""
+    current = None
+    for kind, _, text in sorted(
+        (c for c in chosen if c[0] != "readme"),
+        key=lambda c: (roots.index(owner[c[0]]) if c[0] in owner else len(roots), c[1]),
+    ):
+        root = owner.get(kind, ".")
+        if grouped and root != current:
+            config += f"\n=== Workspace: {root} ===\n"
+            current = root
+        config += f"\n--- {kind} ---\n{text}\n"
+
+    return {
+        "readme": readme,
+        "tree_summary": tree_summary,
+        "workspaces": workspaces,
+        "key_paths": key_paths,
+        "config_files": config,
+    }
@@ -1,290 +1,202 @@
+from collections import OrderedDict
+from functools import lru_cache
+
+from app.config import settings
+from app.models.pass_schemas import (
+    FailureTimeline,
+    RecoveryStrategy,
+    SafeRunPlan,
+    SecurityRisk,
+    SetupRiskRadar,
+    SystemOverview,
+)
+from app.prompts.packer import pack_context
+from app.services.structured import tool_definition
+
 PASS_DEFINITIONS = [
     {
         "name": "system_overview",
         "title": "The Big Picture",
+        # Model tier and answer budget (see app/services/routing.py).
+        "model": "flagship",
+        "max_tokens": 4096,
+        # Repository inputs the pass depends on (see app/services/incremental.py).
+        "inputs": ("readme", "description", "languages", "tree", "config"),
+        # Response structure, submitted through a tool (see app/services/structured.py).
+        "schema": SystemOverview,
         "prompt": """You are an expert software architect analyzing an open source repository.
 
-Analyze the following repository content and produce a comprehensive system overview.
+Analyze the repository content above and produce a comprehensive system overview.
 
-Repository: {repo_name}
-Description: {description}
-
-README:
-{readme}
-
-File Tree (partial):
-{file_tree}
-
-Languages: {languages}
-
-Config/Package Files:
-{config_files}
-
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1 of your analysis...", "step 2...", "step 3..."],
-  "purpose": "One paragraph describing what this project does and why it exists",
-  "components": [
-    {{
-      "name": "Component name",
-      "description": "What this component does",
-      "tech": ["technology1", "technology2"]
-    }}
-  ],
-  "architecture_type": "monolith|microservice|library|cli|framework|other",
-  "data_flows": [
-    "Description of data flow 1",
-    "Description of data flow 2"
-  ],
-  "key_dependencies": [
-    {{
-      "name": "dependency name",
-      "purpose": "why it's used"
-    }}
-  ]
-}}""",
+Submit your analysis by calling the submit_system_overview tool.""",
     },
     {
         "name": "setup_risk_radar",
         "title": "Getting Started",
+        "model": "flagship",
+        "max_tokens": 4096,
+        "inputs": ("readme", "tree", "config"),
+        "schema": SetupRiskRadar,
         "prompt": """You are a DevOps risk analyst. Analyze this repository for setup and operational risks.
 
-Repository: {repo_name}
-Description: {description}
-
-README:
-{readme}
-
-File Tree (partial):
-{file_tree}
-
-Languages: {languages}
-
-Config/Package Files:
-{config_files}
-
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1...", "step 2...", "step 3..."],
-  "overall_risk": "low|medium|high|critical",
-  "risks": [
-    {{
-      "category": "dependency|configuration|environment|compatibility|data|infrastructure",
-      "title": "Short risk title",
-      "description": "Detailed description of the risk",
-      "severity": "low|medium|high|critical",
-      "likelihood": "low|medium|high"
-    }}
-  ],
-  "env_requirements": [
-    {{
-      "name": "Requirement name",
-      "required": true,
-      "notes": "Additional details"
-    }}
-  ],
-  "estimated_setup_time": "5 minutes|15 minutes|30 minutes|1 hour|2+ hours",
-  "complexity_score": 7
-}}""",
+Submit your analysis by calling the submit_setup_risk_radar tool.""",
     },
     {
         "name": "failure_timeline",
         "title": "What Could Go Wrong",
+        "model": "flagship",
+        "max_tokens": 4096,
+        "inputs": ("languages", "tree", "config"),
+        "schema": FailureTimeline,
         "prompt": """You are a chaos engineering specialist. Simulate a failure timeline for deploying and running this repository in production.
 
-Repository: {repo_name}
-Description: {description}
-
-README:
-{readme}
-
-File Tree (partial):
-{file_tree}
-
-Languages: {languages}
-
-Config/Package Files:
-{config_files}
-
 Create a realistic timeline from Day 1 to Month 3 showing how things could go wrong. Each node should represent a specific time point with a realistic scenario.
 
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1...", "step 2...", "step 3..."],
-  "timeline": [
-    {{
-      "time_label": "Day 1",
-      "title": "Short event title",
-      "description": "What happens at this point",
-      "status": "ok|warning|critical",
-      "probability": "Low 15%|Medium 40%|High 70%|Very High 90%",
-      "mitigation": "How to prevent or handle this"
-    }}
-  ],
-  "overall_survival_rate": "85%",
-  "critical_period": "Week 2-4: dependency conflicts most likely to surface"
-}}""",
+Submit your analysis by calling the submit_failure_timeline tool.""",
     },
     {
         "name": "security_risk",
         "title": "Safety Check",
+        "model": "flagship",
+        "max_tokens": 4096,
+        "inputs": ("tree", "config"),
+        "schema": SecurityRisk,
         "prompt": """You are a security auditor performing a threat assessment of this open source repository.
 
-Repository: {repo_name}
-Description: {description}
-
-README:
-{readme}
-
-File Tree (partial):
-{file_tree}
-
-Languages: {languages}
-
-Config/Package Files:
-{config_files}
-
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1...", "step 2...", "step 3..."],
-  "security_rating": "low|medium|high|critical",
-  "findings": [
-    {{
-      "title": "Finding title",
-      "severity": "info|low|medium|high|critical",
-      "description": "Detailed description",
-      "recommendation": "What to do about it"
-    }}
-  ],
-  "positive_practices": [
-    "Good security practice found in the repo"
-  ],
-  "missing_protections": [
-    "Security measure that should be added"
-  ],
-  "data_exposure_risk": "low|medium|high",
-  "supply_chain_risk": "low|medium|high"
-}}""",
+Submit your analysis by calling the submit_security_risk tool.""",
     },
     {
         "name": "safe_run_plan",
         "title": "Let's Run It",
+        "model": "fast",
+        "max_tokens": 3072,
+        "inputs": ("readme", "tree", "config"),
+        "schema": SafeRunPlan,
         "prompt": """You are a senior engineer creating a safe step-by-step execution plan for running this repository locally.
 
-Repository: {repo_name}
-Description: {description}
-
-README:
-{readme}
-
-File Tree (partial):
-{file_tree}
-
-Languages: {languages}
-
-Config/Package Files:
-{config_files}
-
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1...", "step 2...", "step 3..."],
-  "steps": [
-    {{
-      "step_number": 1,
-      "title": "Step title",
-      "commands": ["command1", "command2"],
-      "notes": "Important notes about this step",
-      "risk_level": "safe|caution|danger"
-    }}
-  ],
-  "env_vars": [
-    {{
-      "name": "ENV_VAR_NAME",
-      "description": "What this variable is for",
-      "required": true,
-      "example": "example_value"
-    }}
-  ],
-  "sandbox_recommendation": "docker|vm|none",
-  "smoke_test": {{
-    "command": "test command to verify it works",
-    "expected_output": "what you should see"
-  }},
-  "estimated_time": "10 minutes"
-}}""",
+Submit your analysis by calling the submit_safe_run_plan tool.""",
     },
     {
         "name": "recovery_strategy",
         "title": "If Things Break",
+        "model": "fast",
+        "max_tokens": 3072,
+        "inputs": ("tree", "config"),
+        "schema": RecoveryStrategy,
         "prompt": """You are a site reliability engineer creating a recovery playbook for this repository.
 
-Repository: {repo_name}
-Description: {description}
+Submit your analysis by calling the submit_recovery_strategy tool.""",
+    },
+]
 
-README:
-{readme}
 
-File Tree (partial):
-{file_tree}
+# Identical for every pass, so it forms the cacheable prefix of each request.
+SHARED_CONTEXT = """Below is the content of an open source repository. You will be asked to analyze it from one specific angle.
+
+Repository: {repo_name}
+Description: {description}
 
 Languages: {languages}
 
-Config/Package Files:
-{config_files}
-
-Respond with ONLY valid JSON matching this exact structure:
-{{
-  "reasoning_steps": ["step 1...", "step 2...", "step 3..."],
-  "rollback_plan": [
-    {{
-      "step_number": 1,
-      "action": "What to do",
-      "command": "specific command if applicable",
-      "notes": "Additional context"
-    }}
-  ],
-  "recovery_scenarios": [
-    {{
-      "scenario": "Scenario name (e.g., Database corruption)",
-      "severity": "low|medium|high|critical",
-      "steps": ["Step 1", "Step 2"],
-      "estimated_recovery_time": "15 minutes"
-    }}
-  ],
-  "nuclear_option": {{
-    "description": "Complete teardown and rebuild procedure",
-    "steps": ["Step 1", "Step 2"],
-    "data_loss_risk": "none|partial|complete"
-  }},
-  "monitoring_recommendations": [
-    "Recommendation 1",
-    "Recommendation 2"
-  ]
-}}""",
-    },
-]
+README:
+{readme}
 
+Directory Summary:
+{tree_summary}
 
-def get_pass_prompt(pass_index: int, repo_content) -> str:
-    """Format a pass prompt with repo content."""
-    definition = PASS_DEFINITIONS[pass_index]
+Workspaces:
+{workspaces}
 
-    file_tree_str = "\n".join(repo_content.file_tree[:200])
-    config_str = ""
-    for fname, content in repo_content.config_files.items():
-        config_str += f"\n--- {fname} ---\n{content}\n"
+Key Paths:
+{key_paths}
 
+Config/Package Files:
+{config_files}"""
+
+
+# Recently packed contexts by (id(repo_content), budget); the entry keeps the
+# RepoContent alive so its id cannot be reused while cached.
+_packed_contexts: OrderedDict[tuple[int, int], tuple[object, str]] = OrderedDict()
+_PACKED_CONTEXTS_MAX = 16
+
+
+def get_shared_context(repo_content) -> str:
+    """Format the repository context shared by all passes.
+
+    The README, tree and files are packed into ``context_token_budget``
+    tokens by relevance (see app/prompts/packer.py). One budget covers every
+    pass so the context stays a single cacheable prefix. Packing a large tree
+    takes milliseconds, so the result is kept for the few repos in flight
+    rather than recomputed for every pass.
+    """
+    key = (id(repo_content), settings.context_token_budget)
+    hit = _packed_contexts.get(key)
+    if hit is not None and hit[0] is repo_content:
+        _packed_contexts.move_to_end(key)
+        return hit[1]
+    packed = pack_context(repo_content, settings.context_token_budget)
     langs_str = ", ".join(
         f"{k}: {v}" for k, v in sorted(
             repo_content.languages.items(), key=lambda x: -x[1]
         )[:10]
     )
 
-    return definition["prompt"].format(
+    text = SHARED_CONTEXT.format(
         repo_name=repo_content.repo_name,
         description=repo_content.description,
-        readme=repo_content.readme,
-        file_tree=file_tree_str,
         languages=langs_str,
-        config_files=config_str,
+        **packed,
+    )
+    _packed_contexts[key] = (repo_content, text)
+    if len(_packed_contexts) > _PACKED_CONTEXTS_MAX:
+        _packed_contexts.popitem(last=False)
+    return text
+
+
+def get_pass_system(repo_content, cache_context: bool = True) -> list[dict]:
+    """The system prompt every pass shares: the packed repository context.
+
+    With ``cache_context`` it carries a cache_control breakpoint. The cached
+    prefix is the tool list followed by the system prompt, so passes after
+    the first (and a warm-up sending the same tools) read it from
+    Anthropic's prompt cache.
+    """
+    block: dict = {"type": "text", "text": get_shared_context(repo_content)}
+    if cache_context:
+        block["cache_control"] = {"type": "ephemeral"}
+    return [block]
+
+
+def get_pass_content(pass_index: int, extra: str = "") -> list[dict]:
+    """Build the user message content blocks for a pass.
+
+    Only the short pass instructions differ between passes. ``extra`` (e.g.
+    a previous result to revise) goes before them.
+    """
+    blocks = []
+    if extra:
+        blocks.append({"type": "text", "text": extra})
+    blocks.append({"type": "text", "text": PASS_DEFINITIONS[pass_index]["prompt"]})
+    return blocks
+
+
+def pass_tool(pass_index: int) -> str:
+    return f"submit_{PASS_DEFINITIONS[pass_index]['name']}"
+
+
+@lru_cache(maxsize=None)
+def pass_tools() -> tuple[dict, ...]:
+    """The submit tool of every pass, in pass order.
+
+    Every pass sends this same list and picks its own tool with
+    ``tool_choice``, which keeps the tools part of the cached prefix
+    identical across passes.
+    """
+    return tuple(
+        tool_definition(
+            pass_tool(index),
+            definition["schema"],
+            f"Submit the {definition['title']} analysis.",
+        )
+        for index, definition in enumerate(PASS_DEFINITIONS)
     )
@@ -0,0 +1,200 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Callable
+
+from app.config import settings
+from app.services.metrics import (
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_WAIT_SECONDS,
+    ADMISSIONS,
+    PIPELINES_IN_FLIGHT,
+)
+from app.services.sse import encode_event
+
+# Served strictly in this order; first in, first out within a class.
+PRIORITIES = ("authenticated", "anonymous")
+
+
+class QueueFull(Exception):
+    """No slot is free and the wait queue is at capacity."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Too many {name} requests in progress; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("priority", "admitted", "started", "completed")
+
+    def __init__(self, priority: str) -> None:
+        self.priority = priority
+        self.admitted = False
+        self.started = 0.0
+        self.completed = False
+
+
+class AdmissionController:
+    """Bound the pipelines running at once and queue the rest.
+
+    At most ``max_in_flight`` runs hold a slot; up to ``max_queued`` more
+    wait in per-priority FIFO queues, and beyond that ``run`` fails fast
+    with QueueFull. Waiting runs stream ``queued`` events with their
+    position and an estimated start, derived from how long recent runs
+    held their slot. ``max_in_flight`` 0 admits everything.
+    """
+
+    def __init__(
+        self, name: str, max_in_flight: int, max_queued: int, typical_seconds: float
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        # Moving average of slot hold times, seeded with a guess.
+        self.typical_seconds = typical_seconds
+        self._running: list[_Ticket] = []
+        self._queues: dict[str, deque[_Ticket]] = {p: deque() for p in PRIORITIES}
+        self._changed = asyncio.Event()
+
+    @property
+    def queued(self) -> int:
+        return sum(map(len, self._queues.values()))
+
+    def position(self, ticket: _Ticket) -> int:
+        """1-based place of a waiting ticket in the overall queue."""
+        ahead = 0
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if priority == ticket.priority:
+                return ahead + queue.index(ticket) + 1
+            ahead += len(queue)
+        raise ValueError("ticket is not queued")
+
+    def estimated_wait(self, position: int) -> float:
+        """Seconds until the ``position``-th waiter is likely to get a slot."""
+        now = time.monotonic()
+        remaining = sorted(
+            max(self.typical_seconds - (now - t.started), 0.0) for t in self._running
+        ) or [0.0]
+        index = position - 1
+        rounds, slot = divmod(index, max(self.max_in_flight, 1))
+        free_at = remaining[slot] if slot < len(remaining) else 0.0
+        return free_at + rounds * self.typical_seconds
+
+    def _enter(self, priority: str) -> _Ticket:
+        ticket = _Ticket(priority if priority in self._queues else PRIORITIES[-1])
+        if self.max_in_flight <= 0 or (
+            len(self._running) < self.max_in_flight and not self.queued
+        ):
+            self._admit(ticket)
+            return ticket
+        if self.queued >= self.max_queued:
+            ADMISSIONS.inc(endpoint=self.name, outcome="rejected")
+            retry_after = max(1, math.ceil(self.estimated_wait(self.queued + 1)))
+            raise QueueFull(self.name, retry_after)
+        self._queues[ticket.priority].append(ticket)
+        ADMISSION_QUEUE_DEPTH.inc(endpoint=self.name)
+        return ticket
+
+    def _admit(self, ticket: _Ticket) -> None:
+        ticket.admitted = True
+        ticket.started = time.monotonic()
+        self._running.append(ticket)
+        PIPELINES_IN_FLIGHT.inc(endpoint=self.name)
+
+    def _leave(self, ticket: _Ticket) -> None:
+        if ticket.admitted:
+            self._running.remove(ticket)
+            PIPELINES_IN_FLIGHT.dec(endpoint=self.name)
+            if ticket.completed:  # cancelled runs would skew the estimate down
+                held = time.monotonic() - ticket.started
+                self.typical_seconds += 0.2 * (held - self.typical_seconds)
+        else:
+            self._queues[ticket.priority].remove(ticket)
+            ADMISSION_QUEUE_DEPTH.dec(endpoint=self.name)
+            ADMISSIONS.inc(endpoint=self.name, outcome="cancelled")
+        while self.queued and len(self._running) < self.max_in_flight:
+            waiter = next(q for q in self._queues.values() if q).popleft()
+            ADMISSION_QUEUE_DEPTH.dec(endpoint=self.name)
+            self._admit(waiter)
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _queued_event(self, position: int) -> dict:
+        wait = round(self.estimated_wait(position), 1)
+        return {"data": encode_event({
+            "event_type": "queued",
+            "position": position,
+            "estimated_wait": wait,
+            "estimated_start": round(time.time() + wait, 1),
+            "message": f"Waiting for a free slot (position {position}, about {wait:.0f}s)",
+        })}
+
+    async def run(
+        self, priority: str, produce: Callable[[], AsyncIterator[dict]]
+    ) -> AsyncGenerator[dict, None]:
+        """``produce()``'s events once a slot is free, after ``queued`` updates.
+
+        Raises QueueFull before anything is yielded when the queue is full.
+        Closing the generator, queued or running, gives its place up.
+        """
+        ticket = self._enter(priority)
+        events = None
+        try:
+            if not ticket.admitted:
+                queued_at = time.monotonic()
+                position = 0
+                while not ticket.admitted:
+                    if self.position(ticket) != position:
+                        position = self.position(ticket)
+                        yield self._queued_event(position)
+                    await self._changed.wait()
+                ADMISSION_WAIT_SECONDS.observe(
+                    time.monotonic() - queued_at, endpoint=self.name
+                )
+                ADMISSIONS.inc(endpoint=self.name, outcome="queued")
+            else:
+                ADMISSIONS.inc(endpoint=self.name, outcome="admitted")
+            events = produce()
+            async for event in events:
+                yield event
+            ticket.completed = True
+        finally:
+            if events is not None:
+                await events.aclose()
+            self._leave(ticket)
+
+    def summary(self) -> dict:
+        return {
+            "in_flight": len(self._running),
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "typical_seconds": round(self.typical_seconds, 1),
+        }
+
+
+_controllers: dict[str, AdmissionController] = {}
+
+
+def get_admission_controller(endpoint: str) -> AdmissionController:
+    """The process-wide controller for "analyze" or "discover"."""
+    controller = _controllers.get(endpoint)
+    if controller is None:
+        if endpoint == "analyze":
+            controller = AdmissionController(
+                endpoint, settings.analysis_max_in_flight, settings.analysis_max_queued, 60.0
+            )
+        elif endpoint == "discover":
+            controller = AdmissionController(
+                endpoint, settings.discovery_max_in_flight, settings.discovery_max_queued, 15.0
+            )
+        else:
+            raise ValueError(f"Unknown admission endpoint: {endpoint}")
+        _controllers[endpoint] = controller
+    return controller
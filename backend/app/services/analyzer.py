@@ -1,97 +1,560 @@
+import asyncio
+import contextlib
 import json
-import re
 import time
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable, Collection
 
 import anthropic
 
 from app.config import settings
 from app.models.schemas import RepoContent
-from app.prompts.passes import PASS_DEFINITIONS, get_pass_prompt
-
-
-def _clean_json(text: str) -> str:
-    """Strip markdown fences and extract JSON."""
-    text = text.strip()
-    text = re.sub(r"^```(?:json)?\s*\n?", "", text)
-    text = re.sub(r"\n?```\s*$", "", text)
-    return text.strip()
+from app.prompts.passes import (
+    PASS_DEFINITIONS,
+    get_pass_content,
+    get_pass_system,
+    get_shared_context,
+    pass_tools,
+)
+from app.services.cache import PassCache, get_pass_cache, pass_cache_key
+from app.services.incremental import (
+    delta_prompt,
+    diff_inputs,
+    input_digests,
+    load_snapshot,
+    plan_pass,
+    save_snapshot,
+)
+from app.services.ingestion import fetch_repo_content, repo_key
+from app.services.json_stream import JsonStreamParser
+from app.services.llm import get_client
+from app.services.message_batches import MessageBatcher, batches_api
+from app.services.metrics import (
+    PASS_MODEL_SECONDS,
+    PASS_RESULTS,
+    PASS_ROUTES,
+    PASS_VALIDATION,
+    record_usage,
+    span,
+)
+from app.services.prefetch import get_prefetch_store
+from app.services.routing import (
+    can_escalate,
+    record_call,
+    response_usage,
+    route_pass,
+)
+from app.services.sse import encode_event, splice
+from app.services.structured import (
+    SchemaError,
+    describe_errors,
+    failing_fields,
+    force_tool,
+    repair_request,
+    response_text,
+    tool_input,
+    validate,
+)
 
 
 def _make_event(event_type: str, **kwargs) -> dict:
     """Create an SSE event dict for sse-starlette."""
     payload = {"event_type": event_type, **kwargs}
-    return {"data": json.dumps(payload)}
+    return {"data": encode_event(payload)}
+
+
+# Below roughly 1024 tokens a prefix cannot be cached, so warming is wasted.
+_MIN_CACHEABLE_CHARS = 4096
+
+
+async def warm_prompt_cache(
+    client: anthropic.AsyncAnthropic, repo_content: RepoContent
+) -> None:
+    """Write the shared context into the prompt cache with a 1-token request.
+
+    Concurrent requests only read a cache entry once it exists, so without
+    this every pass started at the same time would pay for its own write.
+    The request carries the passes' tools and system prompt, the prefix
+    they share. The cache is per model, so each model more than one pass
+    routes to is warmed.
+    """
+    system = get_pass_system(repo_content)
+    if len(system[0]["text"]) < _MIN_CACHEABLE_CHARS:
+        return
+    routed = [route_pass(definition)[1] for definition in PASS_DEFINITIONS]
+    models = sorted({model for model in routed if routed.count(model) > 1})
+
+    async def warm(model: str) -> None:
+        try:
+            await client.messages.create(
+                model=model,
+                max_tokens=1,
+                tools=list(pass_tools()),
+                system=system,
+                messages=[{"role": "user", "content": "Reply with OK."}],
+            )
+        except Exception:
+            pass  # warming is best-effort; the passes will write the cache themselves
+
+    await asyncio.gather(*[warm(model) for model in models])
+
+
+async def _stream_pass(
+    client: anthropic.AsyncAnthropic,
+    request: dict,
+    pass_name: str,
+    pass_number: int,
+    on_progress: Callable[[dict], None],
+) -> object:
+    """Stream a pass, reporting each top-level field or array item as it completes.
+
+    The answer arrives as the tool input's JSON deltas (or text, if the
+    model replied in prose); both feed the same parser. Returns the final
+    message.
+    """
+    parser = JsonStreamParser()
+    async with client.messages.stream(**request) as stream:
+        async for event in stream:
+            if event.type != "content_block_delta":
+                continue
+            delta = event.delta
+            if delta.type == "input_json_delta":
+                chunk = delta.partial_json
+            elif delta.type == "text_delta":
+                chunk = delta.text
+            else:
+                continue
+            for kind, field, *rest in parser.feed(chunk):
+                if kind == "item":
+                    progress = {"field": field, "index": rest[0], "value": rest[1]}
+                else:
+                    progress = {"field": field, "value": rest[0]}
+                on_progress(
+                    _make_event(
+                        "pass_progress",
+                        pass_name=pass_name,
+                        pass_number=pass_number,
+                        **progress,
+                    )
+                )
+        return await stream.get_final_message()
+
+
+async def _run_pass(
+    client: anthropic.AsyncAnthropic,
+    pass_index: int,
+    repo_content: RepoContent,
+    cache: PassCache,
+    cache_key: str | None,
+    on_progress: Callable[[dict], None] | None = None,
+    delta: str = "",
+    batcher: MessageBatcher | None = None,
+) -> tuple[dict, str]:
+    """Run a single pass and return its completion (or error) event.
+
+    With ``settings.pass_streaming`` the response is streamed and
+    ``pass_progress`` events are handed to ``on_progress`` as fields
+    complete. Successful results are stored under ``cache_key`` for later
+    replay. A ``delta`` prompt turns the pass into a revision of a previous
+    result, flagged ``incremental: true``. With a ``batcher`` the request
+    goes out as part of a Message Batch instead.
+
+    The model answers by calling a ``submit_<pass>`` tool whose input schema
+    is the pass's response model, and the input is validated against it.
+    When only some fields fail, one follow-up call asks for just those
+    (``app/services/structured.py``). The pass runs on the model its tier
+    routes to (``app/services/routing.py``); if a cheaper model's answer
+    still does not validate, the pass is retried once on the flagship model.
+
+    Also returns the encoded result payload as stored in the pass cache, or
+    "" when the pass did not produce a result.
+    """
+    definition = PASS_DEFINITIONS[pass_index]
+    pass_name = definition["name"]
+    pass_title = definition["title"]
+    pass_number = pass_index + 1
+    schema = definition["schema"]
+    tool = pass_tools()[pass_index]["name"]
+    tier, model, max_tokens = route_pass(definition)
+    routed_tier = tier
+    escalated_from = ""
+
+    start_time = time.perf_counter()
+    raw_text = ""
+    usage: dict = {}
+    cost = 0.0
+
+    async def call(request: dict, stream: bool = False, batched: bool = False) -> object:
+        nonlocal cost
+        call_start = time.perf_counter()
+        with span("pass.model", pass_name=pass_name, tier=tier, model=model):
+            if batched and batcher is not None:
+                response = await batcher.submit(pass_name, request)
+            elif stream:
+                response = await _stream_pass(
+                    client, request, pass_name, pass_number, on_progress
+                )
+            else:
+                response = await client.messages.create(**request)
+        call_seconds = time.perf_counter() - call_start
+        PASS_MODEL_SECONDS.observe(call_seconds, pass_name=pass_name)
+        call_usage = response_usage(response)
+        record_usage(pass_name, call_usage)
+        cost += record_call(tier, model, call_seconds, call_usage)
+        for field, value in call_usage.items():
+            usage[field] = usage.get(field, 0) + value
+        return response
+
+    try:
+        system = get_pass_system(repo_content, cache_context=settings.prompt_caching)
+        content = get_pass_content(pass_index, extra=delta)
+
+        while True:
+            request = force_tool(
+                {
+                    "model": model,
+                    "max_tokens": max_tokens,
+                    "system": system,
+                    "messages": [{"role": "user", "content": content}],
+                },
+                pass_tools(),
+                tool,
+            )
+            response = await call(
+                request,
+                stream=settings.pass_streaming and on_progress is not None,
+                batched=not escalated_from,
+            )
+            raw_text = response_text(response)
+
+            try:
+                data = tool_input(response, tool)
+            except json.JSONDecodeError as e:
+                if not can_escalate(tier):
+                    raise
+                problem = f"JSON parse error: {e}"
+            else:
+                parsed, errors = validate(schema, data)
+                fields = failing_fields(schema, data, errors) if errors else []
+                if fields:
+                    repair, fix_tool = repair_request(
+                        request, response, tool, schema, errors, fields
+                    )
+                    try:
+                        fix = tool_input(await call(repair), fix_tool)
+                    except json.JSONDecodeError:
+                        fix = None
+                    if isinstance(fix, dict):
+                        data = {**data, **{f: fix[f] for f in fields if f in fix}}
+                    parsed, errors = validate(schema, data)
+                    PASS_VALIDATION.inc(
+                        pass_name=pass_name, result="invalid" if errors else "repaired"
+                    )
+                elif errors:
+                    PASS_VALIDATION.inc(pass_name=pass_name, result="invalid")
+                else:
+                    PASS_VALIDATION.inc(pass_name=pass_name, result="valid")
+                if not errors:
+                    break
+                if not can_escalate(tier):
+                    raw_text = raw_text or json.dumps(data)
+                    raise SchemaError(errors)
+                problem = f"schema validation failed:\n{describe_errors(errors, limit=5)}"
+            if on_progress is not None:
+                on_progress(_make_event(
+                    "pass_escalated",
+                    pass_name=pass_name,
+                    pass_number=pass_number,
+                    from_model=model,
+                    to_model=settings.model_name,
+                    reason=problem,
+                ))
+            escalated_from = model
+            tier, model = "flagship", settings.model_name
+            max_tokens = max(max_tokens, 4096)
+
+        PASS_ROUTES.inc(
+            pass_name=pass_name,
+            tier=routed_tier,
+            escalated="true" if escalated_from else "false",
+        )
+        elapsed = round(time.perf_counter() - start_time, 1)
+
+        reasoning = parsed.get("reasoning_steps", [])
+
+        payload = {
+            "pass_name": pass_name,
+            "pass_number": pass_number,
+            "data": parsed,
+            "reasoning": reasoning,
+            "message": f"{pass_title} complete ({elapsed}s)",
+            "elapsed": elapsed,
+            "usage": usage,
+            "model": model,
+            "cost_usd": round(cost, 6),
+        }
+        if escalated_from:
+            payload["escalated_from"] = escalated_from
+        encoded = encode_event(payload)
+        if cache_key:
+            try:
+                await cache.set(cache_key, encoded)
+            except Exception:
+                pass  # the result is already paid for; a broken cache must not drop it
+
+        PASS_RESULTS.inc(pass_name=pass_name, outcome="incremental" if delta else "ok")
+        flags = {"incremental": True} if delta else {}
+        return {"data": splice(encoded, event_type="pass_complete", **flags)}, encoded
+
+    except (json.JSONDecodeError, SchemaError) as e:
+        elapsed = round(time.perf_counter() - start_time, 1)
+        PASS_RESULTS.inc(pass_name=pass_name, outcome="parse_error")
+        if isinstance(e, SchemaError):
+            error = f"Schema validation failed: {e}"
+        else:
+            error = f"JSON parse error: {e}"
+        return _make_event(
+            "pass_complete",
+            pass_name=pass_name,
+            pass_number=pass_number,
+            data={"error": error, "raw": raw_text[:500]},
+            reasoning=[],
+            message=f"{pass_title} completed with parse warning",
+            elapsed=elapsed,
+            usage=usage,
+        ), ""
+
+    except Exception as e:
+        PASS_RESULTS.inc(pass_name=pass_name, outcome="error")
+        return _make_event(
+            "error",
+            pass_name=pass_name,
+            pass_number=pass_number,
+            message=f"Error in {pass_title}: {str(e)}",
+        ), ""
 
 
 async def run_analysis_pipeline(
     repo_content: RepoContent,
+    concurrency: int | None = None,
+    skip_passes: Collection[str] = (),
+    previous: dict | None = None,
+    pass_mode: str = "live",
+    prewarm: asyncio.Task | None = None,
 ) -> AsyncGenerator[dict, None]:
-    """Run 6-pass analysis pipeline, yielding SSE event dicts."""
-    client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+    """Run 6-pass analysis pipeline, yielding SSE event dicts.
+
+    Passes only depend on ``repo_content``, so up to ``concurrency`` of them
+    (default ``settings.analysis_concurrency``) run at once and their
+    ``pass_complete`` events are yielded in completion order. Passes already
+    in the result cache are replayed immediately with ``cached: true``.
+    Passes named in ``skip_passes`` (e.g. already stored by a resumed job)
+    are not run at all.
+
+    ``previous`` is the snapshot of an earlier analysis of the same repo
+    (see ``app/services/incremental.py``): passes whose inputs have not
+    changed since are replayed from it with ``reused: true``, and passes
+    with only a few changed inputs revise its result. Each completed run
+    leaves a snapshot under its ``analysis_id`` (the tree SHA).
+
+    With ``pass_mode`` "message_batches" (or its "local" stand-in) the passes
+    that need the model are sent together as one Message Batch, at batch
+    pricing, rather than as concurrent calls.
+
+    ``prewarm`` is a prompt-cache warm-up already started for this content
+    (by a prefetch); passes wait on it instead of starting their own.
+    """
+    client = get_client()
+    cache = get_pass_cache()
+    limit = max(1, concurrency or settings.analysis_concurrency)
+    semaphore = asyncio.Semaphore(limit)
+    # (event, is_final) pairs; a pass is finished once its final event lands.
+    queue: asyncio.Queue[tuple[dict, bool]] = asyncio.Queue()
+    pipeline_start = time.perf_counter()
+    # One shared warm-up, started by the first pass that misses the result cache.
+    warm = limit > 1 and settings.prompt_caching and settings.prompt_cache_warmup
+    warmup: asyncio.Task | None = prewarm
+    indices = [
+        i for i, definition in enumerate(PASS_DEFINITIONS)
+        if definition["name"] not in skip_passes
+    ]
+    batcher: MessageBatcher | None = None
+    if pass_mode != "live":
+        batcher = MessageBatcher(
+            batches_api(client, pass_mode), {PASS_DEFINITIONS[i]["name"] for i in indices}
+        )
+        warm = False
+    repo = f"{repo_content.owner}/{repo_content.repo_name}"
+    # Successful payloads by pass name, encoded, for this run's snapshot.
+    results: dict[str, str] = {}
 
     yield _make_event(
         "analysis_start",
         message=f"Starting analysis of {repo_content.repo_name}",
         total_passes=len(PASS_DEFINITIONS),
+        concurrency=limit,
+        analysis_id=repo_content.tree_sha,
+        incremental_from=previous["analysis_id"] if previous else "",
     )
+    # Pack the shared context once, off the event loop; every pass reuses it.
+    await asyncio.to_thread(get_shared_context, repo_content)
+    digests: dict[str, str] = {}
+    changes: dict[str, list[str]] = {}
+    if repo_content.tree_sha or previous:
+        digests = await asyncio.to_thread(input_digests, repo_content)
+    if previous:
+        changes = diff_inputs(previous.get("inputs", {}), digests)
 
-    for i, definition in enumerate(PASS_DEFINITIONS):
-        pass_name = definition["name"]
-        pass_title = definition["title"]
-        pass_number = i + 1
-
-        yield _make_event(
-            "pass_start",
-            pass_name=pass_name,
-            pass_number=pass_number,
-            message=f"Running {pass_title}...",
-        )
+    async def worker(pass_index: int) -> None:
+        definition = PASS_DEFINITIONS[pass_index]
+        try:
+            await run_pass(pass_index)
+        except Exception as e:
+            # Every pass must end with a final event or the stream never does.
+            PASS_RESULTS.inc(pass_name=definition["name"], outcome="error")
+            await queue.put((
+                _make_event(
+                    "error",
+                    pass_name=definition["name"],
+                    pass_number=pass_index + 1,
+                    message=f"Error in {definition['title']}: {str(e)}",
+                ),
+                True,
+            ))
+        finally:
+            if batcher is not None:
+                # Passes that needed no model call must not hold the batch up.
+                batcher.done(definition["name"])
 
-        start_time = time.time()
+    async def run_pass(pass_index: int) -> None:
+        nonlocal warmup
+        definition = PASS_DEFINITIONS[pass_index]
+        cache_key = pass_cache_key(repo_content, pass_index)
+        if cache_key:
+            try:
+                cached = await cache.get(cache_key)
+            except Exception:
+                cached = None  # a broken cache must never fail the pass
+            if cached is not None:
+                PASS_RESULTS.inc(pass_name=definition["name"], outcome="cached")
+                # Replayed as stored, without decoding and re-encoding it.
+                event = {"data": splice(cached, event_type="pass_complete", cached=True)}
+                results[definition["name"]] = cached
+                await queue.put((event, True))
+                return
 
-        try:
-            prompt = get_pass_prompt(i, repo_content)
+        delta = ""
+        if previous:
+            mode, relevant = plan_pass(definition, previous, changes)
+            if mode == "reuse":
+                encoded = encode_event(previous["passes"][definition["name"]])
+                if cache_key:
+                    try:
+                        await cache.set(cache_key, encoded)
+                    except Exception:
+                        pass
+                PASS_RESULTS.inc(pass_name=definition["name"], outcome="reused")
+                event = {
+                    "data": splice(
+                        encoded, event_type="pass_complete", cached=True, reused=True
+                    )
+                }
+                results[definition["name"]] = encoded
+                await queue.put((event, True))
+                return
+            if mode == "delta":
+                delta = delta_prompt(previous["passes"][definition["name"]], relevant)
 
-            response = client.messages.create(
-                model=settings.model_name,
-                max_tokens=4096,
-                messages=[{"role": "user", "content": prompt}],
+        # Batched passes are all submitted at once; the batch paces itself.
+        async with semaphore if batcher is None else contextlib.nullcontext():
+            start_event = _make_event(
+                "pass_start",
+                pass_name=definition["name"],
+                pass_number=pass_index + 1,
+                message=f"Running {definition['title']}...",
             )
+            await queue.put((start_event, False))
+            if warm:
+                if warmup is None:
+                    warmup = asyncio.create_task(warm_prompt_cache(client, repo_content))
+                await warmup
+            with span("analysis.pass", pass_name=definition["name"]):
+                event, encoded = await _run_pass(
+                    client,
+                    pass_index,
+                    repo_content,
+                    cache,
+                    cache_key,
+                    on_progress=lambda e: queue.put_nowait((e, False)),
+                    delta=delta,
+                    batcher=batcher,
+                )
+            if encoded:
+                results[definition["name"]] = encoded
+            await queue.put((event, True))
 
-            raw_text = response.content[0].text
-            cleaned = _clean_json(raw_text)
-            parsed = json.loads(cleaned)
-            elapsed = round(time.time() - start_time, 1)
-
-            reasoning = parsed.get("reasoning_steps", [])
-
-            yield _make_event(
-                "pass_complete",
-                pass_name=pass_name,
-                pass_number=pass_number,
-                data=parsed,
-                reasoning=reasoning,
-                message=f"{pass_title} complete ({elapsed}s)",
-                elapsed=elapsed,
-            )
+    # Tasks are created in order and the semaphore wakes waiters FIFO, so a
+    # limit of 1 reproduces the original sequential ordering.
+    tasks = [asyncio.create_task(worker(i)) for i in indices]
 
-        except json.JSONDecodeError as e:
-            yield _make_event(
-                "pass_complete",
-                pass_name=pass_name,
-                pass_number=pass_number,
-                data={"error": f"JSON parse error: {str(e)}", "raw": raw_text[:500]},
-                reasoning=[],
-                message=f"{pass_title} completed with parse warning",
-            )
+    try:
+        remaining = len(tasks)
+        while remaining:
+            event, is_final = await queue.get()
+            if is_final:
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        if warmup is not None:
+            warmup.cancel()
+        if batcher is not None:
+            await batcher.cancel()
 
-        except Exception as e:
-            yield _make_event(
-                "error",
-                pass_name=pass_name,
-                pass_number=pass_number,
-                message=f"Error in {pass_title}: {str(e)}",
-            )
+    if repo_content.tree_sha and results:
+        await save_snapshot(cache, repo, repo_content.tree_sha, digests, results)
 
-    yield _make_event("done", message="Analysis complete")
+    total_elapsed = round(time.perf_counter() - pipeline_start, 1)
+    yield _make_event(
+        "done",
+        message=f"Analysis complete ({total_elapsed}s)",
+        elapsed=total_elapsed,
+        analysis_id=repo_content.tree_sha,
+    )
+
+
+async def analyze_repo(
+    url: str,
+    skip_passes: Collection[str] = (),
+    previous: str = "",
+    pass_mode: str = "live",
+) -> AsyncGenerator[dict, None]:
+    """Ingest a repo and run the pipeline on it, yielding SSE event dicts.
+
+    ``previous`` is the ``analysis_id`` of an earlier analysis to re-analyze
+    incrementally from; an unknown or expired one means a full run.
+    Content prefetched for ``url`` (``app/services/prefetch.py``) is used
+    instead of ingesting again. Ingestion errors propagate before the first
+    event is yielded.
+    """
+    with span("analysis", repo=repo_key(url)):
+        prefetched = await get_prefetch_store().take(url)
+        if prefetched is not None:
+            repo_content, prewarm = prefetched
+        else:
+            repo_content, prewarm = await fetch_repo_content(url), None
+        snapshot = None
+        if previous:
+            snapshot = await load_snapshot(
+                get_pass_cache(),
+                f"{repo_content.owner}/{repo_content.repo_name}",
+                previous,
+            )
+        async for event in run_analysis_pipeline(
+            repo_content,
+            skip_passes=skip_passes,
+            previous=snapshot,
+            pass_mode=pass_mode,
+            prewarm=prewarm,
+        ):
+            yield event
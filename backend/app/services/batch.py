@@ -0,0 +1,114 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
+from app.config import settings
+from app.prompts.passes import PASS_DEFINITIONS
+from app.services.ingestion import list_org_repos, parse_github_url, repo_key
+from app.services.jobs import TERMINAL_STATUSES, JobStore
+from app.services.sse import dumps
+
+
+async def expand_targets(urls: list[str], org: str = "") -> list[str]:
+    """The repositories a batch covers: ``urls`` plus ``org``'s repos, deduplicated.
+
+    Repos are compared by their normalized owner/name and returned as
+    canonical GitHub URLs in first-seen order, capped at
+    ``settings.batch_max_repos``.
+    """
+    if org:
+        urls = [*urls, *await list_org_repos(org, settings.batch_max_repos)]
+    seen: dict[str, str] = {}
+    for url in urls:
+        key = repo_key(url)
+        if key not in seen:
+            owner, repo = parse_github_url(url)
+            seen[key] = f"https://github.com/{owner}/{repo.removesuffix('.git')}"
+    return list(seen.values())[: settings.batch_max_repos]
+
+
+def batch_status(jobs: list[dict]) -> dict[str, int]:
+    counts = {"queued": 0, "running": 0, "complete": 0, "failed": 0}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return counts
+
+
+async def stream_batch_events(
+    store: JobStore, batch_id: str, last_event_id: int = 0
+) -> AsyncIterator[dict]:
+    """Follow every job in a batch as one SSE stream of ``repo_progress`` events.
+
+    Each job event is summarized with its repo and job id (pass data stays
+    in the results export); a ``batch_complete`` event with per-status
+    counts ends the stream once every job has finished. Event ids resume
+    the stream after a reconnect.
+    """
+    after = last_event_id
+    while True:
+        rows = await asyncio.to_thread(store.batch_events_after, batch_id, after)
+        if rows:
+            urls = {
+                job["id"]: job["url"]
+                for job in await asyncio.to_thread(store.batch_jobs, batch_id)
+            }
+        for cursor, job_id, data in rows:
+            after = cursor
+            event = json.loads(data)
+            progress = {
+                "event_type": "repo_progress",
+                "job_id": job_id,
+                "url": urls.get(job_id, ""),
+                "repo_event": event.get("event_type", ""),
+                "pass_name": event.get("pass_name", ""),
+                "message": event.get("message", ""),
+            }
+            yield {"id": str(cursor), "data": dumps(progress)}
+        if rows:
+            continue
+        jobs = await asyncio.to_thread(store.batch_jobs, batch_id)
+        if all(job["status"] in TERMINAL_STATUSES for job in jobs):
+            # Catch events written between the read above and the status check.
+            if await asyncio.to_thread(store.batch_events_after, batch_id, after):
+                continue
+            done = {"event_type": "batch_complete", "total": len(jobs), **batch_status(jobs)}
+            yield {"id": str(after), "data": dumps(done)}
+            return
+        await asyncio.sleep(settings.job_poll_interval)
+
+
+def _job_record(store: JobStore, job: dict) -> dict:
+    results = store.pass_results(job["id"])
+    return {
+        "url": job["url"],
+        "job_id": job["id"],
+        "status": job["status"],
+        "error": job["error"],
+        "results": {name: event["data"] for name, event in results.items()},
+    }
+
+
+async def export_ndjson(store: JobStore, batch_id: str) -> AsyncIterator[str]:
+    """One JSON line per repo: status and every stored pass result."""
+    for job in await asyncio.to_thread(store.batch_jobs, batch_id):
+        record = await asyncio.to_thread(_job_record, store, job)
+        yield json.dumps(record) + "\n"
+
+
+async def export_columnar(store: JobStore, batch_id: str) -> dict[str, list]:
+    """The batch as equal-length columns, one row per repo and one column per pass.
+
+    The layout matches what a Parquet or Arrow table would hold, so it loads
+    directly into a dataframe.
+    """
+    names = [d["name"] for d in PASS_DEFINITIONS]
+    columns: dict[str, list] = {
+        c: [] for c in ("url", "job_id", "status", "error", *names)
+    }
+    for job in await asyncio.to_thread(store.batch_jobs, batch_id):
+        record = await asyncio.to_thread(_job_record, store, job)
+        for column in ("url", "job_id", "status", "error"):
+            columns[column].append(record[column])
+        for name in names:
+            columns[name].append(record["results"].get(name))
+    return columns
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from app.config import settings
+from app.models.schemas import RepoContent
+from app.prompts.passes import PASS_DEFINITIONS, SHARED_CONTEXT
+from app.services.routing import route_pass
+from app.services.shared_state import SharedState, get_shared_state
+from app.services.structured import input_schema
+
+
+def pass_cache_key(repo_content: RepoContent, pass_index: int) -> str | None:
+    """Content-address a pass result; None when the tree SHA is unknown."""
+    if not repo_content.tree_sha:
+        return None
+    definition = PASS_DEFINITIONS[pass_index]
+    prompt = (
+        SHARED_CONTEXT
+        + definition["prompt"]
+        + json.dumps(input_schema(definition["schema"]), sort_keys=True)
+    )
+    prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+    parts = [
+        f"{repo_content.owner}/{repo_content.repo_name}".lower(),
+        repo_content.tree_sha,
+        definition["name"],
+        prompt_hash,
+        str(settings.context_token_budget),
+        *map(str, route_pass(definition)),
+    ]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+class PassCache(ABC):
+    """Stores serialized pass_complete payloads by content-addressed key."""
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str) -> None: ...
+
+
+class NullPassCache(PassCache):
+    async def get(self, key: str) -> str | None:
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        pass
+
+
+class MemoryPassCache(PassCache):
+    """In-process LRU with a TTL, evicting least recently used past max_bytes."""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time(), value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class SqlitePassCache(PassCache):
+    """On-disk cache shared across restarts, evicting least recently used rows."""
+
+    def __init__(self, path: str, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pass_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+    def _get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM pass_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM pass_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE pass_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, value: str) -> None:
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pass_cache VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM pass_cache WHERE stored_at < ?", (now - self.ttl,)
+            )
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM pass_cache"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM pass_cache ORDER BY accessed_at"
+                ).fetchall()
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM pass_cache WHERE key = ?", (old_key,))
+                    total -= size
+            self._conn.commit()
+
+
+class SharedPassCache(PassCache):
+    """Entries in the shared state backend, seen by every worker process.
+
+    Entries expire after the TTL; there is no size-based eviction.
+    """
+
+    def __init__(self, state: SharedState, max_bytes: int, ttl: float):
+        self.state = state
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    async def get(self, key: str) -> str | None:
+        return await self.state.get(f"pass:{key}")
+
+    async def set(self, key: str, value: str) -> None:
+        if len(value) <= self.max_bytes:
+            await self.state.set(f"pass:{key}", value, self.ttl)
+
+
+_pass_cache: PassCache | None = None
+
+
+def get_pass_cache() -> PassCache:
+    """Return the process-wide pass cache selected by settings.pass_cache_backend."""
+    global _pass_cache
+    if _pass_cache is None:
+        backend = settings.pass_cache_backend
+        if backend == "memory":
+            _pass_cache = MemoryPassCache(
+                settings.pass_cache_max_bytes, settings.pass_cache_ttl
+            )
+        elif backend == "sqlite":
+            _pass_cache = SqlitePassCache(
+                settings.pass_cache_path,
+                settings.pass_cache_max_bytes,
+                settings.pass_cache_ttl,
+            )
+        elif backend == "shared":
+            _pass_cache = SharedPassCache(
+                get_shared_state(), settings.pass_cache_max_bytes, settings.pass_cache_ttl
+            )
+        elif backend == "none":
+            _pass_cache = NullPassCache()
+        else:
+            raise ValueError(f"Unknown pass_cache_backend: {backend}")
+    return _pass_cache
@@ -1,62 +1,157 @@
+import asyncio
 import json
-import re
 import time
 from typing import AsyncGenerator
 
-import anthropic
-
 from app.config import settings
-from app.models.discovery_schemas import DiscoveryRequest
-from app.prompts.discovery import get_discovery_prompt
-
-
-def _clean_json(text: str) -> str:
-    """Strip markdown fences and extract JSON."""
-    text = text.strip()
-    text = re.sub(r"^```(?:json)?\s*\n?", "", text)
-    text = re.sub(r"\n?```\s*$", "", text)
-    return text.strip()
+from app.models.discovery_schemas import (
+    DiscoveryRequest,
+    RankedDiscovery,
+    RecalledDiscovery,
+)
+from app.prompts.discovery import get_discovery_prompt, get_grounded_discovery_prompt
+from app.services.discovery_cache import get_discovery_cache
+from app.services.llm import get_client
+from app.services.metrics import DISCOVERY_SECONDS, span
+from app.services.repo_index import RepoIndex, get_repo_index
+from app.services.routing import record_call, response_usage, tier_model
+from app.services.sse import encode_event
+from app.services.structured import SchemaError, tool_input, validate, with_tool
+
+# Fields of a recommendation that come from the index rather than the model.
+_INDEXED_FIELDS = ("repo_name", "github_url", "stars", "language", "license", "description")
 
 
 def _make_event(event_type: str, **kwargs) -> dict:
     """Create an SSE event dict for sse-starlette."""
     payload = {"event_type": event_type, **kwargs}
-    return {"data": json.dumps(payload)}
+    return {"data": encode_event(payload)}
+
+
+def _ground(
+    recommendations: list[dict], candidates: list[dict], index: RepoIndex | None
+) -> list[dict]:
+    """Replace model-recalled metadata with indexed metadata.
+
+    When the model ranked ``candidates``, anything it named outside them is
+    dropped. Otherwise recommendations found in the index are corrected and
+    the rest pass through as the model gave them. Indexed ones are flagged
+    ``indexed: true``.
+    """
+    known = {c["repo_name"].lower(): c for c in candidates}
+    grounded: list[dict] = []
+    for rec in recommendations:
+        name = str(rec.get("repo_name", "")).lower()
+        document = known.get(name)
+        if document is None and not candidates and index is not None:
+            document = index.get(name)
+        if document is None and candidates:
+            continue
+        if document is not None:
+            rec = {**rec, **{f: document[f] for f in _INDEXED_FIELDS}, "indexed": True}
+        grounded.append(rec)
+    for rank, rec in enumerate(grounded, 1):
+        rec["rank"] = rank
+    return grounded
 
 
 async def run_discovery(
     request: DiscoveryRequest,
 ) -> AsyncGenerator[dict, None]:
-    """Run discovery, yielding SSE event dicts."""
-    client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+    """Run discovery, yielding SSE event dicts.
+
+    Answers to the same or a similar earlier query (with the same filters)
+    come from the discovery cache without a model call; ``discovery_complete``
+    reports the lookup under ``cache``.
+    """
+    client = get_client()
+    cache = get_discovery_cache()
 
     yield _make_event(
         "discovery_start",
         message="Searching for matching open source projects...",
     )
 
+    cached, kind, similarity = cache.lookup(request)
+    if cached is not None:
+        yield _make_event(
+            "discovery_complete",
+            data=cached,
+            reasoning=cached.get("reasoning_steps", []),
+            message=f"Found {len(cached.get('recommendations', []))} recommendations (cached)",
+            elapsed=0.0,
+            cached=True,
+            cache={"result": kind, "similarity": similarity, "hit_rate": cache.hit_rate()},
+        )
+        yield _make_event("done", message="Discovery complete")
+        return
+
+    # Candidates from the local index let the model rank real repos with real
+    # metadata instead of recalling them, with a much shorter answer.
+    index = get_repo_index()
+    candidates: list[dict] = []
+    if index is not None:
+        try:
+            candidates = await asyncio.to_thread(
+                index.search, request.query, request.filters, settings.discovery_candidates
+            )
+        except Exception:
+            candidates = []  # the index only ever helps
+    if len(candidates) < request.max_results:
+        candidates = []
+
     yield _make_event(
         "discovery_thinking",
-        message="Analyzing your requirements and finding the best matches...",
+        message=(
+            f"Ranking {len(candidates)} indexed projects against your requirements..."
+            if candidates
+            else "Analyzing your requirements and finding the best matches..."
+        ),
     )
 
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     try:
-        prompt = get_discovery_prompt(request)
-
-        response = client.messages.create(
-            model=settings.model_name,
-            max_tokens=4096,
-            messages=[{"role": "user", "content": prompt}],
+        if candidates:
+            prompt = get_grounded_discovery_prompt(request, candidates)
+            schema = RankedDiscovery
+        else:
+            prompt = get_discovery_prompt(request)
+            schema = RecalledDiscovery
+
+        model = tier_model(settings.discovery_model)
+        request_body = with_tool(
+            {
+                "model": model,
+                "max_tokens": 2048 if candidates else 4096,
+                "messages": [{"role": "user", "content": prompt}],
+            },
+            "submit_recommendations",
+            schema,
+            "Submit the recommended repositories.",
         )
-
-        raw_text = response.content[0].text
-        cleaned = _clean_json(raw_text)
-        parsed = json.loads(cleaned)
-        elapsed = round(time.time() - start_time, 1)
+        with span(
+            "discovery.model", query=request.query, candidates=len(candidates), model=model
+        ):
+            response = await client.messages.create(**request_body)
+
+        record_call(
+            settings.discovery_model,
+            model,
+            time.perf_counter() - start_time,
+            response_usage(response),
+        )
+        parsed, errors = validate(schema, tool_input(response, "submit_recommendations"))
+        if errors:
+            raise SchemaError(errors)
+        parsed["recommendations"] = await asyncio.to_thread(
+            _ground, parsed.get("recommendations", []), candidates, index
+        )
+        elapsed = round(time.perf_counter() - start_time, 1)
+        DISCOVERY_SECONDS.observe(time.perf_counter() - start_time, outcome="ok")
 
         reasoning = parsed.get("reasoning_steps", [])
+        cache.store(request, parsed)
 
         yield _make_event(
             "discovery_complete",
@@ -64,15 +159,20 @@ async def run_discovery(
             reasoning=reasoning,
             message=f"Found {len(parsed.get('recommendations', []))} recommendations ({elapsed}s)",
             elapsed=elapsed,
+            grounded=bool(candidates),
+            candidates=len(candidates),
+            cache={"result": kind, "similarity": similarity, "hit_rate": cache.hit_rate()},
         )
 
-    except json.JSONDecodeError as e:
+    except (json.JSONDecodeError, SchemaError) as e:
+        DISCOVERY_SECONDS.observe(time.perf_counter() - start_time, outcome="parse_error")
         yield _make_event(
             "error",
             message=f"Failed to parse recommendations: {str(e)}",
         )
 
     except Exception as e:
+        DISCOVERY_SECONDS.observe(time.perf_counter() - start_time, outcome="error")
         yield _make_event(
             "error",
             message=f"Discovery error: {str(e)}",
@@ -0,0 +1,192 @@
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+
+from app.config import settings
+from app.models.discovery_schemas import DiscoveryRequest
+from app.services.metrics import DISCOVERY_CACHE
+from app.services.routing import tier_model
+
+_WORD = re.compile(r"[a-z0-9+#]+")
+# Words that carry no intent in a discovery query.
+STOPWORDS = frozenset(
+    "a an and any are for i in is it looking me my need of on or some something "
+    "that the to want we with".split()
+)
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def query_terms(query: str) -> list[str]:
+    """Normalized query words: lowercased, stop words dropped, plurals folded."""
+    return [_stem(w) for w in _WORD.findall(query.lower()) if w not in STOPWORDS]
+
+
+def filters_key(request: DiscoveryRequest) -> str:
+    """Everything besides the query text that shapes the answer, normalized."""
+    filters = request.filters.model_dump()
+    filters["languages"] = sorted({lang.strip().lower() for lang in filters["languages"]})
+    for field in ("domain", "scale", "license_preference"):
+        filters[field] = " ".join(filters[field].lower().split())
+    filters["max_results"] = request.max_results
+    filters["model"] = tier_model(settings.discovery_model)
+    return json.dumps(filters, sort_keys=True)
+
+
+class _Entry:
+    __slots__ = ("filters", "terms", "tf", "result", "stored_at")
+
+    def __init__(self, filters: str, terms: list[str], result: dict):
+        self.filters = filters
+        self.terms = terms
+        self.tf: dict[str, int] = {}
+        for term in terms:
+            self.tf[term] = self.tf.get(term, 0) + 1
+        self.result = result
+        self.stored_at = time.time()
+
+
+class DiscoveryCache:
+    """Recent discovery answers, found by exact or similar query.
+
+    Queries are normalized to their terms. An identical term sequence with
+    the same filters is an exact hit. Otherwise, past queries with the same
+    filters whose terms all appear in the new query are scored by TF-IDF
+    cosine similarity, with document frequencies taken over the cached
+    queries, and the best one at or above ``threshold`` is a similar hit.
+    The query may therefore add a qualifier to a cached one, but never drop
+    one: "web framework" must not inherit the answer to "python web
+    framework". Entries expire after ``ttl``
+    seconds, and the least recently used are evicted past ``max_entries``.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        # term -> keys of the entries whose query contains it
+        self._postings: dict[str, set[str]] = {}
+        self.stats = {"exact": 0, "similar": 0, "miss": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def summary(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "hit_rate": self.hit_rate()}
+
+    def hit_rate(self) -> float:
+        lookups = sum(self.stats.values())
+        hits = self.stats["exact"] + self.stats["similar"]
+        return round(hits / lookups, 3) if lookups else 0.0
+
+    def _key(self, filters: str, terms: list[str]) -> str:
+        return filters + "\0" + " ".join(terms)
+
+    def lookup(self, request: DiscoveryRequest) -> tuple[dict | None, str, float]:
+        """Return ``(result, kind, similarity)``; kind is exact, similar or miss."""
+        filters = filters_key(request)
+        terms = query_terms(request.query)
+        key = self._key(filters, terms)
+
+        entry = self._entries.get(key)
+        if entry is not None and not self._expired(key, entry):
+            return self._hit(key, "exact", 1.0)
+
+        best_key, best = "", 0.0
+        query = set(terms)
+        for candidate in self._candidates(filters, terms):
+            if not query.issuperset(self._entries[candidate].tf):
+                continue  # the cached answer is narrower than the query
+            similarity = self._cosine(terms, self._entries[candidate])
+            if similarity > best:
+                best_key, best = candidate, similarity
+        if best_key and best >= self.threshold:
+            return self._hit(best_key, "similar", best)
+
+        self.stats["miss"] += 1
+        DISCOVERY_CACHE.inc(result="miss")
+        return None, "miss", round(best, 3)
+
+    def store(self, request: DiscoveryRequest, result: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        filters = filters_key(request)
+        terms = query_terms(request.query)
+        key = self._key(filters, terms)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(filters, terms, result)
+        for term in set(terms):
+            self._postings.setdefault(term, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _hit(self, key: str, kind: str, similarity: float):
+        self._entries.move_to_end(key)
+        self.stats[kind] += 1
+        DISCOVERY_CACHE.inc(result=kind)
+        return self._entries[key].result, kind, round(similarity, 3)
+
+    def _expired(self, key: str, entry: _Entry) -> bool:
+        if time.time() - entry.stored_at <= self.ttl:
+            return False
+        self._remove(key)
+        return True
+
+    def _candidates(self, filters: str, terms: list[str]) -> list[str]:
+        keys: set[str] = set()
+        for term in set(terms):
+            keys |= self._postings.get(term, set())
+        return [
+            key for key in keys
+            if self._entries[key].filters == filters
+            and not self._expired(key, self._entries[key])
+        ]
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log((1 + len(self._entries)) / (1 + df)) + 1
+
+    def _cosine(self, terms: list[str], entry: _Entry) -> float:
+        tf: dict[str, int] = {}
+        for term in terms:
+            tf[term] = tf.get(term, 0) + 1
+        query = {t: n * self._idf(t) for t, n in tf.items()}
+        stored = {t: n * self._idf(t) for t, n in entry.tf.items()}
+        dot = sum(w * stored.get(t, 0.0) for t, w in query.items())
+        norms = math.sqrt(sum(w * w for w in query.values())) * math.sqrt(
+            sum(w * w for w in stored.values())
+        )
+        return dot / norms if norms else 0.0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for term in set(entry.terms):
+            keys = self._postings.get(term)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[term]
+
+
+_cache: DiscoveryCache | None = None
+
+
+def get_discovery_cache() -> DiscoveryCache:
+    global _cache
+    if _cache is None:
+        _cache = DiscoveryCache(
+            settings.discovery_cache_max_entries,
+            settings.discovery_cache_ttl,
+            settings.discovery_cache_threshold,
+        )
+    return _cache
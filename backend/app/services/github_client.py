@@ -0,0 +1,60 @@
+import httpx
+
+from app.config import settings
+from app.services.http_cache import CachingTransport, HttpCacheStore
+from app.services.ratelimit import RateLimitedTransport, github_limiter, github_quota
+
+_client: httpx.AsyncClient | None = None
+_cache: CachingTransport | None = None
+
+
+def open_client() -> httpx.AsyncClient:
+    """Create the application-wide GitHub client.
+
+    Requests pass through the HTTP cache (if enabled), then the adaptive rate
+    limiter, so revalidations are admitted like any other call.
+    """
+    global _client, _cache
+    if _client is None:
+        transport: httpx.AsyncBaseTransport = RateLimitedTransport(
+            httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.github_max_connections,
+                    max_keepalive_connections=settings.github_max_connections,
+                )
+            ),
+            github_limiter,
+            github_quota,
+        )
+        if settings.http_cache_enabled:
+            _cache = CachingTransport(
+                transport,
+                HttpCacheStore(
+                    settings.http_cache_path,
+                    settings.http_cache_max_bytes,
+                    settings.http_cache_max_age,
+                    settings.http_cache_max_entry_bytes,
+                ),
+            )
+            transport = _cache
+        _client = httpx.AsyncClient(transport=transport)
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client and its cache store."""
+    global _client, _cache
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _cache = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, opening it lazily outside the app lifespan."""
+    return _client or open_client()
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the HTTP cache (empty when it is disabled)."""
+    return _cache.stats() if _cache is not None else {}
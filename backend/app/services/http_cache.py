@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import httpx
+
+from app.services.metrics import GITHUB_HTTP_CACHE
+
+# Only small API payloads are worth storing; archives stream straight through.
+CACHEABLE_TYPES = ("application/json", "text/plain", "text/markdown")
+
+
+class HttpCacheStore:
+    """SQLite store of GET response bodies plus their ETag/Last-Modified."""
+
+    def __init__(self, path: str, max_bytes: int, max_age: float, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_entry_bytes = max_entry_bytes
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            " key TEXT PRIMARY KEY, headers TEXT NOT NULL, body BLOB NOT NULL,"
+            " size INTEGER NOT NULL, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> tuple[list[list[str]], bytes] | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT headers, body, stored_at FROM http_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.max_age:
+                self._conn.execute("DELETE FROM http_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE http_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return json.loads(row[0]), row[1]
+
+    def put(self, key: str, headers: list[list[str]], body: bytes) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(headers), body, len(body), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM http_cache WHERE stored_at < ?", (now - self.max_age,)
+            )
+            total = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM http_cache"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM http_cache ORDER BY accessed_at"
+                ).fetchall()
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM http_cache WHERE key = ?", (old_key,))
+                    total -= size
+            self._conn.commit()
+
+    def touch(self, key: str) -> None:
+        """Restart an entry's age after the origin confirmed it is current."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE http_cache SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class _TeeStream(httpx.AsyncByteStream):
+    """Pass a response body through as it arrives, keeping a copy to store.
+
+    The copy is dropped once it grows past ``limit`` bytes, so large
+    bodies (recursive tree listings) stream through uncached instead of
+    being held in memory.
+    """
+
+    def __init__(self, response: httpx.Response, limit: int, on_complete):
+        self._response = response
+        self._limit = limit
+        self._on_complete = on_complete
+
+    async def __aiter__(self):
+        kept: list[bytes] | None = []
+        size = 0
+        async for chunk in self._response.aiter_raw():
+            if kept is not None:
+                size += len(chunk)
+                if size > self._limit:
+                    kept = None
+                else:
+                    kept.append(chunk)
+            yield chunk
+        if kept is not None:
+            await self._on_complete(b"".join(kept))
+
+    async def aclose(self) -> None:
+        await self._response.aclose()
+
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Revalidating cache in front of another transport.
+
+    Stored responses are revalidated with If-None-Match / If-Modified-Since,
+    and a 304 is answered from the store. GitHub does not count 304s against
+    the rate limit, so unchanged repos cost nothing to re-ingest.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, store: HttpCacheStore):
+        self._transport = transport
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(request: httpx.Request) -> str:
+        parts = [
+            str(request.url),
+            request.headers.get("accept", ""),
+            request.headers.get("authorization", ""),
+        ]
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "GET":
+            return await self._transport.handle_async_request(request)
+
+        key = self._key(request)
+        entry = await asyncio.to_thread(self.store.get, key)
+        if entry is not None:
+            cached_headers = httpx.Headers(entry[0])
+            if "etag" in cached_headers:
+                request.headers["If-None-Match"] = cached_headers["etag"]
+            if "last-modified" in cached_headers:
+                request.headers["If-Modified-Since"] = cached_headers["last-modified"]
+
+        response = await self._transport.handle_async_request(request)
+
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            self.hits += 1
+            GITHUB_HTTP_CACHE.inc(result="hit")
+            await asyncio.to_thread(self.store.touch, key)
+            return httpx.Response(
+                200,
+                headers=entry[0],
+                stream=httpx.ByteStream(entry[1]),
+                request=request,
+                extensions={"from_cache": True},
+            )
+
+        self.misses += 1
+        GITHUB_HTTP_CACHE.inc(result="miss")
+        content_type = response.headers.get("content-type", "")
+        has_validator = "etag" in response.headers or "last-modified" in response.headers
+        if (
+            response.status_code == 200
+            and has_validator
+            and content_type.startswith(CACHEABLE_TYPES)
+        ):
+            # Store the raw (possibly still compressed) bytes with their
+            # headers so the client decodes a replay exactly like the original.
+            headers = [[k, v] for k, v in response.headers.multi_items()]
+
+            async def store(body: bytes) -> None:
+                await asyncio.to_thread(self.store.put, key, headers, body)
+
+            return httpx.Response(
+                200,
+                headers=headers,
+                stream=_TeeStream(response, self.store.max_entry_bytes, store),
+                request=request,
+                extensions=response.extensions,
+            )
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+        self.store.close()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
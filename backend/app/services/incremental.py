@@ -0,0 +1,141 @@
+import hashlib
+import json
+
+from app.config import settings
+from app.models.schemas import RepoContent
+from app.prompts.passes import PASS_DEFINITIONS, SHARED_CONTEXT
+from app.services.cache import PassCache
+from app.services.sse import dumps, splice
+from app.services.structured import input_schema
+
+# How each input category is described in a delta prompt.
+_CHANGE_LABELS = {
+    "readme": "the README",
+    "description": "the repository description",
+    "languages": "the language breakdown",
+    "tree": "the file tree (files added, removed or moved)",
+}
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def input_digests(repo_content: RepoContent) -> dict[str, str]:
+    """Fingerprint each analysis input: README, description, languages, the
+    file tree and every fetched file (as ``config:<path>``).
+
+    Hashing a large tree takes a while; call this off the event loop.
+    """
+    tree = hashlib.sha256()
+    for path in repo_content.tree:
+        tree.update(path.encode())
+        tree.update(b"\n")
+    digests = {
+        "readme": _digest(repo_content.readme),
+        "description": _digest(repo_content.description),
+        "languages": _digest(json.dumps(repo_content.languages, sort_keys=True)),
+        "tree": tree.hexdigest()[:16],
+    }
+    for path, text in repo_content.config_files.items():
+        digests[f"config:{path}"] = _digest(text)
+    return digests
+
+
+def diff_inputs(old: dict[str, str], new: dict[str, str]) -> dict[str, list[str]]:
+    """Changed inputs by category, e.g. ``{"config": ["package.json"]}``."""
+    changes: dict[str, list[str]] = {}
+    for key in sorted(old.keys() | new.keys()):
+        if old.get(key) != new.get(key):
+            category, _, name = key.partition(":")
+            changes.setdefault(category, []).append(name or category)
+    return changes
+
+
+def snapshot_key(repo: str, analysis_id: str) -> str:
+    """Where the inputs and results of one analysis are kept in the pass cache.
+
+    Prompts, response schemas, the model and the context budget are part of
+    the key, so a snapshot is never reused across a change to any of them.
+    """
+    prompts = SHARED_CONTEXT + "".join(
+        d["prompt"] + json.dumps(input_schema(d["schema"]), sort_keys=True)
+        for d in PASS_DEFINITIONS
+    )
+    parts = [
+        "snapshot",
+        repo.lower(),
+        analysis_id,
+        hashlib.sha256(prompts.encode()).hexdigest(),
+        str(settings.context_token_budget),
+        settings.model_name,
+    ]
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+async def load_snapshot(cache: PassCache, repo: str, analysis_id: str) -> dict | None:
+    try:
+        raw = await cache.get(snapshot_key(repo, analysis_id))
+    except Exception:
+        return None  # a broken cache only costs the reuse
+    return json.loads(raw) if raw else None
+
+
+async def save_snapshot(
+    cache: PassCache,
+    repo: str,
+    analysis_id: str,
+    digests: dict[str, str],
+    passes: dict[str, str],
+) -> None:
+    """Store an analysis's inputs and its encoded pass payloads, spliced in as is."""
+    encoded = ",".join(f"{dumps(name)}:{payload}" for name, payload in passes.items())
+    snapshot = splice(
+        '{"passes":{' + encoded + "}}",
+        analysis_id=analysis_id,
+        inputs=digests,
+    )
+    try:
+        await cache.set(snapshot_key(repo, analysis_id), snapshot)
+    except Exception:
+        pass
+
+
+def plan_pass(
+    definition: dict, snapshot: dict, changes: dict[str, list[str]]
+) -> tuple[str, dict[str, list[str]]]:
+    """Decide how a pass is brought up to date from a previous analysis.
+
+    Returns ``("reuse", {})`` when none of the pass's inputs changed,
+    ``("delta", relevant_changes)`` when at most
+    ``settings.incremental_max_changes`` of them did, and ``("full", {})``
+    otherwise or when the previous analysis has no result for the pass.
+    """
+    if definition["name"] not in snapshot.get("passes", {}):
+        return "full", {}
+    relevant = {c: changes[c] for c in definition["inputs"] if c in changes}
+    if not relevant:
+        return "reuse", {}
+    if sum(len(names) for names in relevant.values()) <= settings.incremental_max_changes:
+        return "delta", relevant
+    return "full", {}
+
+
+def delta_prompt(previous: dict, relevant: dict[str, list[str]]) -> str:
+    """Prompt block asking the model to revise a previous pass result."""
+    lines = []
+    for category, names in relevant.items():
+        if category == "config":
+            lines.extend(f"- {name}" for name in names)
+        else:
+            lines.append(f"- {_CHANGE_LABELS.get(category, category)}")
+    return (
+        "This repository was analyzed before. Since then only the following inputs "
+        "changed:\n"
+        + "\n".join(lines)
+        + "\n\nPrevious result for this analysis:\n"
+        + json.dumps(previous.get("data", {}), indent=1)
+        + "\n\nRevise the previous result to match the current repository content "
+        "above. Keep findings the changes do not affect; update or remove the "
+        "ones they do."
+    )
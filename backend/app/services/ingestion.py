@@ -1,32 +1,23 @@
 import asyncio
 import base64
+import heapq
 import re
+import time
+import zlib
 
 import httpx
 
 from app.config import settings
+from app.models.path_tree import PathTree
 from app.models.schemas import RepoContent
-
-PRIORITY_FILES = [
-    "package.json",
-    "requirements.txt",
-    "pyproject.toml",
-    "setup.py",
-    "setup.cfg",
-    "Cargo.toml",
-    "go.mod",
-    "Gemfile",
-    "docker-compose.yml",
-    "docker-compose.yaml",
-    "Dockerfile",
-    ".env.example",
-    "Makefile",
-    "tsconfig.json",
-    "webpack.config.js",
-    "vite.config.ts",
-    "next.config.js",
-    "next.config.mjs",
-]
+from app.prompts.packer import path_score
+from app.services.github_client import get_client
+from app.services.metrics import GITHUB_FETCH_SECONDS, INGESTION_SECONDS, span
+from app.services.path_tree import TreeListingScanner
+from app.services.ratelimit import UpstreamRateLimited, is_rate_limited, retry_after
+from app.services.repo_index import get_repo_index
+from app.services.tarball import TarballReader
+from app.services.workspaces import group_workspaces, plan_fetch
 
 
 def parse_github_url(url: str) -> tuple[str, str]:
@@ -36,6 +27,12 @@ def parse_github_url(url: str) -> tuple[str, str]:
     return match.group(1), match.group(2)
 
 
+def repo_key(url: str) -> str:
+    """Normalize a repo URL to a lowercase "owner/repo" key."""
+    owner, repo = parse_github_url(url)
+    return f"{owner}/{repo.removesuffix('.git')}".lower()
+
+
 def _headers() -> dict[str, str]:
     h = {"Accept": "application/vnd.github.v3+json"}
     if settings.github_token:
@@ -43,31 +40,75 @@ def _headers() -> dict[str, str]:
     return h
 
 
-async def _fetch_json(client: httpx.AsyncClient, url: str) -> dict | list | None:
+async def _get(client: httpx.AsyncClient, url: str, endpoint: str) -> httpx.Response:
+    """GET with per-endpoint latency and status recorded.
+
+    Raises UpstreamRateLimited once the transport has given up retrying a
+    rate-limited call, rather than letting it read as a missing file.
+    """
+    start = time.perf_counter()
+    status = "error"
+    with span("github.fetch", endpoint=endpoint, url=url) as s:
+        try:
+            resp = await client.get(url, headers=_headers(), timeout=15)
+            status = str(resp.status_code)
+        finally:
+            s["attributes"]["status"] = status
+            GITHUB_FETCH_SECONDS.observe(
+                time.perf_counter() - start, endpoint=endpoint, status=status
+            )
+    if is_rate_limited(resp):
+        raise UpstreamRateLimited("GitHub", retry_after(resp) or 60.0)
+    return resp
+
+
+async def _fetch_json(
+    client: httpx.AsyncClient, url: str, endpoint: str = "api"
+) -> dict | list | None:
     try:
-        resp = await client.get(url, headers=_headers(), timeout=15)
+        resp = await _get(client, url, endpoint)
         if resp.status_code == 200:
             return resp.json()
+    except UpstreamRateLimited:
+        raise
     except Exception:
         pass
     return None
 
 
-async def _fetch_text(client: httpx.AsyncClient, url: str) -> str:
+async def _fetch_text(client: httpx.AsyncClient, url: str, endpoint: str = "raw") -> str:
     try:
-        resp = await client.get(url, headers=_headers(), timeout=15)
+        resp = await _get(client, url, endpoint)
         if resp.status_code == 200:
             return resp.text
+    except UpstreamRateLimited:
+        raise
     except Exception:
         pass
     return ""
 
 
+def _repo_metadata(repo_info) -> dict:
+    """The RepoContent fields taken from the repo info response."""
+    if not isinstance(repo_info, dict):
+        return {}
+    license_info = repo_info.get("license") or {}
+    spdx = license_info.get("spdx_id") or ""
+    return {
+        "description": repo_info.get("description") or "",
+        "stars": repo_info.get("stargazers_count") or 0,
+        "license": spdx if spdx != "NOASSERTION" else license_info.get("name") or "",
+        "topics": [t for t in repo_info.get("topics") or [] if isinstance(t, str)],
+        "pushed_at": repo_info.get("pushed_at") or "",
+        "archived": bool(repo_info.get("archived")),
+    }
+
+
 async def _fetch_file_content(
     client: httpx.AsyncClient, owner: str, repo: str, path: str
 ) -> str:
-    url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-    data = await _fetch_json(client, url)
+    url = f"{settings.github_api_url}/repos/{owner}/{repo}/contents/{path}"
+    data = await _fetch_json(client, url, "contents")
     if data and isinstance(data, dict) and data.get("content"):
         try:
             content = base64.b64decode(data["content"]).decode("utf-8", errors="replace")
@@ -77,56 +118,260 @@ async def _fetch_file_content(
     return ""
 
 
-async def fetch_repo_content(url: str) -> RepoContent:
-    owner, repo = parse_github_url(url)
+async def _fetch_tree(client: httpx.AsyncClient, url: str) -> tuple[str, PathTree]:
+    """Stream the recursive tree listing straight into a PathTree.
+
+    Entries are scanned out of the response as it arrives, so neither the
+    whole listing nor a dict per entry is ever held at once. Returns the tree
+    SHA (empty on failure) and the paths.
+    """
+    tree = PathTree(settings.max_tree_entries)
+    scanner = TreeListingScanner()
+    start = time.perf_counter()
+    status = "error"
+    with span("github.fetch", endpoint="tree", url=url) as s:
+        try:
+            async with client.stream("GET", url, headers=_headers(), timeout=15) as resp:
+                status = str(resp.status_code)
+                if is_rate_limited(resp):
+                    raise UpstreamRateLimited("GitHub", retry_after(resp) or 60.0)
+                if resp.status_code != 200:
+                    return "", tree
+                async for chunk in resp.aiter_text():
+                    for entry in scanner.feed(chunk):
+                        path = entry.get("path", "")
+                        if entry.get("type") == "tree":
+                            tree.add_dir(path)
+                        elif path:
+                            tree.add(path, entry.get("size", 0))
+        except httpx.HTTPError:
+            return "", tree
+        finally:
+            s["attributes"]["status"] = status
+            GITHUB_FETCH_SECONDS.observe(
+                time.perf_counter() - start, endpoint="tree", status=status
+            )
+    return scanner.sha, tree
+
+
+async def _fetch_via_api(
+    client: httpx.AsyncClient, owner: str, repo: str
+) -> RepoContent:
+    repo_url = f"{settings.github_api_url}/repos/{owner}/{repo}"
+    readme_url = f"{settings.github_raw_url}/{owner}/{repo}/HEAD/README.md"
+    tree_url = f"{settings.github_api_url}/repos/{owner}/{repo}/git/trees/HEAD?recursive=1"
+    langs_url = f"{settings.github_api_url}/repos/{owner}/{repo}/languages"
+
+    repo_info, readme_text, (tree_sha, tree), languages = await asyncio.gather(
+        _fetch_json(client, repo_url, "repo"),
+        _fetch_text(client, readme_url, "readme"),
+        _fetch_tree(client, tree_url),
+        _fetch_json(client, langs_url, "languages"),
+    )
+
+    metadata = _repo_metadata(repo_info)
+
+    readme_text = (readme_text or "")[: settings.max_content_size]
+
+    # Manifests, entrypoints, CI and security files at any depth, grouped by
+    # sub-project and planned against the byte budget using the tree's sizes.
+    # Ranking a very large tree takes a while, so it runs off the event loop.
+    workspaces = await asyncio.to_thread(group_workspaces, tree)
+    files_to_fetch = plan_fetch(
+        workspaces,
+        tree,
+        settings.max_context_files,
+        settings.context_fetch_bytes,
+        settings.max_file_size,
+    )
+
+    config_files: dict[str, str] = {}
+    if files_to_fetch:
+        pool = asyncio.Semaphore(settings.context_fetch_concurrency)
+
+        async def fetch(path: str) -> str:
+            async with pool:
+                return await _fetch_file_content(client, owner, repo, path)
+
+        results = await asyncio.gather(*[fetch(f) for f in files_to_fetch])
+        for fname, content in zip(files_to_fetch, results):
+            if content:
+                config_files[fname] = content
+
+    return RepoContent(
+        repo_name=repo,
+        owner=owner,
+        tree_sha=tree_sha,
+        readme=readme_text,
+        tree=tree,
+        config_files=config_files,
+        workspaces=workspaces,
+        languages=languages if isinstance(languages, dict) else {},
+        **metadata,
+    )
+
 
-    async with httpx.AsyncClient() as client:
-        repo_url = f"https://api.github.com/repos/{owner}/{repo}"
-        readme_url = f"https://raw.githubusercontent.com/{owner}/{repo}/HEAD/README.md"
-        tree_url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/HEAD?recursive=1"
-        langs_url = f"https://api.github.com/repos/{owner}/{repo}/languages"
-
-        repo_info, readme_text, tree_data, languages = await asyncio.gather(
-            _fetch_json(client, repo_url),
-            _fetch_text(client, readme_url),
-            _fetch_json(client, tree_url),
-            _fetch_json(client, langs_url),
-        )
-
-        description = ""
-        if repo_info and isinstance(repo_info, dict):
-            description = repo_info.get("description", "") or ""
-
-        readme_text = (readme_text or "")[: settings.max_content_size]
-
-        file_tree: list[str] = []
-        tree_paths: set[str] = set()
-        if tree_data and isinstance(tree_data, dict):
-            for item in tree_data.get("tree", [])[:2000]:
-                path = item.get("path", "")
-                file_tree.append(path)
-                tree_paths.add(path)
-
-        files_to_fetch: list[str] = []
-        for pf in PRIORITY_FILES:
-            if pf in tree_paths and len(files_to_fetch) < 12:
-                files_to_fetch.append(pf)
-
-        config_files: dict[str, str] = {}
-        if files_to_fetch:
-            results = await asyncio.gather(
-                *[_fetch_file_content(client, owner, repo, f) for f in files_to_fetch]
+async def _fetch_via_tarball(
+    client: httpx.AsyncClient, owner: str, repo: str
+) -> RepoContent:
+    """Ingest from a single streamed archive instead of per-file API calls.
+
+    Only the repo info is fetched separately; the README, tree, config files
+    and a by-extension language breakdown all come out of the tarball. The
+    archive's pax header carries the commit SHA, which stands in for the tree
+    SHA as the content address.
+    """
+    repo_url = f"{settings.github_api_url}/repos/{owner}/{repo}"
+    tarball_url = f"{settings.github_api_url}/repos/{owner}/{repo}/tarball"
+
+    # Only the best candidates seen so far stay captured (twice what can be
+    # kept, so the workspace round-robin below has a choice); a better one
+    # arriving later evicts the weakest.
+    kept: list[tuple[float, str]] = []
+
+    def want(path: str) -> bool:
+        if path.lower() == "readme.md":
+            return True
+        score = path_score(path)
+        if score <= 0:
+            return False
+        if len(kept) < settings.max_context_files * 2:
+            heapq.heappush(kept, (score, path))
+            return True
+        if score <= kept[0][0]:
+            return False
+        _, evicted = heapq.heappushpop(kept, (score, path))
+        reader.files.pop(evicted, None)
+        return True
+
+    reader = TarballReader(
+        want=want,
+        max_file_size=max(settings.max_file_size, settings.max_content_size),
+        max_files=settings.max_tree_entries,
+    )
+
+    async def stream_archive() -> None:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with client.stream(
+                "GET", tarball_url, headers=_headers(), timeout=60, follow_redirects=True
+            ) as resp:
+                status = str(resp.status_code)
+                if is_rate_limited(resp):
+                    raise UpstreamRateLimited("GitHub", retry_after(resp) or 60.0)
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes():
+                    reader.feed(chunk)
+                    if reader.finished:
+                        break
+        finally:
+            GITHUB_FETCH_SECONDS.observe(
+                time.perf_counter() - start, endpoint="tarball", status=status
+            )
+
+    repo_info, _ = await asyncio.gather(
+        _fetch_json(client, repo_url, "repo"), stream_archive()
+    )
+
+    metadata = _repo_metadata(repo_info)
+
+    readme_text = next(
+        (text for path, text in reader.files.items() if path.lower() == "readme.md"), ""
+    )
+
+    workspaces = await asyncio.to_thread(group_workspaces, reader.tree)
+    captured = {
+        root: [p for p in files if p in reader.files] for root, files in workspaces.items()
+    }
+    sizes = {path: len(text.encode()) for path, text in reader.files.items()}
+    config_files: dict[str, str] = {}
+    for fname in plan_fetch(
+        captured,
+        sizes,
+        settings.max_context_files,
+        settings.context_fetch_bytes,
+        settings.max_file_size,
+    ):
+        content = reader.files.get(fname, "")[: settings.max_file_size]
+        if content:
+            config_files[fname] = content
+
+    return RepoContent(
+        repo_name=repo,
+        owner=owner,
+        tree_sha=reader.commit_sha,
+        readme=readme_text[: settings.max_content_size],
+        tree=reader.tree,
+        config_files=config_files,
+        workspaces=workspaces,
+        languages=reader.languages,
+        **metadata,
+    )
+
+
+async def list_org_repos(org: str, limit: int) -> list[str]:
+    """URLs of an organization's (or user's) own repositories, up to ``limit``.
+
+    Forks and archived repositories are left out. Pages through the listing
+    100 at a time; an unknown org yields an empty list.
+    """
+    client = get_client()
+    urls: list[str] = []
+    for kind in ("orgs", "users"):
+        page = 1
+        while len(urls) < limit:
+            listing = await _fetch_json(
+                client,
+                f"{settings.github_api_url}/{kind}/{org}/repos?per_page=100&page={page}",
+                "repos",
             )
-            for fname, content in zip(files_to_fetch, results):
-                if content:
-                    config_files[fname] = content
-
-        return RepoContent(
-            repo_name=repo,
-            owner=owner,
-            readme=readme_text,
-            file_tree=file_tree[:500],
-            config_files=config_files,
-            languages=languages if isinstance(languages, dict) else {},
-            description=description,
-        )
+            if not isinstance(listing, list):
+                break
+            urls.extend(
+                r["html_url"]
+                for r in listing
+                if isinstance(r, dict)
+                and r.get("html_url")
+                and not r.get("fork")
+                and not r.get("archived")
+            )
+            if len(listing) < 100:
+                break
+            page += 1
+        if urls or page > 1:
+            break
+    return urls[:limit]
+
+
+async def fetch_repo_content(url: str, mode: str | None = None) -> RepoContent:
+    owner, repo = parse_github_url(url)
+    mode = mode or settings.ingestion_mode
+
+    client = get_client()
+    start = time.perf_counter()
+    with span("ingestion", repo=f"{owner}/{repo}", mode=mode):
+        try:
+            content = None
+            if mode == "tarball":
+                try:
+                    content = await _fetch_via_tarball(client, owner, repo)
+                except (httpx.HTTPError, zlib.error):
+                    pass  # fall back to the per-file API path
+            if content is None:
+                content = await _fetch_via_api(client, owner, repo)
+        finally:
+            INGESTION_SECONDS.observe(time.perf_counter() - start, mode=mode)
+    await _index_repo(content)
+    return content
+
+
+async def _index_repo(content: RepoContent) -> None:
+    """Add a fetched repo to the discovery index; indexing never fails ingestion."""
+    index = get_repo_index()
+    if index is None or not content.tree_sha:
+        return
+    try:
+        await asyncio.to_thread(index.add, content)
+    except Exception:
+        pass
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.config import settings
+from app.services.analyzer import analyze_repo
+from app.services.sse import encode_event
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("complete", "failed")
+_JOB_COLUMNS = (
+    "id", "url", "status", "error", "worker", "created_at", "updated_at",
+    "batch_id", "pass_mode",
+)
+
+
+class JobStore:
+    """SQLite-backed analysis queue with an append-only event log per job.
+
+    WAL mode lets separate worker processes share the database with the web
+    tier; each event gets a per-job sequence number used as the SSE id.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, url TEXT NOT NULL, status TEXT NOT NULL,"
+            " error TEXT NOT NULL DEFAULT '', worker TEXT NOT NULL DEFAULT '',"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        # Columns added after the first release; older databases gain them here.
+        for column in (
+            "batch_id TEXT NOT NULL DEFAULT ''",
+            "pass_mode TEXT NOT NULL DEFAULT 'live'",
+        ):
+            try:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # already there
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS batches ("
+            " id TEXT PRIMARY KEY, org TEXT NOT NULL DEFAULT '',"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_events ("
+            " job_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, seq))"
+        )
+
+    def _row(self, row) -> dict | None:
+        if row is None:
+            return None
+        return dict(zip(_JOB_COLUMNS, row))
+
+    def create(self, url: str) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, url, status, created_at, updated_at)"
+                " VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, url, now, now),
+            )
+        return self.get(job_id)
+
+    def create_batch(self, urls: list[str], org: str = "", pass_mode: str = "live") -> str:
+        """Queue one job per URL under a new batch, in a single transaction."""
+        now = time.time()
+        batch_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO batches VALUES (?, ?, ?)", (batch_id, org, now)
+                )
+                self._conn.executemany(
+                    "INSERT INTO jobs (id, url, status, created_at, updated_at,"
+                    " batch_id, pass_mode) VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                    [
+                        # Distinct timestamps keep the batch's submission order.
+                        (uuid.uuid4().hex, url, now + i * 1e-6, now, batch_id, pass_mode)
+                        for i, url in enumerate(urls)
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return batch_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            return self._row(self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone())
+
+    def get_batch(self, batch_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, org, created_at FROM batches WHERE id = ?", (batch_id,)
+            ).fetchone()
+        return dict(zip(("id", "org", "created_at"), row)) if row else None
+
+    def batch_jobs(self, batch_id: str) -> list[dict]:
+        """A batch's jobs in submission order."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE batch_id = ?"
+                " ORDER BY created_at",
+                (batch_id,),
+            ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def claim(self, worker: str) -> dict | None:
+        """Atomically take the oldest queued job."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, updated_at = ?"
+                        " WHERE id = ?",
+                        (worker, time.time(), row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row is not None else None
+
+    def heartbeat(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+
+    def requeue_stale(self, lease: float) -> int:
+        """Return running jobs whose worker stopped heartbeating to the queue."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = ''"
+                " WHERE status = 'running' AND updated_at < ?",
+                (time.time() - lease,),
+            )
+            return cursor.rowcount
+
+    def finish(self, job_id: str, status: str, error: str = "") -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def append_event(self, job_id: str, data: str) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?",
+                    (job_id,),
+                ).fetchone()[0]
+                self._conn.execute(
+                    "INSERT INTO job_events VALUES (?, ?, ?)", (job_id, seq, data)
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def events_after(self, job_id: str, after: int) -> list[tuple[int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, data FROM job_events WHERE job_id = ? AND seq > ?"
+                " ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+
+    def batch_events_after(self, batch_id: str, after: int) -> list[tuple[int, str, str]]:
+        """Events of every job in a batch as ``(cursor, job_id, data)``.
+
+        The cursor is the event's rowid, which only grows, so one number
+        resumes the interleaved stream of all the batch's jobs.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT e.rowid, e.job_id, e.data FROM job_events e"
+                " JOIN jobs j ON j.id = e.job_id"
+                " WHERE j.batch_id = ? AND e.rowid > ? ORDER BY e.rowid",
+                (batch_id, after),
+            ).fetchall()
+
+    def pass_results(self, job_id: str) -> dict[str, dict]:
+        """Stored pass_complete payloads for a job, keyed by pass name."""
+        results: dict[str, dict] = {}
+        for _, data in self.events_after(job_id, 0):
+            event = json.loads(data)
+            if event.get("event_type") == "pass_complete":
+                results[event["pass_name"]] = event
+        return results
+
+    def analysis_id(self, job_id: str) -> str:
+        """The analysis id a job's run reported, or "" if it has none yet."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM job_events WHERE job_id = ? ORDER BY seq LIMIT 1",
+                (job_id,),
+            ).fetchone()
+        return json.loads(row[0]).get("analysis_id", "") if row else ""
+
+
+_store: JobStore | None = None
+
+
+def get_job_store() -> JobStore:
+    global _store
+    if _store is None:
+        _store = JobStore(settings.job_db_path)
+    return _store
+
+
+async def _heartbeat(store: JobStore, job_id: str) -> None:
+    while True:
+        await asyncio.sleep(settings.job_lease_seconds / 3)
+        await asyncio.to_thread(store.heartbeat, job_id)
+
+
+async def process_job(store: JobStore, job: dict) -> None:
+    """Run one claimed job, persisting every event as it is produced.
+
+    Passes whose successful results were stored by an earlier, interrupted
+    attempt are skipped, so a resumed job never recomputes them.
+    """
+    stored = await asyncio.to_thread(store.pass_results, job["id"])
+    done = {name for name, event in stored.items() if "error" not in event.get("data", {})}
+    heartbeat = asyncio.create_task(_heartbeat(store, job["id"]))
+    try:
+        async for event in analyze_repo(
+            job["url"], skip_passes=done, pass_mode=job["pass_mode"]
+        ):
+            await asyncio.to_thread(store.append_event, job["id"], event["data"])
+    except Exception as e:
+        error = encode_event({"event_type": "error", "message": f"Analysis failed: {e}"})
+        await asyncio.to_thread(store.append_event, job["id"], error)
+        await asyncio.to_thread(store.finish, job["id"], "failed", str(e))
+    else:
+        await asyncio.to_thread(store.finish, job["id"], "complete")
+    finally:
+        heartbeat.cancel()
+
+
+async def _process_detached(store: JobStore, job: dict) -> None:
+    try:
+        await process_job(store, job)
+    except Exception:
+        logger.exception("Job %s failed", job["id"])
+
+
+async def run_worker(store: JobStore, worker_id: str) -> None:
+    """Claim and process jobs until cancelled.
+
+    Jobs whose passes go through a Message Batch spend most of their time
+    waiting for it, so up to ``settings.job_max_batched`` of them run in the
+    background while the worker claims more; live jobs run one at a time.
+    """
+    batched: set[asyncio.Task] = set()
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(store.requeue_stale, settings.job_lease_seconds)
+                if len(batched) < settings.job_max_batched:
+                    job = await asyncio.to_thread(store.claim, worker_id)
+                else:
+                    job = None
+                if job is not None and job["pass_mode"] != "live":
+                    task = asyncio.create_task(_process_detached(store, job))
+                    batched.add(task)
+                    task.add_done_callback(batched.discard)
+                    continue
+                if job is not None:
+                    await process_job(store, job)
+                    continue
+            except Exception:
+                # Keep the worker alive; a job left running is requeued once
+                # its lease lapses.
+                logger.exception("Job worker %s failed", worker_id)
+            await asyncio.sleep(settings.job_poll_interval)
+    finally:
+        for task in batched:
+            task.cancel()
+
+
+def start_workers(count: int) -> list[asyncio.Task]:
+    store = get_job_store()
+    prefix = f"{os.uname().nodename}:{os.getpid()}"
+    return [
+        asyncio.create_task(run_worker(store, f"{prefix}:{i}")) for i in range(count)
+    ]
+
+
+async def stream_job_events(store: JobStore, job_id: str, last_event_id: int = 0):
+    """Yield a job's events after ``last_event_id`` as SSE dicts, then follow live ones."""
+    after = last_event_id
+    while True:
+        rows = await asyncio.to_thread(store.events_after, job_id, after)
+        for seq, data in rows:
+            after = seq
+            yield {"id": str(seq), "data": data}
+        if not rows:
+            job = await asyncio.to_thread(store.get, job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                # Catch events written between the read above and the status check.
+                if not await asyncio.to_thread(store.events_after, job_id, after):
+                    return
+                continue
+            await asyncio.sleep(settings.job_poll_interval)
@@ -0,0 +1,165 @@
+import json
+
+
+class JsonStreamParser:
+    """Incremental parser for a streamed top-level JSON object.
+
+    ``feed`` takes text chunks as they arrive and returns what completed:
+
+    - ``("item", key, index, value)`` for each element of a top-level array
+    - ``("field", key, value)`` for each other top-level value
+
+    Text before the opening brace (such as a Markdown fence) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # Top-level state: key, colon, value, string, scalar, container, comma, done
+        self._state = "start"
+        self._key = ""
+        self._value_start = 0
+        # Element tracking while the current top-level value is an array
+        self._in_array = False
+        self._item_state = "item"  # item, string, scalar, container, after
+        self._item_start = 0
+        self._item_index = 0
+        self._events: list[tuple] = []
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> list[tuple]:
+        self._buf += chunk
+        self._events = []
+        buf = self._buf
+        i = self._pos
+        while i < len(buf) and self._state != "done":
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._string_closed(i + 1)
+            elif self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._state = "key"
+            elif self._depth == 1:
+                self._step_top(ch, i)
+            elif self._depth == 2 and self._in_array:
+                self._step_item(ch, i)
+            else:
+                self._step_nested(ch, i)
+            i += 1
+        self._pos = i
+        return self._events
+
+    def _step_top(self, ch: str, i: int) -> None:
+        state = self._state
+        if state == "key":
+            if ch == '"':
+                self._value_start = i
+                self._in_string = True
+            elif ch == "}":
+                self._state = "done"
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value"
+        elif state == "value":
+            if ch.isspace():
+                return
+            self._value_start = i
+            if ch == '"':
+                self._in_string = True
+                self._state = "string"
+            elif ch == "[":
+                self._depth = 2
+                self._state = "container"
+                self._in_array = True
+                self._item_state = "item"
+                self._item_index = 0
+            elif ch == "{":
+                self._depth = 2
+                self._state = "container"
+            else:
+                self._state = "scalar"
+        elif state == "scalar":
+            if ch in ",}" or ch.isspace():
+                self._emit_field(self._buf[self._value_start : i])
+                self._step_top(ch, i)
+        elif state == "comma":
+            if ch == ",":
+                self._state = "key"
+            elif ch == "}":
+                self._state = "done"
+
+    def _step_item(self, ch: str, i: int) -> None:
+        state = self._item_state
+        if state in ("item", "after") and ch == "]":
+            self._depth = 1
+            self._in_array = False
+            self._state = "comma"
+        elif state == "item":
+            if ch.isspace():
+                return
+            self._item_start = i
+            if ch == '"':
+                self._in_string = True
+                self._item_state = "string"
+            elif ch in "{[":
+                self._depth = 3
+                self._item_state = "container"
+            else:
+                self._item_state = "scalar"
+        elif state == "scalar":
+            if ch in ",]" or ch.isspace():
+                self._emit_item(self._buf[self._item_start : i])
+                self._step_item(ch, i)
+        elif state == "after":
+            if ch == ",":
+                self._item_state = "item"
+
+    def _step_nested(self, ch: str, i: int) -> None:
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 1:
+                self._emit_field(self._buf[self._value_start : i + 1])
+            elif self._depth == 2 and self._in_array:
+                self._emit_item(self._buf[self._item_start : i + 1])
+
+    def _string_closed(self, end: int) -> None:
+        if self._depth == 1 and self._state == "key":
+            self._key = json.loads(self._buf[self._value_start : end])
+            self._state = "colon"
+        elif self._depth == 1 and self._state == "string":
+            self._emit_field(self._buf[self._value_start : end])
+        elif self._depth == 2 and self._in_array and self._item_state == "string":
+            self._emit_item(self._buf[self._item_start : end])
+
+    def _emit_field(self, text: str) -> None:
+        self._state = "comma"
+        try:
+            self._events.append(("field", self._key, json.loads(text)))
+        except json.JSONDecodeError:
+            pass
+
+    def _emit_item(self, text: str) -> None:
+        self._item_state = "after"
+        index = self._item_index
+        self._item_index += 1
+        try:
+            self._events.append(("item", self._key, index, json.loads(text)))
+        except json.JSONDecodeError:
+            pass
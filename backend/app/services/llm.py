@@ -0,0 +1,47 @@
+import anthropic
+import httpx
+
+from app.config import settings
+from app.services.ratelimit import anthropic_limiter, anthropic_quota, limiter_hooks
+
+_client: anthropic.AsyncAnthropic | None = None
+
+
+def open_client() -> anthropic.AsyncAnthropic:
+    """Create the application-wide async Anthropic client with a bounded pool."""
+    global _client
+    if _client is None:
+        http_client = anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.anthropic_max_connections,
+                max_keepalive_connections=settings.anthropic_max_connections,
+            ),
+            timeout=settings.anthropic_timeout,
+            event_hooks=limiter_hooks(anthropic_limiter, anthropic_quota),
+        )
+        _client = anthropic.AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            base_url=settings.anthropic_base_url or None,
+            http_client=http_client,
+            max_retries=settings.upstream_max_retries,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared client and release its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def get_client() -> anthropic.AsyncAnthropic:
+    """Return the shared client, opening it lazily outside the app lifespan."""
+    return _client or open_client()
+
+
+def set_client(client) -> None:
+    """Install a client (e.g. a local stand-in) in place of the real one."""
+    global _client
+    _client = client
@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import anthropic
+
+from app.config import settings
+
+
+class LocalMessageBatches:
+    """Stand-in for ``client.messages.batches`` that runs the requests itself.
+
+    Exposes the same create / retrieve / results calls, sending each request
+    to the regular Messages endpoint, so the batched path can be exercised
+    against a fake client or without waiting on the real batch queue.
+    """
+
+    def __init__(self, client: anthropic.AsyncAnthropic, concurrency: int):
+        self._client = client
+        self._concurrency = max(1, concurrency)
+        self._batches: dict[str, asyncio.Task] = {}
+
+    async def create(self, requests: list[dict]):
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex}"
+        self._batches[batch_id] = asyncio.create_task(self._run(list(requests)))
+        return SimpleNamespace(id=batch_id, processing_status="in_progress")
+
+    async def retrieve(self, batch_id: str):
+        ended = self._batches[batch_id].done()
+        return SimpleNamespace(
+            id=batch_id, processing_status="ended" if ended else "in_progress"
+        )
+
+    async def cancel(self, batch_id: str):
+        task = self._batches.pop(batch_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def results(self, batch_id: str):
+        entries = self._batches.pop(batch_id).result()
+
+        async def iterate():
+            for entry in entries:
+                yield entry
+
+        return iterate()
+
+    async def _run(self, requests: list[dict]) -> list:
+        pool = asyncio.Semaphore(self._concurrency)
+
+        async def run_one(request: dict):
+            async with pool:
+                try:
+                    message = await self._client.messages.create(**request["params"])
+                    result = SimpleNamespace(type="succeeded", message=message)
+                except Exception as e:
+                    result = SimpleNamespace(type="errored", error=str(e))
+            return SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+        return await asyncio.gather(*[run_one(r) for r in requests])
+
+
+class MessageBatchError(Exception):
+    """A request came back from a Message Batch without a message."""
+
+
+class MessageBatcher:
+    """Sends one pipeline's pass requests as a single Message Batch.
+
+    Each of the ``expected`` passes either submits its request or reports
+    itself done without one (e.g. on a result cache hit). Once every pass
+    has, the batch is created and polled until it ends, and each submitter
+    gets its own message back.
+    """
+
+    def __init__(self, api, expected: set[str]):
+        self.api = api
+        self._waiting = set(expected)
+        self._pending: dict[str, tuple[dict, asyncio.Future]] = {}
+        self._task: asyncio.Task | None = None
+        self._batch_id = ""
+
+    def submit(self, custom_id: str, request: dict) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[custom_id] = (request, future)
+        self.done(custom_id)
+        return future
+
+    def done(self, custom_id: str) -> None:
+        self._waiting.discard(custom_id)
+        if not self._waiting and self._pending and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def cancel(self) -> None:
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        if self._batch_id:
+            try:
+                await self.api.cancel(self._batch_id)
+            except Exception:
+                pass  # the batch expires on its own
+
+    async def _run(self) -> None:
+        try:
+            batch = await self.api.create(requests=[
+                {"custom_id": custom_id, "params": request}
+                for custom_id, (request, _) in self._pending.items()
+            ])
+            self._batch_id = batch.id
+            # Batches take minutes to hours; poll quickly at first, then back off.
+            delay = 1.0
+            while batch.processing_status != "ended":
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.message_batch_poll_interval)
+                batch = await self.api.retrieve(batch.id)
+            async for entry in await self.api.results(batch.id):
+                _, future = self._pending.get(entry.custom_id, (None, None))
+                if future is None or future.done():
+                    continue
+                if entry.result.type == "succeeded":
+                    future.set_result(entry.result.message)
+                else:
+                    detail = getattr(entry.result, "error", "") or entry.result.type
+                    future.set_exception(MessageBatchError(str(detail)))
+            error: Exception = MessageBatchError("missing from batch results")
+        except Exception as e:
+            error = e
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+def batches_api(client: anthropic.AsyncAnthropic, pass_mode: str):
+    """The Message Batches interface for ``pass_mode``."""
+    if pass_mode == "local":
+        return LocalMessageBatches(client, settings.analysis_concurrency)
+    return client.messages.batches
@@ -0,0 +1,363 @@
+import asyncio
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncGenerator, AsyncIterator, Iterator
+
+from app.config import settings
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+_REGISTRY: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, self._labels(key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        for key, (counts, total) in sorted(self._values.items()):
+            labels = self._labels(key)
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        with metric._lock:
+            samples = list(metric.samples())
+        for name, labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+GITHUB_FETCH_SECONDS = Histogram(
+    "glassbox_github_fetch_seconds",
+    "Latency of individual GitHub requests made during ingestion.",
+    ("endpoint", "status"),
+)
+INGESTION_SECONDS = Histogram(
+    "glassbox_ingestion_seconds",
+    "Wall-clock time of fetch_repo_content.",
+    ("mode",),
+)
+GITHUB_HTTP_CACHE = Counter(
+    "glassbox_github_http_cache_total",
+    "GitHub responses served by revalidation (hit) or fetched in full (miss).",
+    ("result",),
+)
+PASS_MODEL_SECONDS = Histogram(
+    "glassbox_pass_model_seconds",
+    "Model latency per analysis pass.",
+    ("pass_name",),
+)
+PASS_TOKENS = Counter(
+    "glassbox_pass_tokens_total",
+    "Tokens used by analysis passes.",
+    ("pass_name", "kind"),
+)
+PASS_RESULTS = Counter(
+    "glassbox_pass_results_total",
+    "Analysis pass outcomes (ok, cached, reused, incremental, parse_error, error).",
+    ("pass_name", "outcome"),
+)
+PASS_ROUTES = Counter(
+    "glassbox_pass_routes_total",
+    "Model tier each pass was routed to, and whether it had to escalate.",
+    ("pass_name", "tier", "escalated"),
+)
+PASS_VALIDATION = Counter(
+    "glassbox_pass_validation_total",
+    "Schema validation of pass answers (valid, repaired, invalid).",
+    ("pass_name", "result"),
+)
+MODEL_SECONDS = Histogram(
+    "glassbox_model_seconds",
+    "Latency of model calls by routing tier and model.",
+    ("tier", "model"),
+)
+MODEL_COST_USD = Counter(
+    "glassbox_model_cost_usd_total",
+    "Estimated model spend by routing tier and model.",
+    ("tier", "model"),
+)
+DISCOVERY_SECONDS = Histogram(
+    "glassbox_discovery_seconds",
+    "Latency of discovery model calls.",
+    ("outcome",),
+)
+DISCOVERY_CACHE = Counter(
+    "glassbox_discovery_cache_total",
+    "Discovery cache lookups by result (exact, similar, miss).",
+    ("result",),
+)
+PREFETCH = Counter(
+    "glassbox_prefetch_total",
+    "Prefetched repo content by outcome (used, waited, failed, expired, evicted).",
+    ("outcome",),
+)
+ADMISSIONS = Counter(
+    "glassbox_admissions_total",
+    "Pipeline admissions (admitted, queued, rejected, cancelled) by endpoint.",
+    ("endpoint", "outcome"),
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "glassbox_admission_wait_seconds",
+    "Time queued requests waited for a pipeline slot.",
+    ("endpoint",),
+)
+PIPELINES_IN_FLIGHT = Gauge(
+    "glassbox_pipelines_in_flight",
+    "Pipelines holding an admission slot.",
+    ("endpoint",),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "glassbox_admission_queue_depth",
+    "Requests waiting for a pipeline slot.",
+    ("endpoint",),
+)
+SSE_FIRST_EVENT_SECONDS = Histogram(
+    "glassbox_sse_time_to_first_event_seconds",
+    "Time from request arrival to the first SSE event.",
+    ("endpoint",),
+)
+SSE_STREAM_SECONDS = Histogram(
+    "glassbox_sse_stream_seconds",
+    "Duration of whole SSE streams.",
+    ("endpoint",),
+)
+SSE_STREAMS_IN_FLIGHT = Gauge(
+    "glassbox_sse_streams_in_flight",
+    "SSE streams currently open.",
+    ("endpoint",),
+)
+TRACE_SPANS_DROPPED = Counter(
+    "glassbox_trace_spans_dropped_total",
+    "Spans that could not be encoded or written to the trace file.",
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "glassbox_event_loop_lag_seconds",
+    "How late the event loop woke a periodic probe; high values mean blocking work.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+async def monitor_event_loop_lag(interval: float) -> None:
+    """Sample event-loop lag forever; run as a background task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - scheduled))
+
+
+def record_usage(pass_name: str, usage: dict) -> None:
+    for field, value in usage.items():
+        if value:
+            PASS_TOKENS.inc(value, pass_name=pass_name, kind=field.removesuffix("_tokens"))
+
+
+async def track_stream(
+    endpoint: str, events: AsyncIterator[dict], started: float
+) -> AsyncGenerator[dict, None]:
+    """Pass ``events`` through while recording SSE timing and in-flight gauges.
+
+    ``started`` is the ``time.perf_counter()`` reading when the request arrived.
+    """
+    first = True
+    SSE_STREAMS_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        with span("sse.stream", endpoint=endpoint):
+            async for event in events:
+                if first:
+                    SSE_FIRST_EVENT_SECONDS.observe(
+                        time.perf_counter() - started, endpoint=endpoint
+                    )
+                    first = False
+                yield event
+    finally:
+        SSE_STREAMS_IN_FLIGHT.dec(endpoint=endpoint)
+        SSE_STREAM_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+
+
+# --- Tracing ---------------------------------------------------------------
+
+_current_span: contextvars.ContextVar[dict | None] = contextvars.ContextVar(
+    "glassbox_span", default=None
+)
+_trace_lines: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+_trace_lock = threading.Lock()
+_trace_writer: threading.Thread | None = None
+
+
+def _write_traces() -> None:
+    """Append queued span lines to the trace file; runs on its own thread."""
+    trace_file = None
+    while (line := _trace_lines.get()) is not None:
+        try:
+            if trace_file is None:
+                if os.path.dirname(settings.trace_file):
+                    os.makedirs(os.path.dirname(settings.trace_file), exist_ok=True)
+                trace_file = open(settings.trace_file, "a", encoding="utf-8")
+            trace_file.write(line)
+            if _trace_lines.empty():
+                trace_file.flush()
+        except Exception:
+            TRACE_SPANS_DROPPED.inc()
+    if trace_file is not None:
+        try:
+            trace_file.close()
+        except OSError:
+            TRACE_SPANS_DROPPED.inc()
+
+
+def close_traces(timeout: float = 5.0) -> None:
+    """Write out spans still queued and stop the writer thread."""
+    global _trace_writer
+    with _trace_lock:
+        writer, _trace_writer = _trace_writer, None
+    if writer is not None:
+        _trace_lines.put(None)
+        writer.join(timeout)
+
+
+def _export(record: dict) -> None:
+    # Best effort: tracing must never fail or block the code it traces.
+    global _trace_writer
+    try:
+        line = json.dumps(record, default=repr) + "\n"
+    except Exception:
+        TRACE_SPANS_DROPPED.inc()
+        return
+    _trace_lines.put(line)
+    if _trace_writer is None:
+        with _trace_lock:
+            if _trace_writer is None:
+                _trace_writer = threading.Thread(
+                    target=_write_traces, name="trace-writer", daemon=True
+                )
+                _trace_writer.start()
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[dict]:
+    """Record an OpenTelemetry-style span to ``settings.trace_file``, if set.
+
+    Spans nest through contextvars, so tasks spawned inside a span (such as
+    concurrent passes) become its children. The yielded dict's
+    ``attributes`` can be extended before the span ends.
+    """
+    if not settings.trace_file:
+        yield {"attributes": attributes}
+        return
+
+    parent = _current_span.get()
+    record = {
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else os.urandom(16).hex(),
+        "span_id": os.urandom(8).hex(),
+        "parent_span_id": parent["span_id"] if parent else None,
+        "start_time_unix_nano": time.time_ns(),
+        "attributes": attributes,
+        "status": "ok",
+    }
+    token = _current_span.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["attributes"]["exception"] = repr(e)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # an async generator was finalized from another context
+        record["end_time_unix_nano"] = time.time_ns()
+        _export(record)
@@ -0,0 +1,65 @@
+import json
+import re
+
+_TREE_START = re.compile(r'"tree"\s*:\s*\[')
+_SHA = re.compile(r'"sha"\s*:\s*"([0-9a-f]+)"')
+_TRUNCATED = re.compile(r'"truncated"\s*:\s*true')
+_SEPARATORS = re.compile(r"[\s,]*")
+_decoder = json.JSONDecoder()
+
+
+class TreeListingScanner:
+    """Streams the entries out of a Git Trees API response.
+
+    Feed text chunks as they arrive; each call returns the entries that
+    completed, as dicts. Consumed text is dropped, so memory is bounded by
+    one chunk plus one entry rather than the whole listing and its parsed
+    objects. The top-level ``sha`` and ``truncated`` fields are kept.
+    """
+
+    def __init__(self) -> None:
+        self.sha = ""
+        self.truncated = False
+        self._buf = ""
+        self._in_tree = False
+        self._done = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        self._buf += chunk
+        if self._done:
+            self._scan_tail()
+            return []
+        if not self._in_tree:
+            start = _TREE_START.search(self._buf)
+            if start is None:
+                return []
+            sha = _SHA.search(self._buf, 0, start.start())
+            self.sha = sha.group(1) if sha else ""
+            self._buf = self._buf[start.end():]
+            self._in_tree = True
+
+        buf = self._buf
+        entries: list[dict] = []
+        pos = 0
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                self._done = True
+                pos += 1
+                break
+            try:
+                entry, pos = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # an entry cut off by the chunk boundary
+            entries.append(entry)
+        self._buf = buf[pos:]
+        if self._done:
+            self._scan_tail()
+        return entries
+
+    def _scan_tail(self) -> None:
+        if _TRUNCATED.search(self._buf):
+            self.truncated = True
+        self._buf = self._buf[-64:]
@@ -0,0 +1,128 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.config import settings
+from app.models.schemas import RepoContent
+from app.services.ingestion import fetch_repo_content, repo_key
+from app.services.metrics import PREFETCH
+
+
+class _Prefetch:
+    __slots__ = ("task", "warmup", "started_at")
+
+    def __init__(self) -> None:
+        self.task: asyncio.Task | None = None
+        self.warmup: asyncio.Task | None = None
+        self.started_at = time.monotonic()
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+        if self.warmup is not None:
+            self.warmup.cancel()
+
+
+def _retrieve(task: asyncio.Task) -> None:
+    # Nobody may ever await an evicted prefetch; mark its error as seen.
+    if not task.cancelled():
+        task.exception()
+
+
+class PrefetchStore:
+    """Repos being or recently ingested ahead of an analysis, by repo key.
+
+    ``start`` runs ``fetch_repo_content`` in the background (and optionally
+    a prompt-cache warm-up after it); ``take`` hands the result to the
+    analysis that follows and forgets it. Entries nobody takes expire
+    after ``ttl`` seconds, and beyond ``max_entries`` the oldest is dropped,
+    its work cancelled if still running, so abandoned prefetches cannot
+    accumulate.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _Prefetch] = OrderedDict()
+
+    def _expire(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.started_at > cutoff:
+                break
+            del self._entries[key]
+            entry.cancel()
+            PREFETCH.inc(outcome="expired")
+
+    def start(
+        self, url: str, warm: Callable[[RepoContent], Awaitable[None]] | None = None
+    ) -> str:
+        """Begin prefetching ``url`` unless it already is.
+
+        Returns "started", "pending" (already running), "ready" (content
+        waiting to be taken) or "disabled".
+        """
+        if self.max_entries <= 0:
+            return "disabled"
+        self._expire()
+        key = repo_key(url)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not entry.task.done():
+                return "pending"
+            if not entry.task.cancelled() and entry.task.exception() is None:
+                return "ready"
+            del self._entries[key]  # failed: try again
+        while len(self._entries) >= self.max_entries:
+            _, oldest = self._entries.popitem(last=False)
+            oldest.cancel()
+            PREFETCH.inc(outcome="evicted")
+
+        entry = _Prefetch()
+
+        async def run() -> RepoContent:
+            content = await fetch_repo_content(url)
+            if warm is not None:
+                entry.warmup = asyncio.create_task(warm(content))
+            return content
+
+        entry.task = asyncio.create_task(run())
+        entry.task.add_done_callback(_retrieve)
+        self._entries[key] = entry
+        return "started"
+
+    async def take(self, url: str) -> tuple[RepoContent, asyncio.Task | None] | None:
+        """The prefetched content for ``url`` and its warm-up task, if any.
+
+        Waits for a prefetch still in flight. Returns None when there is
+        none or it failed, in which case the caller ingests as usual.
+        """
+        self._expire()
+        entry = self._entries.pop(repo_key(url), None)
+        if entry is None:
+            return None
+        if entry.task.cancelled():
+            return None
+        waited = not entry.task.done()
+        try:
+            content = await entry.task
+        except Exception:
+            PREFETCH.inc(outcome="failed")
+            return None
+        PREFETCH.inc(outcome="waited" if waited else "used")
+        return content, entry.warmup
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_store: PrefetchStore | None = None
+
+
+def get_prefetch_store() -> PrefetchStore:
+    global _store
+    if _store is None:
+        _store = PrefetchStore(settings.prefetch_max_entries, settings.prefetch_ttl)
+    return _store
@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import random
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import httpx
+
+from app.config import settings
+from app.services.shared_state import get_shared_state
+
+# Who the current upstream call is made for; set per request so a busy
+# client cannot starve the others while the bucket is empty.
+current_client: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "glassbox_rate_limit_client", default="anonymous"
+)
+
+RETRYABLE_STATUSES = {429, 502, 503, 504, 529}
+
+
+class UpstreamRateLimited(Exception):
+    """An upstream quota is exhausted and retrying now would not help."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} rate limit exceeded; retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """Token bucket resized from the upstream's own rate-limit headers.
+
+    The bucket refills at ``max_rate`` while the reported remaining quota
+    covers ``settings.upstream_quota_low_water`` seconds at that rate. Below
+    that mark, the rate spreads the remaining quota over the time left until
+    it resets. A fresh quota is therefore used at full speed, and only a
+    nearly exhausted one is throttled. Waiters are grouped per client and
+    served round-robin. With a shared state backend, every admission also
+    draws from a bucket common to all workers, so N processes together stay
+    within one ceiling.
+    """
+
+    def __init__(self, name: str, max_rate: float, burst: float):
+        self.name = name
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.capacity = burst
+        self.tokens = burst
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._pump: asyncio.Task | None = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, client: str | None = None) -> None:
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and time.monotonic() >= self.paused_until:
+            self.tokens -= 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            key = client or current_client.get()
+            self._waiters.setdefault(key, deque()).append(future)
+            if self._pump is None or self._pump.done():
+                self._pump = asyncio.create_task(self._dispatch())
+            await future
+        state = get_shared_state()
+        if not state.local:
+            bucket = f"limiter:{self.name}"
+            while (wait := await state.take(bucket, self.rate, self.capacity)) > 0:
+                await asyncio.sleep(wait)
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            self._refill()
+            wait = self.paused_until - time.monotonic()
+            if wait <= 0 and self.tokens < 1:
+                wait = (1 - self.tokens) / max(self.rate, 1e-3)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            key, queue = next(iter(self._waiters.items()))
+            future = queue.popleft()
+            if queue:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if not future.done():  # skip callers that gave up waiting
+                self.tokens -= 1
+                future.set_result(None)
+
+    def update(self, remaining: float | None, reset_in: float | None) -> None:
+        """Resize the bucket from a response's remaining quota and reset time."""
+        if remaining is None or reset_in is None:
+            return
+        self._refill()
+        reset_in = max(reset_in, 1.0)
+        if remaining > self.max_rate * settings.upstream_quota_low_water:
+            self.rate = self.max_rate
+        else:
+            self.rate = min(self.max_rate, max(remaining, 0) / reset_in) or 1 / reset_in
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            self.pause(reset_in)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def _float(value: str | None) -> float | None:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def github_quota(headers: httpx.Headers) -> tuple[float | None, float | None]:
+    remaining = _float(headers.get("x-ratelimit-remaining"))
+    reset = _float(headers.get("x-ratelimit-reset"))
+    return remaining, (reset - time.time()) if reset is not None else None
+
+
+def anthropic_quota(headers: httpx.Headers) -> tuple[float | None, float | None]:
+    remaining = _float(headers.get("anthropic-ratelimit-requests-remaining"))
+    reset = headers.get("anthropic-ratelimit-requests-reset")
+    reset_in = None
+    if reset:
+        try:
+            reset_in = datetime.fromisoformat(reset.replace("Z", "+00:00")).timestamp() - time.time()
+        except ValueError:
+            pass
+    return remaining, reset_in
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    """Seconds to wait according to Retry-After (or GitHub's exhausted quota)."""
+    value = _float(response.headers.get("retry-after"))
+    if value is not None:
+        return value
+    if response.headers.get("x-ratelimit-remaining") == "0":
+        return github_quota(response.headers)[1]
+    return None
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    if response.status_code == 429:
+        return True
+    # GitHub reports exhausted primary and secondary limits as 403.
+    return response.status_code == 403 and (
+        response.headers.get("x-ratelimit-remaining") == "0"
+        or "retry-after" in response.headers
+    )
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """Admit requests through an AdaptiveLimiter and retry transient failures.
+
+    Retries use full-jitter exponential backoff, or the server's Retry-After
+    when given. Waits longer than ``settings.upstream_max_retry_wait`` are
+    not attempted: the limited response is returned for the caller to report,
+    and calls made while the limiter stays paused fail fast with
+    UpstreamRateLimited instead of queueing until the quota resets.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: AdaptiveLimiter, quota):
+        self._transport = transport
+        self.limiter = limiter
+        self._quota = quota
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            paused = self.limiter.paused_until - time.monotonic()
+            if paused > settings.upstream_max_retry_wait:
+                raise UpstreamRateLimited(self.limiter.name, paused)
+            await self.limiter.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                if attempt >= settings.upstream_max_retries:
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+                attempt += 1
+                continue
+
+            self.limiter.update(*self._quota(response.headers))
+            limited = is_rate_limited(response)
+            if not (limited or response.status_code in RETRYABLE_STATUSES):
+                return response
+            wait = retry_after(response)
+            if limited and wait is not None:
+                self.limiter.pause(wait)
+            delay = wait if wait is not None else _backoff(attempt)
+            if attempt >= settings.upstream_max_retries or delay > settings.upstream_max_retry_wait:
+                return response
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def limiter_hooks(limiter: AdaptiveLimiter, quota) -> dict[str, list]:
+    """Client event hooks applying ``limiter`` where the SDK owns retries.
+
+    The Anthropic SDK ships its own httpx build and already retries 429/529
+    with Retry-After, so its calls are admitted and fed back through hooks
+    rather than RateLimitedTransport. Every SDK retry passes the request hook
+    again and is therefore paced like a fresh call.
+    """
+
+    async def on_request(request) -> None:
+        await limiter.acquire()
+
+    async def on_response(response) -> None:
+        limiter.update(*quota(response.headers))
+        if is_rate_limited(response):
+            limiter.pause(retry_after(response) or _backoff(0))
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(30.0, 0.5 * 2**attempt))
+
+
+github_limiter = AdaptiveLimiter(
+    "GitHub", max_rate=settings.github_max_rps, burst=settings.github_max_rps
+)
+anthropic_limiter = AdaptiveLimiter(
+    "Anthropic", max_rate=settings.anthropic_max_rps, burst=settings.anthropic_max_rps
+)
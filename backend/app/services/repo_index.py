@@ -0,0 +1,203 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.models.discovery_schemas import DiscoveryFilters
+from app.models.schemas import RepoContent
+from app.services.discovery_cache import query_terms
+
+# BM25 parameters: term-frequency saturation and document-length normalization.
+_K1 = 1.2
+_B = 0.75
+# Name and topics describe a repo better than its prose, so they count more.
+_FIELD_WEIGHTS = {"name": 3, "topics": 2, "languages": 1, "description": 1}
+
+# License preferences that name a family rather than a license.
+LICENSE_FAMILIES = {
+    "permissive": ("mit", "apache", "bsd", "isc", "unlicense", "0bsd", "zlib"),
+    "copyleft": ("gpl", "agpl", "lgpl", "mpl", "epl"),
+}
+
+
+def _document(repo_content: RepoContent) -> dict:
+    languages = sorted(repo_content.languages, key=repo_content.languages.get, reverse=True)
+    name = f"{repo_content.owner}/{repo_content.repo_name}"
+    return {
+        "repo_name": name,
+        "github_url": f"https://github.com/{name}",
+        "description": repo_content.description,
+        "languages": languages,
+        "language": languages[0] if languages else "",
+        "license": repo_content.license,
+        "topics": repo_content.topics,
+        "stars": repo_content.stars,
+        "pushed_at": repo_content.pushed_at,
+        "archived": repo_content.archived,
+    }
+
+
+def _terms(document: dict) -> dict[str, int]:
+    """Weighted term frequencies of a document's searchable fields."""
+    fields = {
+        "name": document["repo_name"],
+        "topics": " ".join(document["topics"]),
+        "languages": " ".join(document["languages"]),
+        "description": document["description"],
+    }
+    tf: dict[str, int] = {}
+    for field, text in fields.items():
+        for term in query_terms(text):
+            tf[term] = tf.get(term, 0) + _FIELD_WEIGHTS[field]
+    return tf
+
+
+def _license_matches(license: str, preference: str) -> bool:
+    license, preference = license.lower(), preference.strip().lower()
+    family = LICENSE_FAMILIES.get(preference)
+    if family is not None:
+        return any(name in license for name in family)
+    return preference in license
+
+
+def _recently_pushed(pushed_at: str, days: int) -> bool:
+    try:
+        pushed = datetime.fromisoformat(pushed_at.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return (datetime.now(timezone.utc) - pushed).days <= days
+
+
+def matches_filters(document: dict, filters: DiscoveryFilters) -> bool:
+    """Whether an indexed repo satisfies the hard discovery filters.
+
+    Languages and license must match when given, and "actively maintained"
+    means not archived and pushed within ``settings.repo_index_active_days``.
+    Domain and scale are soft preferences left to ranking.
+    """
+    if filters.languages:
+        wanted = {lang.strip().lower() for lang in filters.languages}
+        if not wanted & {lang.lower() for lang in document["languages"]}:
+            return False
+    if filters.license_preference and filters.license_preference.lower() != "any":
+        if not _license_matches(document["license"], filters.license_preference):
+            return False
+    if filters.actively_maintained:
+        if document["archived"] or not _recently_pushed(
+            document["pushed_at"], settings.repo_index_active_days
+        ):
+            return False
+    return True
+
+
+class RepoIndex:
+    """On-disk inverted index of ingested repositories, ranked with BM25.
+
+    Each repo is one document built from its name, topics, languages and
+    description; postings map normalized terms to per-repo frequencies.
+    SQLite keeps the index across restarts and lets several processes add
+    to it.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS repos ("
+            " key TEXT PRIMARY KEY, document TEXT NOT NULL,"
+            " length INTEGER NOT NULL, indexed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL, key TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_key ON postings (key)")
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM repos").fetchone()[0]
+
+    def add(self, repo_content: RepoContent) -> None:
+        """Index (or re-index) a repo from its ingested content."""
+        document = _document(repo_content)
+        key = document["repo_name"].lower()
+        tf = _terms(document)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM postings WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?)",
+                (key, json.dumps(document), sum(tf.values()), time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO postings VALUES (?, ?, ?)",
+                [(term, key, n) for term, n in tf.items()],
+            )
+
+    def get(self, repo_name: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document FROM repos WHERE key = ?", (repo_name.lower(),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(self, query: str, filters: DiscoveryFilters, limit: int) -> list[dict]:
+        """The ``limit`` best BM25 matches for ``query`` that pass ``filters``.
+
+        The domain filter joins the query as extra terms. Each result is the
+        stored metadata plus its ``score``.
+        """
+        terms = set(query_terms(f"{query} {filters.domain}"))
+        if not terms:
+            return []
+        placeholders = ", ".join("?" * len(terms))
+        with self._lock:
+            total, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM repos"
+            ).fetchone()
+            postings = self._conn.execute(
+                "SELECT p.term, p.key, p.tf, r.length FROM postings p"
+                f" JOIN repos r ON r.key = p.key WHERE p.term IN ({placeholders})",
+                list(terms),
+            ).fetchall()
+        if not postings:
+            return []
+
+        df: dict[str, int] = {}
+        for term, *_ in postings:
+            df[term] = df.get(term, 0) + 1
+        scores: dict[str, float] = {}
+        for term, key, tf, length in postings:
+            idf = math.log(1 + (total - df[term] + 0.5) / (df[term] + 0.5))
+            norm = tf + _K1 * (1 - _B + _B * length / (avg_length or 1))
+            scores[key] = scores.get(key, 0.0) + idf * tf * (_K1 + 1) / norm
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        results: list[dict] = []
+        for key in ranked:
+            document = self.get(key)
+            if document is None or not matches_filters(document, filters):
+                continue
+            results.append({**document, "score": round(scores[key], 3)})
+            if len(results) >= limit:
+                break
+        return results
+
+
+_index: RepoIndex | None = None
+
+
+def get_repo_index() -> RepoIndex | None:
+    """The shared index, or None when ``settings.repo_index_path`` is empty."""
+    global _index
+    if _index is None and settings.repo_index_path:
+        _index = RepoIndex(settings.repo_index_path)
+    return _index
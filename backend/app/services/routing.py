@@ -0,0 +1,66 @@
+from app.config import settings
+from app.services.metrics import MODEL_COST_USD, MODEL_SECONDS
+
+
+def tier_model(tier: str) -> str:
+    """The model id behind a tier name; anything else is taken as a model id."""
+    if tier == "flagship":
+        return settings.model_name
+    if tier == "fast":
+        return settings.fast_model_name
+    return tier
+
+
+def route_pass(definition: dict) -> tuple[str, str, int]:
+    """Pick ``(tier, model, max_tokens)`` for a pass.
+
+    ``settings.pass_models`` and ``settings.pass_max_tokens`` override the
+    pass definition's own ``model`` tier and ``max_tokens`` by pass name.
+    """
+    tier = settings.pass_models.get(definition["name"], definition.get("model", "flagship"))
+    max_tokens = settings.pass_max_tokens.get(
+        definition["name"], definition.get("max_tokens", 4096)
+    )
+    return tier, tier_model(tier), max_tokens
+
+
+def can_escalate(tier: str) -> bool:
+    return settings.model_escalation and tier_model(tier) != settings.model_name
+
+
+def response_usage(response) -> dict:
+    """Token counts from a Messages response, including prompt-cache activity."""
+    usage = getattr(response, "usage", None)
+    return {
+        field: getattr(usage, field, None) or 0
+        for field in (
+            "input_tokens",
+            "output_tokens",
+            "cache_read_input_tokens",
+            "cache_creation_input_tokens",
+        )
+    }
+
+
+def usage_cost(model: str, usage: dict) -> float:
+    """USD cost of one call from its token usage and ``settings.model_prices``.
+
+    Prices are per million input and output tokens; prompt-cache writes cost
+    1.25x input and reads 0.1x.
+    """
+    input_price, output_price = settings.model_prices.get(model, (0.0, 0.0))
+    return (
+        usage.get("input_tokens", 0) * input_price
+        + usage.get("cache_creation_input_tokens", 0) * input_price * 1.25
+        + usage.get("cache_read_input_tokens", 0) * input_price * 0.1
+        + usage.get("output_tokens", 0) * output_price
+    ) / 1_000_000
+
+
+def record_call(tier: str, model: str, seconds: float, usage: dict) -> float:
+    """Record one model call's latency and cost by tier; returns the cost."""
+    cost = usage_cost(model, usage)
+    MODEL_SECONDS.observe(seconds, tier=tier, model=model)
+    if cost:
+        MODEL_COST_USD.inc(cost, tier=tier, model=model)
+    return cost
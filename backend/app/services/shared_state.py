@@ -0,0 +1,322 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from app.config import settings
+
+
+class SharedState(ABC):
+    """State the app's worker processes coordinate through.
+
+    Four primitives cover what has to be shared when several workers serve
+    the same clients (``uvicorn --workers N``, or pods on one volume):
+
+    - key/value entries with a TTL, for result caches;
+    - leases, held by one holder at a time until released or expired, for
+      single-flight ownership;
+    - channels, append-only event logs that readers poll by sequence
+      number, for fanning a run's events out to every worker;
+    - token buckets, for upstream request rates across all workers.
+
+    ``local`` is True when everything stays in this process, in which case
+    callers keep their in-process fast paths.
+    """
+
+    local = False
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def acquire(self, name: str, holder: str, ttl: float) -> str:
+        """Take lease ``name`` for ``holder`` unless someone else holds it.
+
+        Returns the current holder, which is ``holder`` when it was taken
+        (or renewed).
+        """
+
+    @abstractmethod
+    async def release(self, name: str, holder: str) -> None: ...
+
+    @abstractmethod
+    async def publish(self, channel: str, data: str) -> int:
+        """Append ``data`` to ``channel``; returns its sequence number (from 1)."""
+
+    @abstractmethod
+    async def close(self, channel: str, error: str = "") -> None:
+        """Mark ``channel`` finished, with an encoded error if the run failed."""
+
+    @abstractmethod
+    async def read(self, channel: str, after: int) -> tuple[list[tuple[int, str]], str | None]:
+        """Entries after sequence ``after``, and the close error ("" for a
+        clean finish) or None while the channel is still open."""
+
+    @abstractmethod
+    async def take(self, bucket: str, rate: float, capacity: float) -> float:
+        """Take a token from ``bucket``; 0 if granted, else seconds until one refills."""
+
+
+class LocalState(SharedState):
+    """Single-process state: plain dicts on the event loop."""
+
+    local = True
+
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[float, str]] = {}
+        self._leases: dict[str, tuple[str, float]] = {}
+        self._channels: dict[str, list[str]] = defaultdict(list)
+        self._closed: dict[str, str] = {}
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    async def get(self, key: str) -> str | None:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._values[key]
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self._values[key] = (time.time() + ttl, value)
+
+    async def acquire(self, name: str, holder: str, ttl: float) -> str:
+        now = time.time()
+        current = self._leases.get(name)
+        if current is None or current[1] <= now or current[0] == holder:
+            self._leases[name] = (holder, now + ttl)
+            return holder
+        return current[0]
+
+    async def release(self, name: str, holder: str) -> None:
+        if self._leases.get(name, ("",))[0] == holder:
+            del self._leases[name]
+
+    async def publish(self, channel: str, data: str) -> int:
+        self._channels[channel].append(data)
+        return len(self._channels[channel])
+
+    async def close(self, channel: str, error: str = "") -> None:
+        self._closed[channel] = error
+
+    async def read(self, channel: str, after: int) -> tuple[list[tuple[int, str]], str | None]:
+        entries = self._channels.get(channel, [])
+        return (
+            [(seq, data) for seq, data in enumerate(entries[after:], after + 1)],
+            self._closed.get(channel),
+        )
+
+    async def take(self, bucket: str, rate: float, capacity: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(bucket, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            self._buckets[bucket] = (tokens - 1, now)
+            return 0.0
+        self._buckets[bucket] = (tokens, now)
+        return (1 - tokens) / max(rate, 1e-3)
+
+
+class SqliteState(SharedState):
+    """State in a SQLite database in WAL mode, shared by every process that opens it.
+
+    Writes are short IMMEDIATE transactions, so read-modify-write steps
+    (leases, buckets, sequence numbers) are atomic across processes.
+    Channels closed more than ``channel_ttl`` seconds ago are purged.
+    """
+
+    def __init__(self, path: str, channel_ttl: float):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.channel_ttl = channel_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS channels ("
+            " channel TEXT PRIMARY KEY, last_seq INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT, closed_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS channel_entries ("
+            " channel TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (channel, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _write(self, fn, *args):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    def _get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await asyncio.to_thread(self._write, self._set, key, value, ttl)
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, now + ttl)
+        )
+        self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+
+    async def acquire(self, name: str, holder: str, ttl: float) -> str:
+        return await asyncio.to_thread(self._write, self._acquire, name, holder, ttl)
+
+    def _acquire(self, name: str, holder: str, ttl: float) -> str:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT holder, expires_at FROM leases WHERE name = ?", (name,)
+        ).fetchone()
+        if row is not None and row[1] > now and row[0] != holder:
+            return row[0]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, holder, now + ttl)
+        )
+        return holder
+
+    async def release(self, name: str, holder: str) -> None:
+        await asyncio.to_thread(self._write, self._release, name, holder)
+
+    def _release(self, name: str, holder: str) -> None:
+        self._conn.execute(
+            "DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder)
+        )
+
+    async def publish(self, channel: str, data: str) -> int:
+        return await asyncio.to_thread(self._write, self._publish, channel, data)
+
+    def _publish(self, channel: str, data: str) -> int:
+        self._conn.execute(
+            "INSERT OR IGNORE INTO channels (channel) VALUES (?)", (channel,)
+        )
+        seq = self._conn.execute(
+            "UPDATE channels SET last_seq = last_seq + 1 WHERE channel = ?"
+            " RETURNING last_seq",
+            (channel,),
+        ).fetchone()[0]
+        self._conn.execute(
+            "INSERT INTO channel_entries VALUES (?, ?, ?)", (channel, seq, data)
+        )
+        return seq
+
+    async def close(self, channel: str, error: str = "") -> None:
+        await asyncio.to_thread(self._write, self._close, channel, error)
+
+    def _close(self, channel: str, error: str) -> None:
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO channels (channel, error, closed_at) VALUES (?, ?, ?)"
+            " ON CONFLICT (channel) DO UPDATE SET error = excluded.error,"
+            " closed_at = excluded.closed_at",
+            (channel, error, now),
+        )
+        expired = [
+            row[0] for row in self._conn.execute(
+                "SELECT channel FROM channels WHERE closed_at < ?",
+                (now - self.channel_ttl,),
+            )
+        ]
+        for old in expired:
+            self._conn.execute("DELETE FROM channel_entries WHERE channel = ?", (old,))
+            self._conn.execute("DELETE FROM channels WHERE channel = ?", (old,))
+
+    async def read(self, channel: str, after: int) -> tuple[list[tuple[int, str]], str | None]:
+        return await asyncio.to_thread(self._read, channel, after)
+
+    def _read(self, channel: str, after: int) -> tuple[list[tuple[int, str]], str | None]:
+        with self._lock:
+            # One read transaction, so "closed" cannot overtake the entries.
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT error, closed_at FROM channels WHERE channel = ?", (channel,)
+                ).fetchone()
+                entries = self._conn.execute(
+                    "SELECT seq, data FROM channel_entries WHERE channel = ? AND seq > ?"
+                    " ORDER BY seq",
+                    (channel, after),
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        closed = row[0] if row is not None and row[1] is not None else None
+        return entries, closed
+
+    async def take(self, bucket: str, rate: float, capacity: float) -> float:
+        return await asyncio.to_thread(self._write, self._take, bucket, rate, capacity)
+
+    def _take(self, bucket: str, rate: float, capacity: float) -> float:
+        # Wall-clock time: monotonic clocks are not comparable across processes.
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket,)
+        ).fetchone()
+        tokens = capacity if row is None else min(
+            capacity, row[0] + max(now - row[1], 0.0) * rate
+        )
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / max(rate, 1e-3)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (bucket, tokens, now)
+        )
+        return wait
+
+
+# Identifies this process as a lease holder.
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_state: SharedState | None = None
+
+
+def get_shared_state() -> SharedState:
+    """Return the process-wide shared state selected by settings.state_backend."""
+    global _state
+    if _state is None:
+        backend = settings.state_backend
+        if backend == "local":
+            _state = LocalState()
+        elif backend == "sqlite":
+            _state = SqliteState(settings.state_path, settings.state_channel_ttl)
+        else:
+            raise ValueError(f"Unknown state_backend: {backend}")
+    return _state
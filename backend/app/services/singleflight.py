@@ -0,0 +1,259 @@
+import asyncio
+import json
+import uuid
+from typing import AsyncGenerator, AsyncIterator, Callable
+
+from app.config import settings
+from app.services.admission import QueueFull
+from app.services.ratelimit import UpstreamRateLimited
+from app.services.shared_state import WORKER_ID, SharedState, get_shared_state
+from app.services.sse import dumps
+
+
+class RemoteFlightError(Exception):
+    """The run another worker was producing for this flight failed or stopped."""
+
+
+class Flight:
+    """One producer's events, fanned out to any number of subscribers.
+
+    Every event is kept until the flight ends so late joiners get a replay of
+    what they missed before switching to live events.
+    """
+
+    def __init__(self) -> None:
+        self.events: list[dict] = []
+        self.finished = False
+        self.abandoned = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        # Cleared while other workers may be following the run too.
+        self.cancel_when_idle = True
+        self._changed = asyncio.Event()
+
+    def publish(self, event: dict) -> None:
+        self.events.append(event)
+        self._wake()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.finished = True
+        self.error = error
+        self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncGenerator[dict, None]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.events):
+                    yield self.events[index]
+                    index += 1
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            # Nobody is listening any more: stop paying for the run.
+            if (
+                self.subscribers == 0
+                and not self.finished
+                and self.task
+                and self.cancel_when_idle
+            ):
+                self.abandoned = True
+                self.task.cancel()
+
+
+def _encode_error(error: BaseException) -> str:
+    if isinstance(error, UpstreamRateLimited):
+        return dumps({
+            "message": str(error),
+            "upstream": error.upstream,
+            "retry_after": error.retry_after,
+        })
+    if isinstance(error, QueueFull):
+        return dumps({
+            "message": str(error),
+            "queue": error.name,
+            "retry_after": error.retry_after,
+        })
+    return dumps({"message": str(error) or type(error).__name__})
+
+
+def _decode_error(encoded: str) -> Exception:
+    error = json.loads(encoded)
+    if "upstream" in error:
+        return UpstreamRateLimited(error["upstream"], error["retry_after"])
+    if "queue" in error:
+        return QueueFull(error["queue"], error["retry_after"])
+    return RemoteFlightError(error["message"])
+
+
+class SingleFlight:
+    """Coalesce concurrent runs that share a key into one producer.
+
+    With a shared (non-local) state backend, the coalescing spans worker
+    processes: a lease on the key elects one worker to run ``produce()``,
+    and it appends each event to a channel that the other workers replay to
+    their own subscribers, so a client gets the same stream whichever
+    worker it reached.
+    """
+
+    def __init__(self, state: SharedState | None = None) -> None:
+        self._flights: dict[str, Flight] = {}
+        self._state = state
+
+    @property
+    def state(self) -> SharedState:
+        if self._state is None:
+            self._state = get_shared_state()
+        return self._state
+
+    def subscribe(
+        self, key: str, produce: Callable[[], AsyncIterator[dict]]
+    ) -> AsyncGenerator[dict, None]:
+        """Join the in-flight run for ``key``, starting ``produce()`` if there is none."""
+        flight = self._flights.get(key)
+        if flight is None or flight.abandoned:
+            flight = Flight()
+            self._flights[key] = flight
+            if self.state.local:
+                run = self._run(key, flight, produce)
+            else:
+                run = self._run_shared(key, flight, produce)
+            flight.task = asyncio.create_task(run)
+        return flight.subscribe()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def _run(
+        self, key: str, flight: Flight, produce: Callable[[], AsyncIterator[dict]]
+    ) -> None:
+        try:
+            async for event in produce():
+                flight.publish(event)
+        except Exception as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            if not flight.finished:  # cancelled
+                flight.finish()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _run_shared(
+        self, key: str, flight: Flight, produce: Callable[[], AsyncIterator[dict]]
+    ) -> None:
+        state = self.state
+        lease = f"flight:{key}"
+        channel = f"{WORKER_ID}:{uuid.uuid4().hex}"
+        try:
+            holder = await state.acquire(lease, channel, settings.state_lease_seconds)
+            while holder != channel:
+                holder = await self._follow(lease, holder, channel, flight)
+                if holder is None:
+                    return
+            await self._produce(lease, channel, flight, produce)
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            if not flight.finished:  # cancelled
+                flight.finish()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _produce(
+        self,
+        lease: str,
+        channel: str,
+        flight: Flight,
+        produce: Callable[[], AsyncIterator[dict]],
+    ) -> None:
+        """Run ``produce()`` as the lease holder, publishing to ``channel`` too."""
+        state = self.state
+        # Remote followers keep the run alive; the heartbeat decides when
+        # nobody anywhere is listening.
+        flight.cancel_when_idle = False
+        run = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat(lease, channel, flight, run))
+        failure: Exception | None = None
+        error = ""
+        try:
+            async for event in produce():
+                flight.publish(event)
+                await state.publish(channel, dumps(event))
+        except Exception as e:
+            failure, error = e, _encode_error(e)
+        except asyncio.CancelledError:
+            error = dumps({"message": "Analysis cancelled"})
+            raise
+        finally:
+            heartbeat.cancel()
+            # Close the channel before local subscribers see the end.
+            await asyncio.shield(self._settle(lease, channel, error))
+        flight.finish(failure)
+
+    async def _settle(self, lease: str, channel: str, error: str) -> None:
+        await self.state.close(channel, error)
+        await self.state.release(lease, channel)
+
+    async def _heartbeat(
+        self, lease: str, channel: str, flight: Flight, run: asyncio.Task
+    ) -> None:
+        ttl = settings.state_lease_seconds
+        while True:
+            await asyncio.sleep(ttl / 3)
+            await self.state.acquire(lease, channel, ttl)
+            if flight.subscribers == 0 and await self.state.get(f"{channel}:watched") is None:
+                flight.abandoned = True
+                run.cancel()
+                return
+
+    async def _follow(
+        self, lease: str, holder: str, channel: str, flight: Flight
+    ) -> str | None:
+        """Replay the run ``holder`` is producing into ``flight``.
+
+        Returns None once that run has finished, or the new holder if its
+        worker went away before sending anything (it then becomes this
+        worker's own ``channel`` when the lease was free to take over).
+        """
+        state = self.state
+        ttl = settings.state_lease_seconds
+        after = 0
+        last_check = asyncio.get_running_loop().time()
+        while True:
+            await state.set(f"{holder}:watched", "1", ttl)
+            entries, closed = await state.read(holder, after)
+            for after, data in entries:
+                flight.publish(json.loads(data))
+            if closed is not None:
+                flight.finish(_decode_error(closed) if closed else None)
+                return None
+            now = asyncio.get_running_loop().time()
+            if not entries and now - last_check >= ttl / 3:
+                last_check = now
+                current = await state.acquire(lease, channel, ttl)
+                if current != holder:
+                    # The lease is also let go after a clean finish.
+                    entries, closed = await state.read(holder, after)
+                    if closed is not None:
+                        if current == channel:
+                            await state.release(lease, channel)
+                        for after, data in entries:
+                            flight.publish(json.loads(data))
+                        flight.finish(_decode_error(closed) if closed else None)
+                        return None
+                    if after:
+                        raise RemoteFlightError("The worker running this analysis stopped")
+                    return current
+            await asyncio.sleep(settings.state_poll_interval)
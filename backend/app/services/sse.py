@@ -0,0 +1,178 @@
+import json
+import zlib
+from typing import AsyncIterator
+
+from fastapi import Request
+from sse_starlette.event import ServerSentEvent
+from sse_starlette.sse import EventSourceResponse
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is the fallback
+    orjson = None
+
+# Protocol 1 is the original event shape. Protocol 2 drops the top-level
+# "reasoning" of pass_complete and discovery_complete, which repeats
+# data.reasoning_steps. Clients ask for it with this header.
+PROTOCOL_HEADER = "X-Glassbox-Protocol"
+PROTOCOL_VERSIONS = (1, 2)
+
+# Events keep "reasoning" as their last key, so protocol 2 can cut it off the
+# encoded text without decoding the rest of the event.
+_REASONING = ',"reasoning":'
+_decoder = json.JSONDecoder()
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+
+# zlib window bits per Content-Encoding.
+_WBITS = {"gzip": 31, "deflate": 15}
+
+
+def dumps(value: object) -> str:
+    """Compact JSON, via orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return _encoder.encode(value)
+
+
+def encode_event(payload: dict) -> str:
+    """``payload`` as JSON with its "reasoning" (if any) moved to the end."""
+    if "reasoning" not in payload:
+        return dumps(payload)
+    fields = {k: v for k, v in payload.items() if k != "reasoning"}
+    body = dumps(fields)
+    if len(body) == 2:
+        return dumps(payload)
+    return body[:-1] + _REASONING + dumps(payload["reasoning"]) + "}"
+
+
+def splice(encoded: str, **fields) -> str:
+    """Prepend ``fields`` to an encoded JSON object without decoding it.
+
+    Used to replay stored results: the stored text is sent as is, with the
+    event type and flags such as ``cached`` added in front. ``encoded`` must
+    not already contain those keys.
+    """
+    head = ",".join(f"{dumps(key)}:{dumps(value)}" for key, value in fields.items())
+    if encoded == "{}":
+        return "{" + head + "}"
+    return "{" + head + "," + encoded[1:] if head else encoded
+
+
+def drop_reasoning(data: str) -> str:
+    """The protocol 2 form of an encoded event: without a trailing "reasoning".
+
+    Only a top-level "reasoning" that ends the object is removed; anything
+    else (events stored before this encoding, nested keys) comes back as is.
+    """
+    start = data.rfind(_REASONING)
+    if start < 0:
+        return data
+    try:
+        _, end = _decoder.raw_decode(data, start + len(_REASONING))
+    except ValueError:
+        return data
+    if end != len(data) - 1:
+        return data
+    return data[:start] + "}"
+
+
+def wire(event: dict, protocol: int = 1) -> bytes:
+    """The bytes of one SSE event dict for ``protocol``."""
+    data = event["data"]
+    if protocol >= 2:
+        data = drop_reasoning(data)
+    if event.keys() - {"id", "data"} or "\n" in data or "\r" in data:
+        return ServerSentEvent(**{**event, "data": data}).encode()
+    if "id" in event:
+        return f"id: {event['id']}\r\ndata: {data}\r\n\r\n".encode()
+    return f"data: {data}\r\n\r\n".encode()
+
+
+def negotiate_protocol(request: Request) -> int:
+    try:
+        requested = int(request.headers.get(PROTOCOL_HEADER, "1"))
+    except ValueError:
+        return 1
+    return min(max(requested, 1), PROTOCOL_VERSIONS[-1])
+
+
+def negotiate_encoding(request: Request) -> str:
+    """"gzip", "deflate" or "" (identity) for an event stream to ``request``.
+
+    Compression is opt-in on both sides: ``settings.sse_compression`` must
+    allow it and the client must accept the coding (q > 0).
+    """
+    if not settings.sse_compression:
+        return ""
+    accepted: dict[str, float] = {}
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.strip().lower()] = q
+    for coding in ("gzip", "deflate"):
+        if accepted.get(coding, 0.0) > 0:
+            return coding
+    return ""
+
+
+class CompressedEventSourceResponse(EventSourceResponse):
+    """An event stream compressed as one gzip/deflate body.
+
+    Every chunk, keep-alive pings included, is flushed with Z_SYNC_FLUSH so
+    the client can decode each event as soon as it arrives.
+    """
+
+    def __init__(self, *args, encoding: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.encoding = encoding
+        self.headers["Content-Encoding"] = encoding
+        self.headers["Vary"] = "Accept-Encoding"
+
+    async def __call__(self, scope, receive, send) -> None:
+        compressor = zlib.compressobj(
+            settings.sse_compression_level, wbits=_WBITS[self.encoding]
+        )
+
+        async def compressed_send(message: dict) -> None:
+            if message["type"] == "http.response.body":
+                more = message.get("more_body", False)
+                body = compressor.compress(message.get("body", b""))
+                body += compressor.flush(zlib.Z_SYNC_FLUSH if more else zlib.Z_FINISH)
+                message = {**message, "body": body}
+            await send(message)
+
+        await super().__call__(scope, receive, compressed_send)
+
+
+async def _encoded(events: AsyncIterator[dict], protocol: int) -> AsyncIterator[bytes]:
+    try:
+        async for event in events:
+            yield wire(event, protocol)
+    finally:
+        # Close the source now, not at garbage collection, so a disconnect
+        # releases what it holds (e.g. a shared analysis) right away.
+        aclose = getattr(events, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def event_response(request: Request, events: AsyncIterator[dict]) -> EventSourceResponse:
+    """Stream SSE event dicts in the protocol and encoding ``request`` negotiated."""
+    protocol = negotiate_protocol(request)
+    encoding = negotiate_encoding(request)
+    headers = {PROTOCOL_HEADER: str(protocol)}
+    body = _encoded(events, protocol)
+    if encoding:
+        return CompressedEventSourceResponse(
+            body, encoding=encoding, headers=headers, media_type="text/event-stream"
+        )
+    return EventSourceResponse(body, headers=headers, media_type="text/event-stream")
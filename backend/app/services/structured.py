@@ -0,0 +1,166 @@
+import json
+from functools import lru_cache
+
+from pydantic import BaseModel, ValidationError
+
+_decoder = json.JSONDecoder()
+
+
+class SchemaError(ValueError):
+    """An answer that still does not fit its schema."""
+
+    def __init__(self, errors: list[dict]):
+        self.errors = errors
+        super().__init__(describe_errors(errors, limit=5))
+
+
+@lru_cache(maxsize=None)
+def input_schema(schema: type[BaseModel]) -> dict:
+    return schema.model_json_schema()
+
+
+def tool_definition(name: str, schema: type[BaseModel], description: str) -> dict:
+    return {"name": name, "description": description, "input_schema": input_schema(schema)}
+
+
+def force_tool(request: dict, tools: list[dict], tool: str) -> dict:
+    """Give a Messages request ``tools`` and force it to call ``tool``.
+
+    The answer then arrives as the tool's input, already parsed JSON that
+    follows the schema, instead of free text to be cleaned up.
+    """
+    return {**request, "tools": list(tools), "tool_choice": {"type": "tool", "name": tool}}
+
+
+def with_tool(request: dict, tool: str, schema: type[BaseModel], description: str) -> dict:
+    """Add a single tool taking ``schema`` to a Messages request and force its use."""
+    return force_tool(request, [tool_definition(tool, schema, description)], tool)
+
+
+def extract_json(text: str) -> object:
+    """Decode the first JSON object in ``text``, skipping fences and preamble.
+
+    Raises json.JSONDecodeError when there is none or it is cut off.
+    """
+    start = text.find("{")
+    if start < 0:
+        raise json.JSONDecodeError("No JSON object found", text, 0)
+    value, _ = _decoder.raw_decode(text, start)
+    return value
+
+
+def response_text(response) -> str:
+    return "".join(
+        getattr(block, "text", "") or "" for block in getattr(response, "content", [])
+    )
+
+
+def tool_input(response, tool: str) -> object:
+    """What the model submitted to ``tool``, or JSON recovered from its text."""
+    for block in getattr(response, "content", []):
+        if getattr(block, "type", "") == "tool_use" and block.name == tool:
+            return block.input
+    return extract_json(response_text(response))
+
+
+def validate(schema: type[BaseModel], data: object) -> tuple[dict | None, list[dict]]:
+    """``(normalized data, [])`` when ``data`` fits ``schema``, else ``(None, errors)``."""
+    try:
+        return schema.model_validate(data).model_dump(), []
+    except ValidationError as e:
+        return None, e.errors(include_url=False, include_context=False)
+
+
+def describe_errors(errors: list[dict], limit: int = 20) -> str:
+    lines = [
+        f"- {'.'.join(str(part) for part in e['loc']) or '(root)'}: {e['msg']}"
+        for e in errors[:limit]
+    ]
+    if len(errors) > limit:
+        lines.append(f"- ... and {len(errors) - limit} more")
+    return "\n".join(lines)
+
+
+def failing_fields(schema: type[BaseModel], data: object, errors: list[dict]) -> list[str]:
+    """Top-level fields to ask for again, or [] when only a full retry helps.
+
+    A repair is worth it while most of the answer is usable: the response
+    is an object and at least one field came through intact.
+    """
+    if not isinstance(data, dict):
+        return []
+    fields: list[str] = []
+    for error in errors:
+        if not error["loc"] or error["loc"][0] not in schema.model_fields:
+            return []
+        if error["loc"][0] not in fields:
+            fields.append(error["loc"][0])
+    return fields if len(fields) < len(schema.model_fields) else []
+
+
+def _block_dict(block) -> dict:
+    """A response content block as request content, with only the fields sent back."""
+    if getattr(block, "type", "text") == "tool_use":
+        return {"type": "tool_use", "id": block.id, "name": block.name, "input": block.input}
+    return {"type": "text", "text": block.text}
+
+
+def repair_request(
+    request: dict,
+    response,
+    tool: str,
+    schema: type[BaseModel],
+    errors: list[dict],
+    fields: list[str],
+) -> tuple[dict, str]:
+    """A follow-up request asking only for corrected values of ``fields``.
+
+    The model sees its previous answer and the validation errors, and must
+    call a ``<tool>_fix`` tool whose schema holds just those fields; its
+    input is then merged over the previous answer. Returns the request and
+    the fix tool's name.
+    """
+    full = input_schema(schema)
+    partial: dict = {
+        "type": "object",
+        "properties": {field: full["properties"][field] for field in fields},
+        "required": fields,
+    }
+    if "$defs" in full:
+        partial["$defs"] = full["$defs"]
+    fix_tool = f"{tool}_fix"
+
+    content = [_block_dict(block) for block in response.content]
+    problem = (
+        f"The answer failed validation:\n{describe_errors(errors)}\n\n"
+        f"Call {fix_tool} with corrected values for only these fields: "
+        + ", ".join(fields)
+    )
+    tool_use = next((b for b in content if b.get("type") == "tool_use"), None)
+    if tool_use is not None:
+        reply = [{
+            "type": "tool_result",
+            "tool_use_id": tool_use["id"],
+            "is_error": True,
+            "content": problem,
+        }]
+    else:
+        reply = [{"type": "text", "text": problem}]
+
+    tools = [t for t in request.get("tools", []) if t["name"] == tool]
+    tools.append({
+        "name": fix_tool,
+        "description": f"Submit corrected fields for {tool}.",
+        "input_schema": partial,
+    })
+    repair = {
+        **request,
+        "messages": [
+            *request["messages"],
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": reply},
+        ],
+        "tools": tools,
+        "tool_choice": {"type": "tool", "name": fix_tool},
+    }
+    return repair, fix_tool
@@ -0,0 +1,194 @@
+import os
+import zlib
+from typing import Callable
+
+from app.models.path_tree import PathTree
+
+BLOCK_SIZE = 512
+
+# Rough stand-in for GitHub's /languages endpoint, which the archive lacks.
+EXTENSION_LANGUAGES = {
+    ".py": "Python",
+    ".js": "JavaScript",
+    ".mjs": "JavaScript",
+    ".cjs": "JavaScript",
+    ".jsx": "JavaScript",
+    ".ts": "TypeScript",
+    ".tsx": "TypeScript",
+    ".go": "Go",
+    ".rs": "Rust",
+    ".rb": "Ruby",
+    ".java": "Java",
+    ".kt": "Kotlin",
+    ".swift": "Swift",
+    ".c": "C",
+    ".h": "C",
+    ".cc": "C++",
+    ".cpp": "C++",
+    ".hpp": "C++",
+    ".cs": "C#",
+    ".php": "PHP",
+    ".scala": "Scala",
+    ".sh": "Shell",
+    ".html": "HTML",
+    ".css": "CSS",
+    ".scss": "SCSS",
+    ".vue": "Vue",
+    ".svelte": "Svelte",
+    ".dart": "Dart",
+    ".ex": "Elixir",
+    ".exs": "Elixir",
+    ".lua": "Lua",
+    ".zig": "Zig",
+}
+
+
+def _parse_octal(field: bytes) -> int:
+    if field and field[0] & 0x80:  # GNU base-256 encoding for large sizes
+        return int.from_bytes(field[1:], "big")
+    field = field.rstrip(b"\0 ").strip()
+    return int(field, 8) if field else 0
+
+
+def _parse_pax(data: bytes) -> dict[str, str]:
+    records: dict[str, str] = {}
+    pos = 0
+    while pos < len(data):
+        space = data.find(b" ", pos)
+        if space == -1:
+            break
+        length = int(data[pos:space])
+        record = data[space + 1 : pos + length - 1]  # drop trailing newline
+        key, _, value = record.partition(b"=")
+        records[key.decode("utf-8", "replace")] = value.decode("utf-8", "replace")
+        pos += length
+    return records
+
+
+class TarballReader:
+    """Incremental reader for a gzipped GitHub tarball.
+
+    Compressed chunks go in through ``feed``; only member names and sizes
+    (in a PathTree of at most ``max_files``) and the first ``max_file_size``
+    bytes of members accepted by ``want`` are kept, so memory stays flat no
+    matter how large the archive is.
+    """
+
+    def __init__(
+        self, want: Callable[[str], bool], max_file_size: int, max_files: int | None = None
+    ):
+        self.want = want
+        self.max_file_size = max_file_size
+        self.tree = PathTree(max_files)
+        self.files: dict[str, str] = {}
+        self.languages: dict[str, int] = {}
+        self.commit_sha = ""
+        self.finished = False
+
+        self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buf = bytearray()
+        self._remaining = 0  # data bytes left in the current member
+        self._skip = 0  # padding bytes still to discard
+        self._padding = 0  # padding that follows the current member's data
+        self._member = ""
+        self._member_type = b""
+        self._capture: bytearray | None = None
+        self._capture_limit = 0
+        self._next_name = ""  # from a pax or GNU long-name header
+
+    def feed(self, chunk: bytes) -> None:
+        if self.finished:
+            return
+        self._buf += self._inflate.decompress(chunk)
+        self._drain()
+
+    def _drain(self) -> None:
+        buf = self._buf
+        pos = 0
+        while not self.finished:
+            if self._skip:
+                step = min(self._skip, len(buf) - pos)
+                self._skip -= step
+                pos += step
+                if self._skip:
+                    break
+            if self._remaining:
+                step = min(self._remaining, len(buf) - pos)
+                if self._capture is not None and len(self._capture) < self._capture_limit:
+                    room = self._capture_limit - len(self._capture)
+                    self._capture += buf[pos : pos + min(step, room)]
+                self._remaining -= step
+                pos += step
+                if self._remaining:
+                    break
+                self._end_member()
+                continue
+            if len(buf) - pos < BLOCK_SIZE:
+                break
+            self._start_member(bytes(buf[pos : pos + BLOCK_SIZE]))
+            pos += BLOCK_SIZE
+        del buf[:pos]
+
+    def _start_member(self, header: bytes) -> None:
+        if header == b"\0" * BLOCK_SIZE:
+            self.finished = True
+            return
+
+        name = header[0:100].rstrip(b"\0").decode("utf-8", "replace")
+        if header[257:262] == b"ustar":
+            prefix = header[345:500].rstrip(b"\0").decode("utf-8", "replace")
+            if prefix:
+                name = f"{prefix}/{name}"
+        size = _parse_octal(header[124:136])
+
+        self._member_type = header[156:157]
+        self._remaining = size
+        self._padding = (-size) % BLOCK_SIZE
+        self._capture = None
+
+        if self._member_type in (b"g", b"x", b"L"):
+            self._capture = bytearray()
+            self._capture_limit = size
+        else:
+            self._member = self._next_name or name
+            self._next_name = ""
+            path = self._strip_root(self._member)
+            if path and self._member_type == b"5":
+                self.tree.add_dir(path)
+            elif path:
+                self.tree.add(path, size)
+                if self._member_type in (b"0", b"\0"):
+                    self._count_language(path, size)
+                    if self.want(path):
+                        self._capture = bytearray()
+                        # UTF-8 needs at most 4 bytes per kept character.
+                        self._capture_limit = self.max_file_size * 4
+
+        if size == 0:
+            self._end_member()
+
+    def _end_member(self) -> None:
+        data = bytes(self._capture) if self._capture is not None else b""
+        if self._member_type == b"g":
+            self.commit_sha = _parse_pax(data).get("comment", "")
+        elif self._member_type == b"x":
+            self._next_name = _parse_pax(data).get("path", "")
+        elif self._member_type == b"L":
+            self._next_name = data.rstrip(b"\0").decode("utf-8", "replace")
+        elif self._capture is not None:
+            path = self._strip_root(self._member)
+            text = data.decode("utf-8", errors="replace")
+            self.files[path] = text[: self.max_file_size]
+        self._capture = None
+        self._skip = self._padding
+
+    def _count_language(self, path: str, size: int) -> None:
+        language = EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
+        if language:
+            self.languages[language] = self.languages.get(language, 0) + size
+
+    @staticmethod
+    def _strip_root(name: str) -> str:
+        # GitHub archives nest everything under "<owner>-<repo>-<sha>/".
+        _, _, path = name.partition("/")
+        return path.rstrip("/")
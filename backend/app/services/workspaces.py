@@ -0,0 +1,62 @@
+import posixpath
+
+from app.prompts.packer import MANIFESTS, path_score, rank_paths
+
+
+def group_workspaces(paths) -> dict[str, list[str]]:
+    """Group relevant paths by the sub-project they belong to.
+
+    Any directory holding a dependency manifest (``packages/web/package.json``,
+    ``services/api/go.mod``, ...) is a workspace root; every other candidate
+    file belongs to its nearest enclosing root, falling back to the repository
+    root ``"."``. Workspaces come back root first, then best-scoring first,
+    each with its files in rank order.
+    """
+    candidates = rank_paths(paths)
+    roots = {
+        posixpath.dirname(p) or "."
+        for p in candidates
+        if posixpath.basename(p) in MANIFESTS
+    }
+    roots.add(".")
+
+    groups: dict[str, list[str]] = {}
+    for path in candidates:
+        d = posixpath.dirname(path) or "."
+        while d not in roots:
+            d = posixpath.dirname(d) or "."
+        groups.setdefault(d, []).append(path)
+
+    best = {root: max(path_score(p) for p in files) for root, files in groups.items()}
+    order = sorted(groups, key=lambda r: (r != ".", -best[r], r))
+    return {root: groups[root] for root in order}
+
+
+def plan_fetch(
+    workspaces: dict[str, list[str]],
+    sizes: dict[str, int],
+    limit: int,
+    byte_budget: int,
+    max_file_size: int,
+) -> list[str]:
+    """Pick which files to fetch: each workspace's best file, then the rest.
+
+    Every sub-project gets its best file (normally its manifest) first, so
+    a monorepo with dozens of packages is not represented by its first few
+    alone; the remaining slots go to the best-scoring files overall. Each
+    file is charged its size from the tree (capped at ``max_file_size``)
+    against ``byte_budget``; files that would overrun it are skipped in
+    favour of smaller ones.
+    """
+    heads = [files[0] for files in workspaces.values() if files]
+    rest = rank_paths(p for files in workspaces.values() for p in files[1:])
+    chosen: list[str] = []
+    remaining = byte_budget
+    for path in heads + rest:
+        if len(chosen) >= limit:
+            break
+        cost = min(sizes.get(path, max_file_size), max_file_size)
+        if cost <= remaining:
+            chosen.append(path)
+            remaining -= cost
+    return chosen
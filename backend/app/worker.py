@@ -0,0 +1,30 @@
+"""Standalone analysis worker: ``python -m app.worker --workers 4``.
+
+Processes jobs from the same queue as the web tier (``settings.job_db_path``),
+so workers can be scaled independently; run the web tier with
+``JOB_WORKERS=0`` to leave all analysis to these processes.
+"""
+import argparse
+import asyncio
+
+from app.services import github_client, jobs, llm
+
+
+async def main(workers: int) -> None:
+    llm.open_client()
+    github_client.open_client()
+    try:
+        await asyncio.gather(*jobs.start_workers(workers))
+    finally:
+        await github_client.close_client()
+        await llm.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run analysis job workers.")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.workers))
+    except KeyboardInterrupt:
+        pass
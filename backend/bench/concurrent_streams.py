@@ -0,0 +1,119 @@
+"""Load check: N concurrent /api/analyze streams must overlap, not serialize.
+
+Runs the real app under uvicorn in-process with a stand-in Anthropic client
+whose calls simply sleep, then opens N streams at once while polling /health.
+
+    python -m bench.concurrent_streams --streams 8 --latency 0.5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from app import main
+from app.config import settings
+from app.models.schemas import RepoContent
+from app.prompts.passes import PASS_DEFINITIONS
+from app.services import analyzer, llm
+from bench.fake_anthropic import example_input, forced_tool
+from bench.server import run_server
+
+
+class FakeMessages:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        tool = forced_tool(kwargs)
+        if tool is None:
+            return SimpleNamespace(content=[SimpleNamespace(type="text", text="OK")])
+        block = SimpleNamespace(
+            type="tool_use",
+            id="toolu_bench",
+            name=tool["name"],
+            input=example_input(tool["input_schema"]),
+        )
+        return SimpleNamespace(content=[block])
+
+
+class FakeAnthropic:
+    def __init__(self, latency: float):
+        self.messages = FakeMessages(latency)
+
+    async def close(self) -> None:
+        pass
+
+
+async def _fake_fetch_repo_content(url: str, mode: str | None = None) -> RepoContent:
+    owner, repo = url.rstrip("/").split("/")[-2:]
+    return RepoContent(repo_name=repo, owner=owner, readme="# stand-in")
+
+
+async def _stream(client: httpx.AsyncClient, n: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    body = {"url": f"https://github.com/bench/repo-{n}"}
+    async with client.stream("POST", "/api/analyze", json=body) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line.startswith("data:") and '"done"' in line:
+                break
+    return start, time.perf_counter()
+
+
+async def _poll_health(client: httpx.AsyncClient, stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        (await client.get("/health")).raise_for_status()
+        worst = max(worst, time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+    return worst
+
+
+async def run(streams: int, latency: float) -> bool:
+    analyzer.fetch_repo_content = _fake_fetch_repo_content
+
+    async with run_server(main.app) as base_url:
+        # Swap in the stand-in after the lifespan has opened the real client.
+        llm.set_client(FakeAnthropic(latency))
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            stop = asyncio.Event()
+            health = asyncio.create_task(_poll_health(client, stop))
+            wall_start = time.perf_counter()
+            spans = await asyncio.gather(*[_stream(client, n) for n in range(streams)])
+            wall = time.perf_counter() - wall_start
+            stop.set()
+            worst_health = await health
+
+    single = latency * -(-len(PASS_DEFINITIONS) // settings.analysis_concurrency)
+    serial = single * streams
+    overlapping = sum(
+        1 for i, a in enumerate(spans) for b in spans[i + 1:]
+        if a[0] < b[1] and b[0] < a[1]
+    )
+    pairs = streams * (streams - 1) // 2
+
+    print(f"streams={streams} latency={latency}s")
+    print(f"wall={wall:.2f}s  serialized would be >= {serial:.2f}s")
+    print(f"overlapping stream pairs: {overlapping}/{pairs}")
+    print(f"worst /health latency during load: {worst_health * 1000:.1f}ms")
+
+    return overlapping == pairs and wall < serial / 2 and worst_health < latency
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.streams, args.latency))
+    print("PASS" if ok else "FAIL: streams did not overlap")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,209 @@
+"""Local stand-in for the Anthropic Messages API.
+
+Answers POST /v1/messages, streaming or not. Requests that force a tool get
+a tool_use block whose input is built from the tool's input schema; others
+get a short text reply. Latency is
+simulated as time-to-first-token plus output tokens at a sampled token rate.
+Prompt caching is modelled too: a cache_control prefix (tools, then system,
+then messages, as the API orders them) seen before is reported as
+cache_read_input_tokens and skips its share of prefill time.
+
+Point the app at it with ANTHROPIC_BASE_URL=http://127.0.0.1:<port>.
+"""
+import asyncio
+import hashlib
+import json
+import random
+from dataclasses import dataclass
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class LatencyProfile:
+    ttft: float = 0.5  # median seconds to first token for an uncached prompt
+    ttft_sigma: float = 0.3  # lognormal spread of the first-token delay
+    prefill_per_token: float = 0.00005  # extra first-token delay per uncached input token
+    tokens_per_second: float = 80.0
+    tokens_per_second_jitter: float = 20.0
+
+    def first_token_delay(self, uncached_tokens: int) -> float:
+        return random.lognormvariate(0, self.ttft_sigma) * self.ttft + (
+            uncached_tokens * self.prefill_per_token
+        )
+
+    def token_delay(self) -> float:
+        rate = random.gauss(self.tokens_per_second, self.tokens_per_second_jitter)
+        return 1.0 / max(rate, 1.0)
+
+
+def _blocks(content: str | list[dict]) -> list[dict]:
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}] if content else []
+    return [block for block in content if block.get("type") == "text"]
+
+
+def _prompt_blocks(body: dict) -> list[dict]:
+    """The request's prompt as text blocks in cache-prefix order: tools, system, messages."""
+    blocks = []
+    if body.get("tools"):
+        blocks.append({"type": "text", "text": json.dumps(body["tools"], sort_keys=True)})
+    blocks += _blocks(body.get("system", ""))
+    for message in body.get("messages", []):
+        blocks += _blocks(message.get("content", ""))
+    return blocks
+
+
+def example_input(schema: dict, defs: dict | None = None) -> object:
+    """A small value that satisfies a JSON schema (as pydantic emits them)."""
+    defs = schema.get("$defs", defs or {})
+    if "$ref" in schema:
+        return example_input(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    if "anyOf" in schema:
+        options = [o for o in schema["anyOf"] if o.get("type") != "null"]
+        return example_input(options[0], defs) if options else None
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {
+            name: example_input(prop, defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [example_input(schema.get("items", {}), defs)]
+    if kind == "integer":
+        return schema.get("minimum", 1)
+    if kind == "number":
+        return schema.get("minimum", 1.0)
+    if kind == "boolean":
+        return True
+    return "example"
+
+
+def forced_tool(body: dict) -> dict | None:
+    """The tool a request forces the model to call, if any."""
+    choice = body.get("tool_choice") or {}
+    if choice.get("type") != "tool":
+        return None
+    return next((t for t in body.get("tools", []) if t["name"] == choice["name"]), None)
+
+
+def make_app(profile: LatencyProfile | None = None) -> Starlette:
+    profile = profile or LatencyProfile()
+    cached_prefixes: set[str] = set()
+
+    def account(body: dict) -> tuple[dict, int]:
+        """Token usage for a request, updating the simulated prompt cache."""
+        prefix = hashlib.sha256(body.get("model", "").encode())
+        usage = {
+            "input_tokens": 0,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        }
+        pending = 0
+        for block in _prompt_blocks(body):
+            tokens = max(1, len(block["text"]) // CHARS_PER_TOKEN)
+            prefix.update(block["text"].encode())
+            pending += tokens
+            if block.get("cache_control"):
+                key = prefix.hexdigest()
+                field = (
+                    "cache_read_input_tokens"
+                    if key in cached_prefixes
+                    else "cache_creation_input_tokens"
+                )
+                cached_prefixes.add(key)
+                usage[field] += pending
+                pending = 0
+        usage["input_tokens"] = pending
+        uncached = pending + usage["cache_creation_input_tokens"]
+        return usage, uncached
+
+    async def messages(request: Request) -> Response:
+        body = await request.json()
+        tool = forced_tool(body)
+        if tool is not None:
+            text = json.dumps(example_input(tool["input_schema"]), indent=2)
+        else:
+            text = "OK"
+        max_chars = body.get("max_tokens", 4096) * CHARS_PER_TOKEN
+        stop_reason = "max_tokens" if len(text) > max_chars else "end_turn"
+        if tool is not None and stop_reason == "end_turn":
+            stop_reason = "tool_use"
+        text = text[:max_chars]
+        usage, uncached = account(body)
+        output_tokens = max(1, len(text) // CHARS_PER_TOKEN)
+        message = {
+            "id": f"msg_{random.getrandbits(64):016x}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", ""),
+            "stop_reason": None,
+            "stop_sequence": None,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(
+                profile.first_token_delay(uncached)
+                + sum(profile.token_delay() for _ in range(output_tokens))
+            )
+            if tool is not None:
+                block = {
+                    "type": "tool_use",
+                    "id": f"toolu_{random.getrandbits(64):016x}",
+                    "name": tool["name"],
+                    "input": json.loads(text) if stop_reason == "tool_use" else {},
+                }
+            else:
+                block = {"type": "text", "text": text}
+            return JSONResponse({
+                **message,
+                "content": [block],
+                "stop_reason": stop_reason,
+                "usage": {**usage, "output_tokens": output_tokens},
+            })
+
+        def sse(event: str, data: dict) -> str:
+            return f"event: {event}\ndata: {json.dumps({'type': event, **data})}\n\n"
+
+        async def stream():
+            await asyncio.sleep(profile.first_token_delay(uncached))
+            yield sse("message_start", {
+                "message": {**message, "content": [], "usage": {**usage, "output_tokens": 1}},
+            })
+            if tool is not None:
+                block = {
+                    "type": "tool_use",
+                    "id": f"toolu_{random.getrandbits(64):016x}",
+                    "name": tool["name"],
+                    "input": {},
+                }
+            else:
+                block = {"type": "text", "text": ""}
+            yield sse("content_block_start", {"index": 0, "content_block": block})
+            for i in range(0, len(text), CHARS_PER_TOKEN):
+                await asyncio.sleep(profile.token_delay())
+                chunk = text[i : i + CHARS_PER_TOKEN]
+                if tool is not None:
+                    delta = {"type": "input_json_delta", "partial_json": chunk}
+                else:
+                    delta = {"type": "text_delta", "text": chunk}
+                yield sse("content_block_delta", {"index": 0, "delta": delta})
+            yield sse("content_block_stop", {"index": 0})
+            yield sse("message_delta", {
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": output_tokens},
+            })
+            yield sse("message_stop", {})
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/messages", messages, methods=["POST"])])
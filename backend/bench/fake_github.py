@@ -0,0 +1,249 @@
+"""Local stand-in for the parts of the GitHub API that ingestion uses.
+
+Serves fixture repositories through the REST endpoints, raw README URLs and
+gzipped tarballs. JSON and text responses carry an ETag and answer matching
+If-None-Match requests with 304, like GitHub. Point the app at it with:
+
+    GITHUB_API_URL=http://127.0.0.1:<port>
+    GITHUB_RAW_URL=http://127.0.0.1:<port>/raw
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import random
+import tarfile
+from dataclasses import dataclass, field
+from functools import cached_property
+
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response
+from starlette.routing import Route
+
+
+@dataclass
+class FixtureRepo:
+    files: dict[str, str]
+    description: str = ""
+    languages: dict[str, int] = field(default_factory=dict)
+    _tarballs: dict[str, bytes] = field(default_factory=dict, repr=False)
+
+    @cached_property
+    def sha(self) -> str:
+        digest = hashlib.sha1()
+        for path in sorted(self.files):
+            digest.update(path.encode() + b"\0" + self.files[path].encode())
+        return digest.hexdigest()
+
+    def tree(self) -> list[dict]:
+        dirs: set[str] = set()
+        for path in self.files:
+            parts = path.split("/")[:-1]
+            dirs.update("/".join(parts[: i + 1]) for i in range(len(parts)))
+        entries = [{"path": d, "type": "tree"} for d in dirs]
+        entries += [
+            {"path": p, "type": "blob", "size": len(text.encode())}
+            for p, text in self.files.items()
+        ]
+        return sorted(entries, key=lambda e: e["path"])
+
+    def tarball(self, owner: str, repo: str) -> bytes:
+        root = f"{owner}-{repo}-{self.sha[:7]}"
+        if root in self._tarballs:
+            return self._tarballs[root]
+        buf = io.BytesIO()
+        with tarfile.open(
+            fileobj=buf,
+            mode="w:gz",
+            format=tarfile.PAX_FORMAT,
+            pax_headers={"comment": self.sha},
+        ) as tar:
+            for entry in self.tree():
+                info = tarfile.TarInfo(f"{root}/{entry['path']}")
+                if entry["type"] == "tree":
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                else:
+                    data = self.files[entry["path"]].encode()
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+        self._tarballs[root] = buf.getvalue()
+        return self._tarballs[root]
+
+
+_MANIFESTS = ["package.json", "pyproject.toml", "go.mod", "Cargo.toml", "Dockerfile"]
+_SOURCE_EXTENSIONS = [".py", ".ts", ".go", ".rs", ".js"]
+
+
+def generate_repo(
+    files: int = 200,
+    depth: int = 4,
+    file_size: int = 2000,
+    readme_size: int = 8000,
+    seed: int = 0,
+) -> FixtureRepo:
+    """Build a synthetic repo with ``files`` sources spread ``depth`` levels deep.
+
+    Root manifests are always present, and every top-level package gets its
+    own ``package.json`` so monorepo-style layouts are exercised too.
+    """
+    rng = random.Random(seed)
+    repo_files = {
+        "README.md": ("# Fixture repo\n\n" + "Lorem ipsum dolor sit amet. " * readme_size)[
+            :readme_size
+        ],
+    }
+    for manifest in _MANIFESTS:
+        repo_files[manifest] = f"# {manifest} for fixture {seed}\n"
+    packages = max(1, files // 50)
+    for i in range(files):
+        package = f"packages/pkg{i % packages}"
+        nested = "/".join(f"d{rng.randrange(4)}" for _ in range(rng.randrange(depth)))
+        ext = rng.choice(_SOURCE_EXTENSIONS)
+        path = "/".join(p for p in (package, "src", nested, f"file{i}{ext}") if p)
+        repo_files[path] = "x" * file_size
+        repo_files.setdefault(f"{package}/package.json", f'{{"name": "pkg{i % packages}"}}')
+    languages: dict[str, int] = {}
+    for path in repo_files:
+        for ext, name in zip(_SOURCE_EXTENSIONS, ["Python", "TypeScript", "Go", "Rust", "JavaScript"]):
+            if path.endswith(ext):
+                languages[name] = languages.get(name, 0) + file_size
+    return FixtureRepo(
+        files=repo_files, description=f"Synthetic fixture repo {seed}", languages=languages
+    )
+
+
+class _LatencyMiddleware:
+    """Delay every response by ``latency`` ± ``jitter`` seconds."""
+
+    def __init__(self, app, latency: float, jitter: float):
+        self.app = app
+        self.latency = latency
+        self.jitter = jitter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.latency > 0:
+            delay = self.latency + random.uniform(-self.jitter, self.jitter)
+            await asyncio.sleep(max(0.0, delay))
+        await self.app(scope, receive, send)
+
+
+def _conditional(request: Request, response: Response) -> Response:
+    etag = f'"{hashlib.sha1(response.body).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return response
+
+
+def make_app(
+    repos: dict[str, FixtureRepo], latency: float = 0.0, jitter: float = 0.0
+) -> Starlette:
+    """Build the stand-in app serving ``repos`` keyed by "owner/repo".
+
+    Each response is delayed by ``latency`` ± ``jitter`` seconds, and
+    ``app.state.status_counts`` tallies responses by status code.
+    """
+
+    def lookup(request: Request) -> FixtureRepo | None:
+        params = request.path_params
+        return repos.get(f"{params['owner']}/{params['repo']}")
+
+    def not_found() -> JSONResponse:
+        return JSONResponse({"message": "Not Found"}, status_code=404)
+
+    async def repo_info(request: Request) -> Response:
+        fixture = lookup(request)
+        if fixture is None:
+            return not_found()
+        p = request.path_params
+        return _conditional(request, JSONResponse({
+            "full_name": f"{p['owner']}/{p['repo']}",
+            "description": fixture.description,
+            "default_branch": "main",
+        }))
+
+    async def languages(request: Request) -> Response:
+        fixture = lookup(request)
+        if fixture is None:
+            return not_found()
+        return _conditional(request, JSONResponse(fixture.languages))
+
+    async def tree(request: Request) -> Response:
+        fixture = lookup(request)
+        if fixture is None:
+            return not_found()
+        return _conditional(request, JSONResponse(
+            {"sha": fixture.sha, "tree": fixture.tree(), "truncated": False}
+        ))
+
+    async def contents(request: Request) -> Response:
+        fixture = lookup(request)
+        path = request.path_params["path"]
+        if fixture is None or path not in fixture.files:
+            return not_found()
+        encoded = base64.b64encode(fixture.files[path].encode()).decode()
+        return _conditional(request, JSONResponse(
+            {"path": path, "encoding": "base64", "content": encoded}
+        ))
+
+    async def raw(request: Request) -> Response:
+        fixture = lookup(request)
+        path = request.path_params["path"]
+        if fixture is None or path not in fixture.files:
+            return PlainTextResponse("404: Not Found", status_code=404)
+        return _conditional(request, PlainTextResponse(fixture.files[path]))
+
+    async def tarball(request: Request) -> Response:
+        if lookup(request) is None:
+            return not_found()
+        p = request.path_params
+        return RedirectResponse(f"/codeload/{p['owner']}/{p['repo']}/tar.gz", status_code=302)
+
+    async def codeload(request: Request) -> Response:
+        fixture = lookup(request)
+        if fixture is None:
+            return not_found()
+        p = request.path_params
+        return Response(
+            fixture.tarball(p["owner"], p["repo"]),
+            media_type="application/x-gzip",
+        )
+
+    async def org_repos(request: Request) -> Response:
+        owner = request.path_params["owner"]
+        names = sorted(key for key in repos if key.split("/")[0] == owner)
+        if not names:
+            return not_found()
+        per_page = int(request.query_params.get("per_page", 30))
+        page = int(request.query_params.get("page", 1))
+        listing = [
+            {"full_name": name, "html_url": f"https://github.com/{name}",
+             "fork": False, "archived": False}
+            for name in names[(page - 1) * per_page : page * per_page]
+        ]
+        return JSONResponse(listing)
+
+    app = Starlette(routes=[
+        Route("/orgs/{owner}/repos", org_repos),
+        Route("/repos/{owner}/{repo}", repo_info),
+        Route("/repos/{owner}/{repo}/languages", languages),
+        Route("/repos/{owner}/{repo}/git/trees/HEAD", tree),
+        Route("/repos/{owner}/{repo}/contents/{path:path}", contents),
+        Route("/repos/{owner}/{repo}/tarball", tarball),
+        Route("/codeload/{owner}/{repo}/tar.gz", codeload),
+        Route("/raw/{owner}/{repo}/HEAD/{path:path}", raw),
+    ])
+    app.state.status_counts = {}
+
+    async def count_statuses(request: Request, call_next):
+        response = await call_next(request)
+        counts = app.state.status_counts
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        return response
+
+    app.add_middleware(BaseHTTPMiddleware, dispatch=count_statuses)
+    app.add_middleware(_LatencyMiddleware, latency=latency, jitter=jitter)
+    return app
@@ -0,0 +1,214 @@
+"""Offline load driver for /api/analyze and /api/discover.
+
+Starts the fake GitHub and Anthropic servers in-process, runs the real app
+under uvicorn in a subprocess pointed at them, then opens many concurrent
+SSE streams and reports latency percentiles, throughput and the app's
+event-loop lag (scraped from /metrics). No API keys or network needed.
+
+    python -m bench.load --requests 60 --concurrency 20
+    python -m bench.load --endpoint discover --ttft 1.0
+    python -m bench.load --set INGESTION_MODE=tarball --set PASS_STREAMING=true
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from bench.fake_anthropic import LatencyProfile
+from bench.fake_anthropic import make_app as make_anthropic_app
+from bench.fake_github import generate_repo
+from bench.fake_github import make_app as make_github_app
+from bench.server import free_port, run_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class StreamResult:
+    endpoint: str
+    ok: bool
+    first_event: float | None = None
+    total: float = 0.0
+    events: int = 0
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def histogram_quantiles(metrics_text: str, name: str, qs=(0.5, 0.99)) -> dict[str, str]:
+    """Estimate quantiles of a Prometheus histogram as bucket upper bounds."""
+    buckets = [
+        (m.group(1), float(m.group(2)))
+        for m in re.finditer(rf'^{name}_bucket\{{le="([^"]+)"\}} (\S+)$', metrics_text, re.M)
+    ]
+    if not buckets or buckets[-1][1] == 0:
+        return {}
+    total = buckets[-1][1]
+    result = {}
+    for q in qs:
+        bound = next(le for le, count in buckets if count >= q * total)
+        result[f"p{int(q * 100)}"] = f"<= {bound}s" if bound != "+Inf" else "> largest bucket"
+    return result
+
+
+async def _open_stream(
+    client: httpx.AsyncClient, endpoint: str, body: dict
+) -> StreamResult:
+    start = time.perf_counter()
+    result = StreamResult(endpoint=endpoint, ok=False)
+    try:
+        async with client.stream("POST", f"/api/{endpoint}", json=body) as resp:
+            if resp.status_code != 200:
+                await resp.aread()
+                return result
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                if result.first_event is None:
+                    result.first_event = time.perf_counter() - start
+                result.events += 1
+                event = json.loads(line[len("data:"):])
+                if event.get("event_type") == "done":
+                    result.ok = True
+    except httpx.HTTPError:
+        pass
+    result.total = time.perf_counter() - start
+    return result
+
+
+def _request_body(endpoint: str, n: int, repos: int) -> dict:
+    if endpoint == "analyze":
+        return {"url": f"https://github.com/bench/repo-{n % repos}"}
+    return {"query": f"lightweight python web framework variant {n % repos}"}
+
+
+async def _wait_ready(base_url: str, proc: subprocess.Popen) -> None:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(200):
+            if proc.poll() is not None:
+                raise RuntimeError("app exited during startup")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("app did not become ready")
+
+
+async def run(args: argparse.Namespace) -> dict:
+    repos = {
+        f"bench/repo-{i}": generate_repo(
+            files=args.repo_files, depth=args.repo_depth, file_size=args.file_size, seed=i
+        )
+        for i in range(args.repos)
+    }
+    profile = LatencyProfile(
+        ttft=args.ttft, tokens_per_second=args.tokens_per_second,
+        tokens_per_second_jitter=args.tokens_per_second / 4,
+    )
+    github_app = make_github_app(repos, latency=args.github_latency, jitter=args.github_latency / 2)
+
+    async with run_server(github_app) as github_url, \
+            run_server(make_anthropic_app(profile)) as anthropic_url:
+        port = free_port()
+        env = {
+            **os.environ,
+            "ANTHROPIC_API_KEY": "bench",
+            "ANTHROPIC_BASE_URL": anthropic_url,
+            "GITHUB_API_URL": github_url,
+            "GITHUB_RAW_URL": f"{github_url}/raw",
+            "GITHUB_TOKEN": "",
+            "PASS_CACHE_BACKEND": "memory" if args.cache else "none",
+            "HTTP_CACHE_ENABLED": "true" if args.cache else "false",
+        }
+        for assignment in args.set:
+            key, _, value = assignment.partition("=")
+            env[key.upper()] = value
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            await _wait_ready(base_url, proc)
+            endpoints = ["analyze", "discover"] if args.endpoint == "both" else [args.endpoint]
+            semaphore = asyncio.Semaphore(args.concurrency)
+            limits = httpx.Limits(max_connections=args.concurrency + 4)
+            async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+
+                async def one(n: int) -> StreamResult:
+                    endpoint = endpoints[n % len(endpoints)]
+                    async with semaphore:
+                        return await _open_stream(
+                            client, endpoint, _request_body(endpoint, n, args.repos)
+                        )
+
+                wall_start = time.perf_counter()
+                results = await asyncio.gather(*[one(n) for n in range(args.requests)])
+                wall = time.perf_counter() - wall_start
+                metrics_text = (await client.get("/metrics")).text
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    report: dict = {"wall_seconds": round(wall, 3), "endpoints": {}}
+    for endpoint in endpoints:
+        subset = [r for r in results if r.endpoint == endpoint]
+        ok = [r for r in subset if r.ok]
+        ttfe = [r.first_event for r in ok if r.first_event is not None]
+        totals = [r.total for r in ok]
+        report["endpoints"][endpoint] = {
+            "requests": len(subset),
+            "errors": len(subset) - len(ok),
+            "rps": round(len(ok) / wall, 2),
+            **{f"ttfe_p{q}": round(percentile(ttfe, q), 3) for q in (50, 95, 99)},
+            **{f"total_p{q}": round(percentile(totals, q), 3) for q in (50, 95, 99)},
+        }
+    report["event_loop_lag"] = histogram_quantiles(
+        metrics_text, "glassbox_event_loop_lag_seconds"
+    )
+    return report
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", choices=["analyze", "discover", "both"], default="analyze")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--repos", type=int, default=40, help="distinct fixture repos / queries")
+    parser.add_argument("--repo-files", type=int, default=300)
+    parser.add_argument("--repo-depth", type=int, default=4)
+    parser.add_argument("--file-size", type=int, default=2000)
+    parser.add_argument("--github-latency", type=float, default=0.05)
+    parser.add_argument("--ttft", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--cache", action="store_true", help="keep result and HTTP caches on")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra app setting, e.g. INGESTION_MODE=tarball")
+    parser.add_argument("--json", metavar="PATH", help="also write the report to PATH")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,131 @@
+"""Microbenchmark for SSE event encoding.
+
+Builds pass_complete events of realistic size from the pass schemas and
+times the original path (json.dumps, then sse-starlette's encoder) against
+app/services/sse.py, for live results and for replays from the pass cache.
+Also reports bytes per analysis for each protocol version, with and without
+per-event gzip flushing.
+
+    python -m bench.sse_encoding --items 8 --repeat 2000
+"""
+import argparse
+import json
+import time
+import zlib
+
+from sse_starlette.event import ServerSentEvent
+
+from app.prompts.passes import PASS_DEFINITIONS
+from app.services import sse
+from app.services.structured import input_schema
+from bench.fake_anthropic import example_input
+
+WORDS = (
+    "the service reads its configuration from environment variables and falls back "
+    "to defaults when they are missing which hides mistakes until production"
+).split()
+
+
+def _inflate(value: object, items: int, seed: list[int]) -> object:
+    """``value`` with every list grown to ``items`` entries and varied text."""
+    if isinstance(value, dict):
+        return {key: _inflate(v, items, seed) for key, v in value.items()}
+    if isinstance(value, list):
+        return [_inflate(value[0], items, seed) for _ in range(items)] if value else []
+    if value == "example":
+        seed[0] += 1
+        return " ".join(WORDS[(seed[0] + i) % len(WORDS)] for i in range(12))
+    return value
+
+
+def pass_payloads(items: int) -> list[dict]:
+    payloads = []
+    for number, definition in enumerate(PASS_DEFINITIONS, 1):
+        data = _inflate(example_input(input_schema(definition["schema"])), items, [number])
+        payloads.append({
+            "pass_name": definition["name"],
+            "pass_number": number,
+            "data": data,
+            "reasoning": data["reasoning_steps"],
+            "message": f"{definition['title']} complete (12.3s)",
+            "elapsed": 12.3,
+            "usage": {"input_tokens": 9000, "output_tokens": 1500},
+            "model": "claude-opus-4-6",
+            "cost_usd": 0.0825,
+        })
+    return payloads
+
+
+def _time(fn, payloads: list, repeat: int) -> float:
+    """Microseconds per event."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for payload in payloads:
+            fn(payload)
+    return (time.perf_counter() - start) / (repeat * len(payloads)) * 1e6
+
+
+def _compressed_size(chunks: list[bytes]) -> int:
+    compressor = zlib.compressobj(6, wbits=31)
+    size = 0
+    for chunk in chunks:
+        size += len(compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH))
+    return size + len(compressor.flush(zlib.Z_FINISH))
+
+
+def run(items: int, repeat: int) -> dict:
+    payloads = pass_payloads(items)
+    stored_std = [json.dumps(p) for p in payloads]
+    stored = [sse.encode_event(p) for p in payloads]
+
+    def original_live(payload: dict) -> bytes:
+        data = json.dumps({"event_type": "pass_complete", **payload})
+        return ServerSentEvent(data=data).encode()
+
+    def new_live(payload: dict) -> bytes:
+        data = sse.encode_event({"event_type": "pass_complete", **payload})
+        return sse.wire({"data": data})
+
+    def original_replay(cached: str) -> bytes:
+        payload = {"event_type": "pass_complete", **json.loads(cached), "cached": True}
+        return ServerSentEvent(data=json.dumps(payload)).encode()
+
+    def new_replay(cached: str) -> bytes:
+        data = sse.splice(cached, event_type="pass_complete", cached=True)
+        return sse.wire({"data": data})
+
+    def new_replay_v2(cached: str) -> bytes:
+        data = sse.splice(cached, event_type="pass_complete", cached=True)
+        return sse.wire({"data": data}, protocol=2)
+
+    v1 = [new_replay(c) for c in stored]
+    v2 = [new_replay_v2(c) for c in stored]
+    return {
+        "json_backend": "orjson" if sse.orjson is not None else "json",
+        "event_bytes_avg": sum(map(len, v1)) // len(v1),
+        "us_per_event": {
+            "live_original": round(_time(original_live, payloads, repeat), 1),
+            "live_new": round(_time(new_live, payloads, repeat), 1),
+            "replay_original": round(_time(original_replay, stored_std, repeat), 1),
+            "replay_new": round(_time(new_replay, stored, repeat), 1),
+            "replay_new_protocol_2": round(_time(new_replay_v2, stored, repeat), 1),
+        },
+        "bytes_per_analysis": {
+            "protocol_1": sum(map(len, v1)),
+            "protocol_2": sum(map(len, v2)),
+            "protocol_1_gzip": _compressed_size(v1),
+            "protocol_2_gzip": _compressed_size(v2),
+        },
+    }
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=8, help="entries per list in each result")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.items, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    cli()
@@ -127,7 +127,7 @@ export default function AnalyzePage() {
             <ProgressTracker
               currentPass={state.currentPass}
               completedPasses={completedPasses}
-              reasoning={state.reasoning}
+              reasoning={state.progress[state.currentPassName] ?? state.reasoning}
               message={state.message}
               status={state.status}
             />
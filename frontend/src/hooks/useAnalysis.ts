@@ -9,6 +9,7 @@ const initialState: AnalysisState = {
   currentPassName: "",
   message: "",
   reasoning: [],
+  progress: {},
   results: {},
 };
 
@@ -46,11 +47,28 @@ function cacheResult(repoKey: string, results: AnalysisResults): void {
 
 // --- SSE processing ---
 
+function withoutPass(
+  progress: Record<string, string[]>,
+  passName: string
+): Record<string, string[]> {
+  const rest = { ...progress };
+  delete rest[passName];
+  return rest;
+}
+
 function processEvent(
   event: Record<string, unknown>,
   setState: React.Dispatch<React.SetStateAction<AnalysisState>>
 ) {
   switch (event.event_type) {
+    case "queued":
+      // The backend is at capacity; show our place in line until a slot frees
+      setState((prev) => ({
+        ...prev,
+        message: event.message as string,
+      }));
+      break;
+
     case "analysis_start":
       setState((prev) => ({
         ...prev,
@@ -65,6 +83,31 @@ function processEvent(
         currentPassName: event.pass_name as string,
         message: event.message as string,
         reasoning: [],
+        progress: { ...prev.progress, [event.pass_name as string]: [] },
+      }));
+      break;
+
+    case "pass_progress":
+      // Streamed passes report reasoning steps before the full result lands.
+      // Passes run concurrently, so each keeps its own list.
+      if (event.field === "reasoning_steps") {
+        const passName = event.pass_name as string;
+        setState((prev) => ({
+          ...prev,
+          progress: {
+            ...prev.progress,
+            [passName]: [...(prev.progress[passName] ?? []), event.value as string],
+          },
+        }));
+      }
+      break;
+
+    case "pass_escalated":
+      // The pass restarts on a larger model; drop its partial reasoning
+      setState((prev) => ({
+        ...prev,
+        message: `Retrying ${event.pass_name as string} on a larger model...`,
+        progress: { ...prev.progress, [event.pass_name as string]: [] },
       }));
       break;
 
@@ -78,8 +121,13 @@ function processEvent(
         return {
           ...prev,
           results: newResults,
+          progress: withoutPass(prev.progress, event.pass_name as string),
           message: event.message as string,
-          reasoning: (event.reasoning as string[]) || [],
+          // Protocol 2 streams leave reasoning in data.reasoning_steps only
+          reasoning:
+            (event.reasoning as string[]) ||
+            (event.data as { reasoning_steps?: string[] })?.reasoning_steps ||
+            [],
         };
       });
       break;
@@ -96,6 +144,10 @@ function processEvent(
       setState((prev) => ({
         ...prev,
         message: event.message as string,
+        // A failed pass streams nothing more
+        progress: event.pass_name
+          ? withoutPass(prev.progress, event.pass_name as string)
+          : prev.progress,
       }));
       break;
   }
@@ -15,6 +15,14 @@ function processEvent(
   setState: React.Dispatch<React.SetStateAction<DiscoveryState>>
 ) {
   switch (event.event_type) {
+    case "queued":
+      // The backend is at capacity; show our place in line until a slot frees
+      setState((prev) => ({
+        ...prev,
+        message: event.message as string,
+      }));
+      break;
+
     case "discovery_start":
       setState((prev) => ({
         ...prev,
@@ -33,7 +41,11 @@ function processEvent(
       setState((prev) => ({
         ...prev,
         result: event.data as DiscoveryState["result"],
-        reasoning: (event.reasoning as string[]) || [],
+        // Protocol 2 streams leave reasoning in data.reasoning_steps only
+        reasoning:
+          (event.reasoning as string[]) ||
+          (event.data as { reasoning_steps?: string[] })?.reasoning_steps ||
+          [],
         message: event.message as string,
       }));
       break;
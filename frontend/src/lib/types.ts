@@ -144,6 +144,8 @@ export interface AnalysisState {
   currentPassName: string;
   message: string;
   reasoning: string[];
+  // Reasoning streamed so far by each pass still running, by pass name
+  progress: Record<string, string[]>;
   results: AnalysisResults;
   error?: string;
 }